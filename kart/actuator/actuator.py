@@ -31,6 +31,15 @@ from ..const.phys_const import MIN_WHEEL_TURN_ANGLE, MAX_WHEEL_TURN_ANGLE, \
 # approaches target.
 WHEEL_TURN_DAMPER_ANGLE = 0.0174 * 10 # 0.0174 radians == 1 degrees
 
+# If True, the steering position ADC is read by a native background
+# sampler, so that reading the wheel angle never waits on the bus.
+ADC_BACKGROUND_SAMPLING = True
+
+# pwm channels
+SPEED_CHANNEL = 0  # main motor power channel
+STEER_DIRECTION_CHANNEL = 1  # direction channel; 0 == left
+STEER_RATE_CHANNEL = 2  # turn rate channel
+
 class Actuator(object):
     """
     Actuator class is responsible for taking
@@ -38,14 +47,18 @@ class Actuator(object):
     def __init__(self, drive_data, pwm=None, adc=None):
         self.pwm = pwm if pwm else pca.PwmChip("/dev/i2c-1", 0x40)
         self.pwm.activate()
-        self.adc = adc if adc else ads.Ads1115("/dev/i2c-1", 0x48, ads.MUX_CONFIG_SINGLE_AIN0, \
-                                                ads.PGA_GAIN_4V096, \
-                                                ads.MODE_CONTINUOUS, \
-                                                ads.DATA_RATE_250SPS)
+        if adc is None:
+            adc = ads.Ads1115("/dev/i2c-1", 0x48, ads.MUX_CONFIG_SINGLE_AIN0, \
+                              ads.PGA_GAIN_4V096, \
+                              ads.MODE_CONTINUOUS, \
+                              ads.DATA_RATE_250SPS)
+            if ADC_BACKGROUND_SAMPLING:
+                adc.start_sampling()
+        self.adc = adc
         self.data = drive_data
-        self.dir_chan = self.pwm.get_channel(1)  # direction channel; 0 == left
-        self.mag_chan = self.pwm.get_channel(2)  # turn rate channel
-        self.speed_chan = self.pwm.get_channel(0)  # main motor power channel
+        self.dir_chan = self.pwm.get_channel(STEER_DIRECTION_CHANNEL)
+        self.mag_chan = self.pwm.get_channel(STEER_RATE_CHANNEL)
+        self.speed_chan = self.pwm.get_channel(SPEED_CHANNEL)
 
         self._tgt_turn_radius = 0  # these should always begin zeroed
         self._tgt_speed = 0  # these should always begin zeroed
@@ -56,6 +69,15 @@ class Actuator(object):
         tgt_angle = self._radius_to_wheel_angle(self.turn_radius)
         self.update_steering_servo(tgt_angle)
 
+    def apply_targets(self, targets) -> None:
+        """
+        Sets speed and turn radius from targets published by logic.
+        :param targets: DriveTargets
+        :return: None
+        """
+        self.turn_radius = targets.turn_radius
+        self.speed = targets.speed
+
     def seek(self) -> None:
         while True:
             self.tic()
@@ -96,11 +118,11 @@ class Actuator(object):
             rate = 1
         elif rate < -1:
             rate = -1
-        self.dir_chan.duty_cycle = 1 if rate >= 0 else 0
-        if abs(rate) >= 0.3:
-            self.mag_chan.duty_cycle = abs(rate)
-        else:
-            self.mag_chan.duty_cycle = 0
+        # both channels are written in one transaction
+        self.pwm.set_duty_cycles({
+            STEER_DIRECTION_CHANNEL: 1 if rate >= 0 else 0,
+            STEER_RATE_CHANNEL: abs(rate) if abs(rate) >= 0.3 else 0
+        })
 
     def turn_wheels_left(self, rate=1) -> None:
         """
@@ -110,8 +132,8 @@ class Actuator(object):
         :param rate: float 0 to 1
         :return None
         """
-        self.dir_chan.duty_cycle = 0
-        self.mag_chan.duty_cycle = rate
+        self.pwm.set_duty_cycles(
+            {STEER_DIRECTION_CHANNEL: 0, STEER_RATE_CHANNEL: rate})
 
     def turn_wheels_right(self, rate=1) -> None:
         """
@@ -121,8 +143,8 @@ class Actuator(object):
         :param rate: float 0 to 1
         :return None
         """
-        self.dir_chan.duty_cycle = 1
-        self.mag_chan.duty_cycle = rate
+        self.pwm.set_duty_cycles(
+            {STEER_DIRECTION_CHANNEL: 1, STEER_RATE_CHANNEL: rate})
 
     def stop_wheel_turn(self) -> None:
         """
@@ -131,6 +153,15 @@ class Actuator(object):
         """
         self.mag_chan.duty_cycle = 0
 
+    def emergency_stop(self) -> None:
+        """
+        Turns off every pwm channel at once, stopping the main motor
+        and steering motor, in as few I2C transactions as possible.
+        :return: None
+        """
+        self._tgt_speed = 0
+        self.pwm.all_off()
+
     @property
     def speed(self) -> float:
         """
@@ -186,6 +217,17 @@ class Actuator(object):
         else:
             return 0
 
+    @property
+    def wheel_angle_age(self) -> float or None:
+        """
+        Gets time in seconds since the steering position reading used
+        by wheel_angle was taken.
+        :return: float, or None if ADC is not sampled in background
+        """
+        if not getattr(self.adc, 'sampling', False):
+            return None
+        return self.adc.age()
+
     @staticmethod  # doesn't need to be an Actuator member, but it makes sense.
     def _radius_to_wheel_angle(turn_radius: float) -> float:
         """
@@ -200,5 +242,16 @@ class Actuator(object):
         return math.atan(WHEEL_BASE / turn_radius)
 
 
-class VirtualActuator(object):
-    pass  # TODO
+class VirtualActuator(Actuator):
+    """
+    Actuator controlling a simulated kart, such as a
+    simulation.KartModel, through the model's virtual PWM and ADC
+    chips, which are used exactly as the real chips would be.
+    """
+    def __init__(self, drive_data, model):
+        """
+        :param drive_data: DriveData
+        :param model: simulated kart with pwm and adc attributes
+        """
+        self.model = model
+        super().__init__(drive_data, model.pwm, model.adc)
@@ -0,0 +1,228 @@
+"""
+Benchmark of the perception to decision pipeline, which runs without
+a Kinect, I2C devices, or a display.
+
+Each stage of the pipeline is timed separately for every frame, from
+depth map to logic targets, using recorded depth logs or synthetic
+frames. Results may be written as JSON, and compared against results
+from an earlier run to find regressions.
+
+Usage:
+    python -m kart.bench [--log PATH] [--frames N] [--obstacles N]
+                         [--json PATH] [--compare PATH]
+                         [--threshold FRACTION]
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import typing as ty
+
+import numpy as np
+
+from .drive_data.data import DriveData
+from .drive_logic.logic import SimpleColAvoidLogic
+from .input.sensor import KinectInput
+from .kinect.pm.kinect import PointCloud
+from .kinect.pm.recording import DepthLog
+from .kinect.pm.synthetic import Renderer, clutter_scene
+
+N_FRAMES = 300
+N_WARMUP_FRAMES = 10  # frames run before timing begins
+N_OBSTACLES = 5  # obstacles placed in each synthetic frame
+PERCENTILES = 50, 90, 99
+REGRESSION_THRESHOLD = 0.1  # fraction by which a stage may slow down
+STAGES = (
+    'point_cloud_fill',  # PointCloud conversion of depth map to points
+    'nearest_non_traversable',  # search for obstacles in point cloud
+    'point_map',  # obstacles stamped into occupancy grid
+    'logic_tic',  # turn arcs checked against grid, targets found
+)
+
+
+def synthetic_frames(n_frames: int, seed: int=0,
+                     n_obstacles: int=N_OBSTACLES) -> ty.Iterator[tuple]:
+    """
+    Yields synthetic depth frames, each rendered from a scene of
+    ground with passed number of boxes and cones placed at random in
+    front of the sensor.
+    :param n_frames: int
+    :param seed: seed of random placement of first frame's obstacles
+    :param n_obstacles: obstacles in each frame
+    :return: iterator of (depth, time stamp) tuples
+    """
+    renderer = Renderer()
+    for frame_n in range(n_frames):
+        yield renderer.frame(
+            clutter_scene(n_obstacles, seed + frame_n), frame_n)
+
+
+def log_frames(path: str, n_frames: int=None) -> ty.Iterator[tuple]:
+    """
+    Yields frames of recorded depth log, repeating it as needed.
+    :param path: path of depth log
+    :param n_frames: number of frames, or None for each frame once
+    :return: iterator of (depth, time stamp) tuples
+    """
+    log = DepthLog(path)
+    if not len(log):
+        raise ValueError('depth log {} holds no frames'.format(path))
+    n_frames = len(log) if n_frames is None else n_frames
+    for i in range(n_frames):
+        yield log[i % len(log)]
+
+
+def run_benchmark(frames: ty.Iterable[tuple],
+                  n_warmup: int=N_WARMUP_FRAMES) -> dict:
+    """
+    Runs each frame through the pipeline, timing each stage.
+    :param frames: iterable of (depth, time stamp) tuples
+    :param n_warmup: number of leading frames excluded from timing
+    :return: dict of stage name: list of times (s) for each frame
+    """
+    data = DriveData()
+    logic = SimpleColAvoidLogic(data)
+    times = {stage: [] for stage in STAGES + ('total',)}
+    clock = time.perf_counter
+    for i, frame in enumerate(frames):
+        t0 = clock()
+        point_cloud = PointCloud(frame)
+        point_cloud.point_arr
+        t1 = clock()
+        nearest = point_cloud.nearest_non_traversable_points
+        t2 = clock()
+        point_map = KinectInput.make_point_map(nearest)
+        t3 = clock()
+        data.publish_snapshot(point_map, frame[1])
+        logic.tic()
+        t4 = clock()
+        if i < n_warmup:
+            continue
+        for stage, start, end in zip(
+                STAGES + ('total',), (t0, t1, t2, t3, t0),
+                (t1, t2, t3, t4, t4)):
+            times[stage].append(end - start)
+    return times
+
+
+def summarize(times: dict) -> dict:
+    """
+    Gets latency percentiles and frames per second of each stage.
+    :param times: dict of stage name: list of times (s)
+    :return: dict of stage name: dict of statistics
+    """
+    summary = {}
+    for stage, stage_times in times.items():
+        stage_times = np.asarray(stage_times)
+        if not len(stage_times):
+            continue
+        stats = {'n': len(stage_times),
+                 'mean': float(stage_times.mean()),
+                 'max': float(stage_times.max())}
+        for q in PERCENTILES:
+            stats['p{}'.format(q)] = float(np.percentile(stage_times, q))
+        stats['fps'] = 1 / stats['mean'] if stats['mean'] else float('inf')
+        summary[stage] = stats
+    return summary
+
+
+def metadata(source: str) -> dict:
+    """
+    Gets description of environment results were produced in.
+    :param source: description of frames used
+    :return: dict
+    """
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'source': source,
+        'time': time.time(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+    }
+
+
+def compare(results: dict, baseline: dict,
+            threshold: float=REGRESSION_THRESHOLD) -> ty.List[str]:
+    """
+    Compares median latency of each stage against baseline results.
+    :param results: dict produced by main
+    :param baseline: dict produced by main in an earlier run
+    :param threshold: fraction by which a stage may slow down before
+        it is reported as a regression
+    :return: list of stages that regressed
+    """
+    regressions = []
+    print('\n{:<26}{:>12}{:>12}{:>9}'.format(
+        'stage', 'base p50', 'p50', 'ratio'))
+    for stage, stats in results['stages'].items():
+        base = baseline['stages'].get(stage)
+        if not base:
+            continue
+        ratio = stats['p50'] / base['p50'] if base['p50'] else float('inf')
+        regressed = ratio > 1 + threshold
+        if regressed:
+            regressions.append(stage)
+        print('{:<26}{:>10.3f}ms{:>10.3f}ms{:>9.2f}{}'.format(
+            stage, base['p50'] * 1e3, stats['p50'] * 1e3, ratio,
+            '  REGRESSION' if regressed else ''))
+    return regressions
+
+
+def print_summary(summary: dict) -> None:
+    columns = ['p{}'.format(q) for q in PERCENTILES] + ['max']
+    print(('{:<26}' + '{:>11}' * len(columns) + '{:>10}').format(
+        'stage', *columns, 'fps'))
+    for stage, stats in summary.items():
+        print(('{:<26}' + '{:>9.3f}ms' * len(columns) + '{:>10.1f}').format(
+            stage, *[stats[column] * 1e3 for column in columns], stats['fps']))
+
+
+def main(args=None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Benchmarks perception to decision pipeline.')
+    parser.add_argument('--log', help='depth log to take frames from; '
+                        'synthetic frames are used if not passed')
+    parser.add_argument('--frames', type=int, default=N_FRAMES,
+                        help='number of timed frames')
+    parser.add_argument('--obstacles', type=int, default=N_OBSTACLES,
+                        help='obstacles placed in each synthetic frame')
+    parser.add_argument('--warmup', type=int, default=N_WARMUP_FRAMES)
+    parser.add_argument('--json', help='path to write results to')
+    parser.add_argument('--compare', help='results of an earlier run')
+    parser.add_argument('--threshold', type=float,
+                        default=REGRESSION_THRESHOLD)
+    args = parser.parse_args(args)
+
+    n_frames = args.frames + args.warmup
+    if args.log:
+        frames, source = log_frames(args.log, n_frames), args.log
+    else:
+        frames = synthetic_frames(n_frames, n_obstacles=args.obstacles)
+        source = 'synthetic, {} obstacles'.format(args.obstacles)
+    results = {
+        'meta': metadata(source),
+        'stages': summarize(run_benchmark(frames, args.warmup))
+    }
+    print_summary(results['stages'])
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
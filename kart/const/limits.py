@@ -5,3 +5,4 @@ This module holds imposed limits on cart operation
 MIN_LEFT_TURN_RADIUS = -3  # m
 MIN_RIGHT_TURN_RADIUS = 3  # m
 SPEED = 2  # m/s
+LATERAL_ACCELERATION = 2  # m/s^2, max while turning
@@ -21,3 +21,6 @@ MAX_SPEED = 15  # currently used to determine main motor power setting.
 # err high.
 
 DECELERATION_RATE = 1  # m/s^2  todo: measure this (placeholder value)
+ACCELERATION_RATE = 1  # m/s^2  todo: measure this (placeholder value)
+# rate at which the steering motor turns the wheels at full duty cycle
+MAX_WHEEL_TURN_RATE = math.radians(60)  # rad/s todo: measure this
@@ -1,20 +1,234 @@
 """
 Module holding data objects for kart program.
 """
+import threading as th
+import typing as ty
+
 from collections import deque
 from mathutils import Vector
-from time import time  # used to track run time
+from time import time, monotonic  # used to track run time
+
+from .occupancy import OccupancyGrid
+
+# number of most recent snapshots held by DriveData. A consumer
+# that is part way through reading one snapshot keeps its reference
+# valid while the sensor thread publishes the next ones.
+SNAPSHOT_SLOTS = 3
+
+
+class SensorSnapshot(ty.NamedTuple):
+    """
+    Immutable set of sensor products published by input once per
+    sensor frame.
+    """
+    seq: int  # increases by one for each published snapshot
+    time_stamp: ty.Any  # time stamp of sensor frame, as given by sensor
+    received_time: float  # monotonic time at which snapshot was published
+    point_map: OccupancyGrid
+
+    @property
+    def age(self) -> float:
+        """
+        Gets time in seconds since snapshot was published.
+        :return: float
+        """
+        return monotonic() - self.received_time
+
+
+class DriveTargets(ty.NamedTuple):
+    """
+    Immutable set of targets published by logic, to be applied by
+    the actuator.
+    """
+    seq: int  # increases by one for each published set of targets
+    speed: float  # m/s
+    turn_radius: float  # m
+    # monotonic publish time of the sensor snapshot targets were
+    # found from, or None if they were not found from a snapshot.
+    snapshot_time: ty.Optional[float]
+    # seq of the sensor snapshot targets were found from, or None
+    snapshot_seq: ty.Optional[int] = None
+
+    @property
+    def latency(self) -> float or None:
+        """
+        Gets time in seconds since the sensor snapshot that targets
+        were found from was published.
+        :return: float or None
+        """
+        if self.snapshot_time is None:
+            return None
+        return monotonic() - self.snapshot_time
 
 
 class DriveData:
     """
     Holds all important data that should be able to be accessed across
     packages.
+
+    Sensor data is published as SensorSnapshots by a single input
+    thread. Publishing only replaces a reference, which is atomic, so
+    that consumers may get the latest snapshot without locks, and
+    use its sequence number to skip frames they have already handled.
+    Consumers may instead wait for a new snapshot, which is signalled
+    through a condition as soon as it is published.
+    Logic targets are published and waited for in the same way.
     """
     def __init__(self):
         self.start_time = time()
-        self.col_avoid_pointmap = None  # set by input
         self.path = deque()
+        self._snapshot_slots = [None] * SNAPSHOT_SLOTS
+        self._latest_snapshot = None  # set by input
+        self._latest_targets = None  # set by logic
+        # notified whenever a snapshot or targets are published.
+        # Only waiting consumers need to acquire it.
+        self._published = th.Condition()
+
+    def publish_snapshot(
+            self,
+            point_map: OccupancyGrid,
+            time_stamp=None
+    ) -> SensorSnapshot:
+        """
+        Publishes sensor products of a new frame.
+        Only one thread should publish snapshots.
+        Passed point map is frozen; it should not be changed afterwards.
+        :param point_map: OccupancyGrid
+        :param time_stamp: time stamp of sensor frame
+        :return: SensorSnapshot
+        """
+        point_map.cells.flags.writeable = False
+        latest = self._latest_snapshot
+        seq = latest.seq + 1 if latest else 1
+        snapshot = SensorSnapshot(seq, time_stamp, monotonic(), point_map)
+        self._snapshot_slots[seq % SNAPSHOT_SLOTS] = snapshot
+        self._latest_snapshot = snapshot  # publish
+        with self._published:
+            self._published.notify_all()
+        return snapshot
+
+    @property
+    def latest_snapshot(self) -> SensorSnapshot or None:
+        """
+        Gets most recently published sensor snapshot.
+        :return: SensorSnapshot, or None if none has been published
+        """
+        return self._latest_snapshot
+
+    def new_snapshot(self, last_seq: int) -> SensorSnapshot or None:
+        """
+        Gets the latest snapshot if it is newer than the snapshot
+        with passed sequence number.
+        :param last_seq: sequence number of last handled snapshot
+        :return: SensorSnapshot or None
+        """
+        snapshot = self._latest_snapshot
+        if snapshot is None or snapshot.seq <= last_seq:
+            return None
+        return snapshot
+
+    def wait_for_snapshot(
+            self,
+            last_seq: int,
+            timeout: float=None
+    ) -> SensorSnapshot or None:
+        """
+        Waits until a snapshot newer than the snapshot with passed
+        sequence number has been published, and returns it.
+        :param last_seq: sequence number of last handled snapshot
+        :param timeout: maximum time to wait in seconds, or None
+        :return: SensorSnapshot, or None if timeout elapsed first
+        """
+        with self._published:
+            return self._published.wait_for(
+                lambda: self.new_snapshot(last_seq), timeout)
+
+    def publish_targets(
+            self,
+            speed: float,
+            turn_radius: float,
+            snapshot: SensorSnapshot=None
+    ) -> DriveTargets:
+        """
+        Publishes new targets for the actuator.
+        Only one thread should publish targets.
+        :param speed: float (m/s)
+        :param turn_radius: float (m)
+        :param snapshot: SensorSnapshot targets were found from
+        :return: DriveTargets
+        """
+        latest = self._latest_targets
+        targets = DriveTargets(
+            latest.seq + 1 if latest else 1,
+            speed,
+            turn_radius,
+            snapshot.received_time if snapshot else None,
+            snapshot.seq if snapshot else None
+        )
+        self._latest_targets = targets  # publish
+        with self._published:
+            self._published.notify_all()
+        return targets
+
+    @property
+    def latest_targets(self) -> DriveTargets or None:
+        """
+        Gets most recently published targets.
+        :return: DriveTargets, or None if none have been published
+        """
+        return self._latest_targets
+
+    def new_targets(self, last_seq: int) -> DriveTargets or None:
+        """
+        Gets the latest targets if they are newer than the targets
+        with passed sequence number.
+        :param last_seq: sequence number of last applied targets
+        :return: DriveTargets or None
+        """
+        targets = self._latest_targets
+        if targets is None or targets.seq <= last_seq:
+            return None
+        return targets
+
+    def wait_for_targets(
+            self,
+            last_seq: int,
+            timeout: float=None
+    ) -> DriveTargets or None:
+        """
+        Waits until targets newer than the targets with passed
+        sequence number have been published, and returns them.
+        :param last_seq: sequence number of last applied targets
+        :param timeout: maximum time to wait in seconds, or None
+        :return: DriveTargets, or None if timeout elapsed first
+        """
+        with self._published:
+            return self._published.wait_for(
+                lambda: self.new_targets(last_seq), timeout)
+
+    def recent_snapshots(self) -> ty.List[SensorSnapshot]:
+        """
+        Gets the most recently published snapshots, oldest first.
+        :return: list of SensorSnapshot
+        """
+        return sorted(
+            (snapshot for snapshot in self._snapshot_slots if snapshot),
+            key=lambda snapshot: snapshot.seq
+        )
+
+    @property
+    def col_avoid_pointmap(self) -> OccupancyGrid or None:
+        """
+        Gets point map of the latest snapshot.
+        Setting the point map publishes a snapshot without time stamp.
+        :return: OccupancyGrid or None
+        """
+        snapshot = self._latest_snapshot
+        return snapshot.point_map if snapshot else None
+
+    @col_avoid_pointmap.setter
+    def col_avoid_pointmap(self, point_map: OccupancyGrid) -> None:
+        self.publish_snapshot(point_map)
 
     @property
     def next_waypoint(self) -> Vector or None:
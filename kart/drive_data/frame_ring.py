@@ -0,0 +1,210 @@
+"""
+Module holding FrameRing, a ring buffer of fixed-shape frames held in
+shared memory, through which one process publishes sensor frames that
+others read without copying.
+"""
+import multiprocessing as mp
+import typing as ty
+import numpy as np
+
+from multiprocessing import shared_memory
+
+N_SLOTS = 4  # frames held in ring; a read frame stays valid for N - 1 writes
+ALIGNMENT = 64  # bytes; each array begins on a separate cache line
+
+
+class RingFrame:
+    """
+    Frame read from a FrameRing. Arrays are views into shared memory,
+    and so are overwritten once the writer has cycled around the ring
+    back to the frame's slot.
+    A frame's arrays should be checked to still be valid after use.
+    """
+    def __init__(self, ring: 'FrameRing', frame_n: int, slot: int,
+                 slot_seq: int, time_stamp: float, arrays: dict):
+        self.ring = ring
+        self.frame_n = frame_n  # increases by one for each written frame
+        self.time_stamp = time_stamp
+        self.arrays = arrays
+        self._slot = slot
+        self._slot_seq = slot_seq
+
+    @property
+    def valid(self) -> bool:
+        """
+        Gets whether frame's slot is yet to be overwritten, meaning
+        that everything read from its arrays so far was consistent.
+        :return: bool
+        """
+        with self.ring.lock:
+            return self.ring._slot_seqs[self._slot] == self._slot_seq
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.arrays[name]
+
+
+class FrameRing:
+    """
+    Ring buffer of frames in shared memory, each holding one array for
+    each field passed at creation, along with a time stamp.
+
+    A single process writes frames; any number of processes read them.
+    Each slot has a sequence counter that is odd while the slot is
+    being written (a seqlock), so that readers detect torn or
+    overwritten frames without the writer ever waiting on them to
+    finish with a frame.
+
+    Numpy stores to shared memory carry no memory barriers, so the
+    header (frame count, slot sequence counters and frame numbers) is
+    only read or written while holding the ring's multiprocessing
+    lock, and the ordering relied on is only that of the lock's
+    acquire and release. The writer marks a slot odd under the lock,
+    copies the arrays without it, then marks the slot even and
+    publishes it under the lock again; a reader reads the header
+    under the lock, reads the arrays without it, then checks the
+    slot's counter under the lock. Any write overlapping the
+    reader's use of a slot therefore either began before that check,
+    which then sees the counter changed, or began after the reader
+    released the lock, and so after everything it read.
+    The lock is only held for these few header accesses.
+    """
+    def __init__(self, fields: ty.Dict[str, tuple], n_slots: int=N_SLOTS,
+                 name: str=None, lock: 'mp.Lock'=None):
+        """
+        Creates a new ring, or attaches to the existing ring with
+        passed name. Fields and n_slots must match those the ring
+        was created with.
+        :param fields: dict of field name: (shape, dtype)
+        :param n_slots: number of frames held
+        :param name: name of existing ring's shared memory, or None
+        :param lock: lock of existing ring, passed to the attaching
+            process when it is started; required along with name.
+        """
+        if name is not None and lock is None:
+            raise ValueError('lock of existing ring must be passed')
+        self.fields = fields
+        self.n_slots = n_slots
+        self.owner = name is None
+        self.lock = mp.Lock() if lock is None else lock
+        # header holds count of written frames, then a sequence number
+        # for each slot, then the frame number held in each slot.
+        layout = [('header', (1 + 2 * n_slots,), np.int64),
+                  ('time_stamps', (n_slots,), np.float64)]
+        layout += [(field, (n_slots,) + tuple(shape), dtype)
+                   for field, (shape, dtype) in fields.items()]
+        offsets = []
+        size = 0
+        for _, shape, dtype in layout:
+            offsets.append(size)
+            n_bytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            size += -(-n_bytes // ALIGNMENT) * ALIGNMENT
+        if self.owner:
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self._shm = _attach(name)
+        views = {
+            field: np.ndarray(shape, dtype, self._shm.buf, offset)
+            for (field, shape, dtype), offset in zip(layout, offsets)
+        }
+        header = views.pop('header')
+        if self.owner:
+            header.fill(0)
+        self._count = header[0:1]
+        self._slot_seqs = header[1:1 + n_slots]
+        self._slot_frames = header[1 + n_slots:]
+        self._time_stamps = views.pop('time_stamps')
+        self._slots = views  # field: (n_slots, *shape) array
+
+    @property
+    def name(self) -> str:
+        """
+        Gets name of shared memory, with which other processes may
+        attach to ring.
+        :return: str
+        """
+        return self._shm.name
+
+    @property
+    def frame_count(self) -> int:
+        """
+        Gets number of frames written to ring.
+        :return: int
+        """
+        with self.lock:
+            return int(self._count[0])
+
+    def write(self, time_stamp: float, **arrays) -> int:
+        """
+        Writes a frame into the next slot of the ring.
+        Only one process may write to a ring.
+        :param time_stamp: time stamp of frame
+        :param arrays: array for each field of ring
+        :return: frame number of written frame
+        """
+        with self.lock:
+            frame_n = int(self._count[0]) + 1
+            slot = frame_n % self.n_slots
+            self._slot_seqs[slot] += 1  # odd; slot is being written
+        for field, arr in arrays.items():
+            self._slots[field][slot] = arr
+        self._time_stamps[slot] = time_stamp
+        with self.lock:
+            self._slot_frames[slot] = frame_n
+            self._slot_seqs[slot] += 1  # even; slot is consistent again
+            self._count[0] = frame_n  # publish
+        return frame_n
+
+    def latest(self, last_frame_n: int=0) -> RingFrame or None:
+        """
+        Gets the most recently written frame, if it is newer than the
+        frame with passed frame number.
+        Returned arrays are views into shared memory; they are not
+        copied.
+        :param last_frame_n: frame number of last frame read
+        :return: RingFrame or None
+        """
+        while True:
+            with self.lock:
+                frame_n = int(self._count[0])
+                slot = frame_n % self.n_slots
+                slot_seq = int(self._slot_seqs[slot])
+                slot_frame_n = int(self._slot_frames[slot])
+            if frame_n <= last_frame_n:
+                return None
+            if slot_seq % 2 or slot_frame_n != frame_n:
+                continue  # slot is already being overwritten; retry
+            frame = RingFrame(
+                self, frame_n, slot, slot_seq,
+                float(self._time_stamps[slot]),
+                {field: slots[slot] for field, slots in self._slots.items()}
+            )
+            if frame.valid:
+                return frame
+
+    def close(self) -> None:
+        """
+        Releases this process's access to ring, and frees the shared
+        memory if this process created it.
+        Frames read from ring must not be used afterwards.
+        :return: None
+        """
+        self._count = self._slot_seqs = self._slot_frames = None
+        self._time_stamps = self._slots = None
+        self._shm.close()
+        if self.owner:
+            self._shm.unlink()
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """
+    Attaches to existing shared memory.
+    Rings are only attached to by child processes, which share their
+    parent's resource tracker, so the memory stays registered once,
+    by its creator, who unlinks it.
+    :param name: str
+    :return: SharedMemory
+    """
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:  # track argument was added in python 3.13
+        return shared_memory.SharedMemory(name)
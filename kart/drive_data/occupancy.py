@@ -0,0 +1,135 @@
+"""
+Module holding OccupancyGrid, a kart-relative 2d grid of cells near
+obstacles, used for collision checking by logic classes.
+"""
+import math
+import numpy as np
+
+CELL_SIZE = 0.1  # m, length of each side of a grid cell
+HALF_WIDTH = 10  # m, extent of grid to each side of the kart
+LENGTH = 12  # m, extent of grid ahead of the kart
+
+
+class OccupancyGrid:
+    """
+    Fixed resolution 2d grid covering the space around the kart.
+    Positions are kart-relative; x is lateral (negative left, positive
+    right) and y is the distance ahead of the kart.
+
+    Obstacles are stamped into the grid in bulk, and every cell within
+    the grid's dilation distance of an obstacle is marked occupied, so
+    that checking whether a position is safe is a single cell lookup.
+    Positions outside the grid are never occupied, since no obstacle
+    can have been stamped there.
+    """
+    def __init__(self, dilation: float=0., cell_size: float=CELL_SIZE,
+                 half_width: float=HALF_WIDTH, length: float=LENGTH):
+        self.dilation = dilation
+        self.cell_size = cell_size
+        self.half_width = half_width
+        self.length = length
+        self.shape = (
+            int(math.ceil(length / cell_size)),
+            int(math.ceil(2 * half_width / cell_size))
+        )
+        self.cells = np.zeros(self.shape, np.bool_)  # indexed [row][column]
+        # each position within a cell is at most half a cell diagonal
+        # from its center; extending the reach of each obstacle by that
+        # much errs on the side of caution, so a position is never
+        # reported free while an obstacle is within dilation distance.
+        self._reach = dilation + cell_size * math.sqrt(0.5)
+
+    @property
+    def geometry(self) -> tuple:
+        """
+        Gets values defining the grid's cells, which must match for
+        cell indices to be exchangeable between grids.
+        :return: cell size, half width, length
+        """
+        return self.cell_size, self.half_width, self.length
+
+    def clear(self) -> None:
+        """
+        Marks all cells as unoccupied.
+        :return: None
+        """
+        self.cells.fill(False)
+
+    def stamp(self, points) -> None:
+        """
+        Marks all cells within dilation distance of each passed
+        obstacle point as occupied.
+        :param points: array-like of points (N, 2) or (N, 3);
+            only x and y positions are used.
+        :return: None
+        """
+        points = np.asarray(points, np.float64)
+        if not points.size:
+            return
+        points = points.reshape(-1, points.shape[-1])[:, :2]
+        n_rows, n_columns = self.shape
+        # each obstacle covers a contiguous span of cells in every row
+        # within its reach. Spans are marked at their ends in a
+        # difference array, then filled in with a cumulative sum.
+        radius = int(math.ceil(self._reach / self.cell_size))
+        rows = np.floor(points[:, 1:2] / self.cell_size).astype(np.intp) + \
+            np.arange(-radius, radius + 1)
+        y_dif = (rows + 0.5) * self.cell_size - points[:, 1:2]
+        half_span_sq = self._reach ** 2 - y_dif * y_dif
+        spanned = (half_span_sq >= 0) & (0 <= rows) & (rows < n_rows)
+        half_span = np.sqrt(half_span_sq[spanned])
+        x = np.broadcast_to(points[:, 0:1], rows.shape)[spanned] + \
+            self.half_width
+        rows = rows[spanned]
+        # first and last columns with centers within the span
+        starts = np.ceil((x - half_span) / self.cell_size - 0.5)
+        ends = np.floor((x + half_span) / self.cell_size - 0.5)
+        starts = np.maximum(starts, 0).astype(np.intp)
+        ends = np.minimum(ends, n_columns - 1).astype(np.intp)
+        valid = starts <= ends
+        rows, starts, ends = rows[valid], starts[valid], ends[valid]
+        size = n_rows * (n_columns + 1)
+        rows *= n_columns + 1
+        spans = np.bincount(rows + starts, minlength=size) - \
+            np.bincount(rows + ends + 1, minlength=size)
+        spans = spans.reshape(n_rows, n_columns + 1)[:, :-1]
+        self.cells |= np.cumsum(spans, axis=1) > 0
+
+    def occupied(self, positions) -> np.ndarray:
+        """
+        Gets whether each of the passed positions is occupied.
+        :param positions: array-like of positions (..., 2)
+        :return: np.ndarray of bool, shaped as positions less last axis
+        """
+        rows, columns, in_bounds = self.cell_indices(positions)
+        result = np.zeros(in_bounds.shape, np.bool_)
+        result[in_bounds] = self.cells[rows[in_bounds], columns[in_bounds]]
+        return result
+
+    def is_occupied(self, position) -> bool:
+        """
+        Gets whether a single passed position is occupied.
+        :param position: x, y position
+        :return: bool
+        """
+        column = math.floor((position[0] + self.half_width) / self.cell_size)
+        row = math.floor(position[1] / self.cell_size)
+        if not (0 <= row < self.shape[0] and 0 <= column < self.shape[1]):
+            return False
+        return bool(self.cells[row, column])
+
+    def cell_indices(self, positions):
+        """
+        Gets row and column indices of the cells holding each passed
+        position, along with a mask of which positions lie in the grid.
+        :param positions: array-like of positions (..., 2)
+        :return: rows, columns, in_bounds
+        """
+        positions = np.asarray(positions, np.float64)
+        columns = np.floor(
+            (positions[..., 0] + self.half_width) / self.cell_size
+        ).astype(np.intp)
+        rows = np.floor(positions[..., 1] / self.cell_size).astype(np.intp)
+        in_bounds = (0 <= rows) & (rows < self.shape[0]) & \
+            (0 <= columns) & (columns < self.shape[1])
+        return rows, columns, in_bounds
@@ -11,3 +11,15 @@ MIN_POSSIBLE_PREDICTED_DIST_TO_OBSTACLE = \
     ((PREDICTION_POS_SEP / 2) ** 2 + phys_const.TRACK ** 2) ** 0.5
 SAFE_DISTANCE_MOE = 1.5
 SAFE_DISTANCE = SAFE_DISTANCE_MOE * MIN_POSSIBLE_PREDICTED_DIST_TO_OBSTACLE
+# half width of the band swept along each arc that must be kept clear
+SWEPT_HALF_WIDTH = phys_const.TRACK / 2 + SAFE_DISTANCE
+
+# weights of the terms each arc is scored on; see
+# SimpleColAvoidLogic.score_arcs. Each term is scaled to about 0 - 1.
+FREE_DISTANCE_WEIGHT = 1.  # reward for free distance along arc
+CURVATURE_WEIGHT = 0.1  # penalty for tightness of turn
+STEERING_CHANGE_WEIGHT = 0.15  # penalty for change from current arc
+LATERAL_ACCELERATION_WEIGHT = 0.2  # penalty for lateral acceleration
+# score by which another arc must beat the current arc for the kart
+# to change arcs; prevents steering flicking between similar arcs.
+ARC_HYSTERESIS = 0.05
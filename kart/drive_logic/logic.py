@@ -8,14 +8,18 @@ The different classes extending the abstract Logic class are intended
 to be interchangeable depending on situation, whether for actual use
 or testing.
 """
-from scipy.spatial.kdtree import KDTree
+import numpy as np
+
 from mathutils import Vector
 from numpy import sqrt
 
 from ..drive_data.data import DriveData
-from .turn_table import arcs as turn_arcs, Arc
-from .const import SAFE_DISTANCE, PREDICTION_DIST
-from ..const.limits import SPEED
+from ..drive_data.occupancy import OccupancyGrid
+from . import turn_table
+from .turn_table import TurnTable, Arc, positions_after_distances
+from .const import SAFE_DISTANCE, FREE_DISTANCE_WEIGHT, CURVATURE_WEIGHT, \
+    STEERING_CHANGE_WEIGHT, LATERAL_ACCELERATION_WEIGHT, ARC_HYSTERESIS
+from ..const.limits import SPEED, LATERAL_ACCELERATION
 from ..const.phys_const import DECELERATION_RATE
 
 
@@ -68,41 +72,154 @@ class SimpleColAvoidLogic(Logic):
     another drive_logic class which does pay attention to waypoints.
     """
 
-    def __init__(self, data: 'DriveData') -> None:
+    def __init__(self, data: 'DriveData', table: TurnTable=None) -> None:
         super().__init__(data)
-        self.last_radius_index = int(len(turn_arcs) / 2)
+        self._table = table if table else turn_table.table
+        self.last_radius_index = int(len(self._table) / 2)
+        self._turn_radii = self._table.radii
+        # unsigned curvature of each arc; the straight arc has none
+        radii = np.where(self._turn_radii == 0, np.inf, self._turn_radii)
+        self._curvatures = np.abs(1 / radii)
+        self._max_curvature = self._curvatures.max() or 1.
+        # speed above which each arc exceeds the lateral acceleration limit
+        with np.errstate(divide='ignore'):
+            self._lateral_speed_limits = \
+                sqrt(LATERAL_ACCELERATION / self._curvatures)
         self._current_turn_radius = 0
         self._current_speed = 0
+        self.snapshot = None  # sensor snapshot targets were found from
+        self.scores = None  # score of each arc at last tic
+        self.speeds = None  # speed profile of each arc at last tic
 
     def tic(self) -> None:
-        # find arc that allows kart to travel farthest
-        best_arc = None
-        best_distance = 0
-        for arc in turn_arcs:
-            end = self.get_end_of_arc(arc)
-            if end is not None and end.y > best_distance:
-                best_arc = arc
-                best_distance = end.y
-        if best_arc is None:
+        # targets only change when a new sensor frame has arrived
+        snapshot = self._data.new_snapshot(
+            self.snapshot.seq if self.snapshot else 0)
+        if snapshot is None:
+            return
+        self.snapshot = snapshot
+        # every arc is scored at once, then the best is chosen, keeping
+        # to the current arc unless another is clearly better.
+        free_distances = self.get_free_distances(snapshot.point_map)
+        self.speeds = self.speed_profile(free_distances)
+        self.scores = self.score_arcs(free_distances, self.speeds)
+        index = self._choose_arc(self.scores)
+        if index is None:  # kart can not move along any arc
             self._current_turn_radius = 0
             self._current_speed = 0
             return
-        # find speed based on distance to end of prediction
-        free_space = best_distance - SAFE_DISTANCE
-        self._current_speed = self._find_speed_from_distance(free_space)
+        self.last_radius_index = index
+        self._current_turn_radius = float(self._turn_radii[index])
+        self._current_speed = float(self.speeds[index])
+
+    def score_arcs(self, free_distances: np.ndarray,
+                   speeds: np.ndarray=None) -> np.ndarray:
+        """
+        Scores every arc at once, rewarding free distance along the
+        arc, and penalizing tightness of turn, change from the current
+        arc, and lateral acceleration at the arc's planned speed.
+        Arcs on which the kart can not move, as they have no free
+        space beyond safe distance, score -inf, so that the current
+        arc is not held by hysteresis once the kart must stop on it.
+        :param free_distances: np.ndarray (n_radii,) of free distance
+            along each arc, as given by get_free_distances
+        :param speeds: np.ndarray (n_radii,) of planned speed on each
+            arc; found from free distances if not passed
+        :return: np.ndarray (n_radii,)
+        """
+        if speeds is None:
+            speeds = self.speed_profile(free_distances)
+        steering_change = np.abs(
+            np.arange(len(self._turn_radii)) - self.last_radius_index) / \
+            max(len(self._turn_radii) - 1, 1)
+        lateral_acceleration = speeds ** 2 * self._curvatures
+        scores = \
+            FREE_DISTANCE_WEIGHT * free_distances / \
+            self._table.prediction_dist - \
+            CURVATURE_WEIGHT * self._curvatures / self._max_curvature - \
+            STEERING_CHANGE_WEIGHT * steering_change - \
+            LATERAL_ACCELERATION_WEIGHT * lateral_acceleration / \
+            LATERAL_ACCELERATION
+        return np.where(speeds > 0, scores, -np.inf)
+
+    def speed_profile(self, free_distances: np.ndarray,
+                      distances=0.) -> np.ndarray:
+        """
+        Gets the speed planned at passed distances along every arc:
+        the highest speed from which the kart can still stop before
+        coming within safe distance of the end of the arc's free
+        space, limited by limits.SPEED and by the arc's lateral
+        acceleration limit.
+        :param free_distances: np.ndarray (n_radii,) of free distance
+            along each arc, as given by get_free_distances
+        :param distances: float, or np.ndarray (n,) of distances (m)
+            along arcs
+        :return: np.ndarray (n_radii,), or (n_radii, n) if an array of
+            distances is passed
+        """
+        remaining = np.subtract.outer(free_distances - SAFE_DISTANCE,
+                                      distances)
+        limits = np.minimum(self._lateral_speed_limits, SPEED)
+        return np.minimum(
+            self._find_speed_from_distance(remaining),
+            limits if np.ndim(distances) == 0 else limits[:, np.newaxis])
+
+    def _choose_arc(self, scores: np.ndarray) -> int or None:
+        """
+        Gets index of arc with the best score, unless the current arc
+        scores within ARC_HYSTERESIS of it, in which case the current
+        arc is kept.
+        :param scores: np.ndarray (n_radii,) as given by score_arcs
+        :return: int, or None if no arc is viable
+        """
+        best = int(np.argmax(scores))
+        if scores[best] == -np.inf:
+            return None
+        current = self.last_radius_index
+        if scores[current] + ARC_HYSTERESIS >= scores[best]:
+            return current
+        return best
+
+    def get_end_distances(self, point_map: OccupancyGrid=None) -> np.ndarray:
+        """
+        Gets the forward distance of the farthest viable relative
+        position of every arc, checking all arcs in one batched
+        operation. Arcs with no viable position have a distance of 0.
+        :param point_map: OccupancyGrid; latest published if not passed
+        :return: np.ndarray (n_radii,)
+        """
+        return positions_after_distances(
+            self._turn_radii, self.get_free_distances(point_map))[:, 1]
 
-    def _find_speed_from_distance(self, distance: float) -> float:
+    def get_free_distances(self, point_map: OccupancyGrid=None) -> np.ndarray:
+        """
+        Gets the path distance along every arc that the kart can travel
+        before the band it sweeps reaches an obstacle.
+        Arcs that are clear over the whole prediction distance have a
+        free distance of the turn table's prediction distance.
+        :param point_map: OccupancyGrid; latest published if not passed
+        :return: np.ndarray (n_radii,)
+        """
+        table = self._table
+        point_map = self._get_point_map(point_map)
+        blocked = point_map.cells.ravel()[table.swept_cells]
+        # swept cells are listed arc after arc; the least distance of
+        # any blocked cell of an arc is where its free space ends.
+        distances = np.where(
+            blocked, table.swept_distances, table.prediction_dist)
+        return np.minimum.reduceat(distances, table.swept_offsets)
+
+    def _find_speed_from_distance(self, distance):
         """
         Gets best speed given free distance before end of path.
         The speed returned will be at or below the highest speed from
         which the vehicle can decelerate within the free space ahead
         of it.
-        :param distance: float
-        :return: float
+        :param distance: float or np.ndarray
+        :return: float or np.ndarray
         """
-        deceleration_time = sqrt(distance * 2 / DECELERATION_RATE)
-        speed = deceleration_time * DECELERATION_RATE
-        return speed
+        # at or within safe distance of obstacle, speed is 0
+        return sqrt(2 * DECELERATION_RATE * np.maximum(distance, 0))
 
     def get_end_of_arc(self, arc: 'Arc') -> Vector:
         """
@@ -110,19 +227,37 @@ class SimpleColAvoidLogic(Logic):
         :param arc: Arc
         :return: Vector
         """
-        col_avoid_cloud = self._data.col_avoid_pointmap
-        assert isinstance(col_avoid_cloud, KDTree), \
-            'expected KDTree, got %s' % col_avoid_cloud
-        last_safe_point = None
-        for pos in arc.positions:
-            impinging_points = col_avoid_cloud.query_ball_point(
-                pos, SAFE_DISTANCE
-            )
-            if len(impinging_points) == 0:
-                last_safe_point = pos
-            else:
-                break
-        return Vector(last_safe_point) if last_safe_point is not None else None
+        point_map = self._get_point_map()
+        blocked = point_map.cells.ravel()[arc.swept_cells]
+        free_distance = arc.swept_distances[blocked.argmax()] \
+            if blocked.any() else self._table.prediction_dist
+        if free_distance == 0:
+            return None
+        return Vector(positions_after_distances(arc.radius, free_distance))
+
+    def _get_point_map(self, point_map: OccupancyGrid=None) -> OccupancyGrid:
+        """
+        Gets passed point map, or else that of the latest snapshot,
+        checking that the turn table's swept cells index into it correctly.
+        :return: OccupancyGrid
+        """
+        if point_map is None:
+            point_map = self._data.col_avoid_pointmap
+        assert isinstance(point_map, OccupancyGrid), \
+            'expected OccupancyGrid, got %s' % point_map
+        assert point_map.geometry == self._table.grid_geometry, \
+            'point map geometry %s does not match turn table geometry %s' % \
+            (point_map.geometry, self._table.grid_geometry)
+        return point_map
+
+    @property
+    def latency(self) -> float or None:
+        """
+        Gets time in seconds since the sensor snapshot which current
+        targets were found from was published.
+        :return: float, or None if no snapshot has been used
+        """
+        return self.snapshot.age if self.snapshot else None
 
     @property
     def target_turn_radius(self) -> float:
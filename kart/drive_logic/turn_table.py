@@ -1,19 +1,33 @@
 """
 This module generates information about different turn radii
 at start-up, minimizing calculations that will need to be done
-during run-time
+during run-time.
+
+Generated turn tables are cached on disk, keyed by the parameters they
+were built with, so that high resolution tables do not slow start-up.
 """
+import hashlib
+import math
+import os
+import zipfile
 import numpy as np
 
+from .. import settings
 from ..const import limits
+from ..drive_data.occupancy import OccupancyGrid
 from . import const as logic_const
 
 
 N_RADII = 21  # must be odd, for equal number of arcs per side + straight
 N_PREDICTED_POSITIONS_PER_RADII = \
     logic_const.PREDICTION_DIST * logic_const.PREDICTED_POS_PER_METER
-
-arcs = []
+# incremented whenever the way tables are built changes, so that
+# tables cached by an earlier version are not used.
+TABLE_VERSION = 1
+# greatest number of (sample, window cell) pairs tested at once when
+# finding swept cells; bounds memory used by fine tables, and keeps
+# each batch's arrays small enough to stay in cache.
+SWEPT_CHUNK_SIZE = 1 << 20
 
 
 class Arc:
@@ -22,22 +36,38 @@ class Arc:
     a segment of a circle with passed radius.
     Alternatively, if passed radius is 0, returns positions along
     a straight line.
+
+    Positions and swept cells may be passed in when they have already
+    been found for a whole TurnTable; otherwise they are found here.
     """
     # all these methods herein should only be called at startup,
     # and so performance is a non-priority
-    def __init__(self, radius: float):
+    def __init__(self, radius: float, grid: OccupancyGrid=None,
+                 positions: np.ndarray=None, swept_cells: np.ndarray=None,
+                 swept_distances: np.ndarray=None):
         self.radius = radius
-        self.positions = self.find_positions()
+        self.positions = positions if positions is not None else \
+            self.find_positions()
+        # cells of grid swept by kart, in order of path distance
+        if swept_cells is None:
+            swept_cells, swept_distances = \
+                self.find_swept_cells(grid if grid else OccupancyGrid())
+        self.swept_cells = swept_cells
+        self.swept_distances = swept_distances
 
-    def find_positions(self) -> np.ndarray:
-        positions = np.ndarray(
-            (N_PREDICTED_POSITIONS_PER_RADII, 2),
-            np.float64
-        )
-        for i in range(N_PREDICTED_POSITIONS_PER_RADII):
-            positions[i] = self.find_pos_after_distance(
-                (i + 1) * logic_const.PREDICTION_POS_SEP)
-        return positions
+    def find_positions(
+            self,
+            n_positions: int=N_PREDICTED_POSITIONS_PER_RADII,
+            separation: float=logic_const.PREDICTION_POS_SEP
+    ) -> np.ndarray:
+        """
+        Gets positions of kart along arc, at passed separation.
+        :param n_positions: int
+        :param separation: float (m)
+        :return: np.ndarray (n_positions, 2)
+        """
+        return positions_after_distances(
+            self.radius, np.arange(1, n_positions + 1) * separation)
 
     def find_pos_after_distance(self, distance: float):
         """
@@ -46,32 +76,289 @@ class Arc:
         :param distance: float
         :return: x, y positions
         """
-        if self.radius == 0:
-            # if position is on a straight line..
-            return 0, distance
-        else:
-            # if we're not finding a position on a straight line..
-            # get fraction of a full circle being described
-            circle_circumference = self.radius * np.pi
-            fraction_described = distance / circle_circumference
-            radians_travelled = fraction_described * np.pi
-            z = np.sin(radians_travelled) * self.radius
-            x = (1 - np.cos(radians_travelled)) * self.radius
-            return x, z
+        return tuple(positions_after_distances(self.radius, distance))
+
+    def find_swept_cells(
+            self,
+            grid: OccupancyGrid,
+            prediction_dist: float=logic_const.PREDICTION_DIST
+    ):
+        """
+        Gets the cells of passed grid swept by the kart along the arc.
+        See find_swept_cells function.
+        :param grid: OccupancyGrid whose geometry is used
+        :param prediction_dist: distance along arc to which cells are found
+        :return: np.ndarray of cell indices, np.ndarray of distances
+        """
+        return find_swept_cells(self.radius, grid, prediction_dist)
 
     def __repr__(self):
         return 'Arc[radius={}]'.format(self.radius)
 
 
-def populate_arcs():
-    center_index = int(N_RADII / 2)
-    radii = [
-        (limits.MIN_LEFT_TURN_RADIUS / (abs(i) / center_index)) if i < 0 else
-        (limits.MIN_RIGHT_TURN_RADIUS / (abs(i) / center_index)) if i > 0 else
-        0
-        for i in range(-center_index, N_RADII - center_index)
+class TurnTable:
+    """
+    Holds all arcs of a given resolution, along with arrays describing
+    every arc at once, so that all arcs can be checked in one
+    batched operation.
+    """
+    def __init__(self, radii: np.ndarray, positions: np.ndarray,
+                 swept_cells: np.ndarray, swept_distances: np.ndarray,
+                 swept_offsets: np.ndarray, prediction_dist: float,
+                 grid_geometry: tuple):
+        self.radii = radii  # (n_radii,)
+        self.positions = positions  # (n_radii, n_positions, 2)
+        # occupancy grid cells swept by the kart along all arcs,
+        # concatenated arc after arc. swept_offsets holds the index at
+        # which each arc's cells begin, and swept_distances the path
+        # distance along the arc at which each cell is first swept.
+        self.swept_cells = swept_cells
+        self.swept_distances = swept_distances
+        self.swept_offsets = swept_offsets
+        self.prediction_dist = prediction_dist
+        self.grid_geometry = grid_geometry  # of grid that cells index
+        ends = np.append(swept_offsets[1:], len(swept_cells))
+        self.arcs = [
+            Arc(
+                radius,
+                positions=arc_positions,
+                swept_cells=swept_cells[start:end],
+                swept_distances=swept_distances[start:end]
+            ) for radius, arc_positions, start, end in
+            zip(radii, positions, swept_offsets, ends)
+        ]
+
+    def __len__(self):
+        return len(self.radii)
+
+
+def positions_after_distances(radii, distances) -> np.ndarray:
+    """
+    Gets predicted positions of kart after traveling passed distances
+    with passed turn radii, broadcasting radii against distances.
+    A radius of 0 describes a straight line.
+    :param radii: float or np.ndarray
+    :param distances: float or np.ndarray
+    :return: np.ndarray (..., 2) of x, y positions
+    """
+    radii, distances = np.broadcast_arrays(
+        np.asarray(radii, np.float64), np.asarray(distances, np.float64))
+    straight = radii == 0
+    radii = np.where(straight, 1, radii)  # avoids division by zero
+    radians_travelled = distances / radii
+    x = np.where(straight, 0, (1 - np.cos(radians_travelled)) * radii)
+    y = np.where(straight, distances, np.sin(radians_travelled) * radii)
+    return np.stack((x, y), axis=-1)
+
+
+def find_swept_cells(
+        radius: float,
+        grid: OccupancyGrid,
+        prediction_dist: float=logic_const.PREDICTION_DIST
+):
+    """
+    Gets the cells of passed grid that lie within SWEPT_HALF_WIDTH
+    of the arc with passed radius, ordered by the path distance along
+    the arc at which each cell is first reached.
+    Cells are given as indices into the flattened grid.
+    :param radius: turn radius of arc, or 0 for a straight path
+    :param grid: OccupancyGrid whose geometry is used
+    :param prediction_dist: distance along arc to which cells are found
+    :return: np.ndarray of cell indices, np.ndarray of distances
+    """
+    cells, distances, _ = find_all_swept_cells(
+        np.array([radius]), grid, prediction_dist)
+    return cells, distances
+
+
+def find_all_swept_cells(
+        radii: np.ndarray,
+        grid: OccupancyGrid,
+        prediction_dist: float=logic_const.PREDICTION_DIST
+):
+    """
+    Gets the cells swept along each arc with passed radii, as
+    find_swept_cells does for one, concatenated arc after arc.
+    The sampled positions of all arcs are tested in one batch, split
+    into chunks of at most SWEPT_CHUNK_SIZE pairs.
+    :param radii: np.ndarray (n_radii,) of turn radii
+    :param grid: OccupancyGrid whose geometry is used
+    :param prediction_dist: distance along arc to which cells are found
+    :return: np.ndarray of cell indices, np.ndarray of distances,
+        np.ndarray (n_radii,) of index at which each arc's cells begin
+    """
+    # sample the arc more finely than the grid, and widen the swept
+    # band to cover the space between samples, as well as any
+    # obstacle marked in a cell whose center lies within the band.
+    step = grid.cell_size / 2
+    reach = logic_const.SWEPT_HALF_WIDTH + step / 2 + \
+        grid.cell_size * math.sqrt(0.5)
+    distances = np.arange(0, prediction_dist + step / 2, step)
+    window = int(math.ceil(reach / grid.cell_size)) + 1
+    offsets = np.arange(-window, window + 1)
+    chunk = max(1, SWEPT_CHUNK_SIZE // (len(distances) * len(offsets) ** 2))
+    swept = [
+        _find_first_swept(radii[i:i + chunk], distances, offsets, reach, grid)
+        for i in range(0, len(radii), chunk)
     ]
-    for radius in radii:
-        arcs.append(Arc(radius))
+    counts = np.concatenate([arc_counts for _, _, arc_counts in swept])
+    return (
+        np.concatenate([cells for cells, _, _ in swept]),
+        np.concatenate([dist for _, dist, _ in swept]),
+        np.cumsum(np.append(0, counts[:-1]))
+    )
+
+
+def _find_first_swept(radii: np.ndarray, distances: np.ndarray,
+                      offsets: np.ndarray, reach: float,
+                      grid: OccupancyGrid):
+    """
+    Gets cells swept along each passed arc, with the sampled distance
+    at which each is first reached.
+    Every sampled position is tested against the window of cells
+    around it, (n_radii, M, K) pairs in all. Only cells that the
+    previous sample did not reach are kept, which includes the first
+    reach of every cell, so that few pairs are left to deduplicate.
+    :return: np.ndarray of cell indices, np.ndarray of distances,
+        np.ndarray (n_radii,) of number of cells swept along each arc
+    """
+    centers = positions_after_distances(radii[:, np.newaxis], distances)
+    # center of each arc's previous sample; none before the first
+    previous = np.full_like(centers, np.nan)
+    previous[:, 1:] = centers[:, :-1]
+    rows, columns, _ = grid.cell_indices(centers)
+    # (n_radii, M, window) indices of rows and columns around samples
+    rows = rows[..., np.newaxis] + offsets
+    columns = columns[..., np.newaxis] + offsets
+    row_y = (rows + 0.5) * grid.cell_size
+    column_x = (columns + 0.5) * grid.cell_size - grid.half_width
+
+    def within_reach(points):
+        # (n_radii, M, columns, rows) whether cells are within reach
+        x_dif = column_x - points[..., 0:1]
+        y_dif = row_y - points[..., 1:2]
+        return (x_dif * x_dif)[..., np.newaxis] + \
+            (y_dif * y_dif)[..., np.newaxis, :] <= reach ** 2
+
+    in_bounds = ((0 <= columns) & (columns < grid.shape[1]))[..., np.newaxis] \
+        & ((0 <= rows) & (rows < grid.shape[0]))[..., np.newaxis, :]
+    reached = within_reach(centers) & ~within_reach(previous) & in_bounds
+    # pairs are listed by arc, then by sampled distance; keep the
+    # first occurrence of each cell along each arc.
+    arc_i, sample_i, column_i, row_i = np.nonzero(reached)
+    cells = rows[arc_i, sample_i, row_i] * grid.shape[1] + \
+        columns[arc_i, sample_i, column_i]
+    n_cells = grid.shape[0] * grid.shape[1]
+    keys, first = np.unique(arc_i * n_cells + cells, return_index=True)
+    first.sort()
+    return cells[first], distances[sample_i[first]], \
+        np.bincount(arc_i[first], minlength=len(radii))
+
+
+def find_radii(n_radii: int) -> np.ndarray:
+    """
+    Gets passed number of turn radii, from the tightest left turn
+    through a straight path (radius 0) to the tightest right turn.
+    :param n_radii: odd int
+    :return: np.ndarray (n_radii,)
+    """
+    assert n_radii % 2, 'number of radii must be odd, got %s' % n_radii
+    center_index = int(n_radii / 2)
+    indices = np.arange(-center_index, n_radii - center_index)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fractions = np.abs(indices) / center_index
+        return np.where(
+            indices < 0, limits.MIN_LEFT_TURN_RADIUS / fractions,
+            np.where(
+                indices > 0, limits.MIN_RIGHT_TURN_RADIUS / fractions, 0.)
+        )
+
+
+def build_turn_table(
+        n_radii: int=N_RADII,
+        prediction_dist: float=logic_const.PREDICTION_DIST,
+        positions_per_meter: float=logic_const.PREDICTED_POS_PER_METER,
+        grid: OccupancyGrid=None,
+        cache_dir: str=settings.CACHE_DIR
+) -> TurnTable:
+    """
+    Builds a TurnTable with passed resolution, or loads it from the
+    cache if a table with the same parameters was built before.
+    :param n_radii: odd number of arcs
+    :param prediction_dist: distance (m) along each arc that is checked
+    :param positions_per_meter: number of arc positions per meter
+    :param grid: OccupancyGrid whose geometry swept cells are found for
+    :param cache_dir: directory holding cached tables, or None
+    :return: TurnTable
+    """
+    grid = grid if grid else OccupancyGrid()
+    parameters = (
+        TABLE_VERSION, n_radii, prediction_dist, positions_per_meter,
+        grid.geometry, logic_const.SWEPT_HALF_WIDTH,
+        limits.MIN_LEFT_TURN_RADIUS, limits.MIN_RIGHT_TURN_RADIUS
+    )
+    path = None
+    if cache_dir:
+        key = hashlib.sha1(repr(parameters).encode()).hexdigest()
+        path = os.path.join(cache_dir, 'turn_table_{}.npz'.format(key))
+        try:
+            with np.load(path) as cached:
+                return TurnTable(
+                    prediction_dist=prediction_dist,
+                    grid_geometry=grid.geometry,
+                    **{name: cached[name] for name in cached.files}
+                )
+        except (OSError, EOFError, KeyError, ValueError,
+                zipfile.BadZipFile):
+            # table has not been cached, or cache is unreadable, such
+            # as a truncated file; the table is built again.
+            pass
+    # find positions of all arcs at once
+    radii = find_radii(n_radii)
+    n_positions = int(round(prediction_dist * positions_per_meter))
+    positions = positions_after_distances(
+        radii[:, np.newaxis],
+        np.arange(1, n_positions + 1) / positions_per_meter
+    )
+    swept_cells, swept_distances, swept_offsets = \
+        find_all_swept_cells(radii, grid, prediction_dist)
+    arrays = dict(
+        radii=radii,
+        positions=positions,
+        swept_cells=swept_cells,
+        swept_distances=swept_distances,
+        swept_offsets=swept_offsets
+    )
+    if path:
+        _save_table(path, arrays)
+    return TurnTable(
+        prediction_dist=prediction_dist,
+        grid_geometry=grid.geometry,
+        **arrays
+    )
+
+
+def _save_table(path: str, arrays: dict) -> None:
+    """
+    Writes arrays of a built table to passed cache path.
+    The cache only saves time; failing to write it is not an error.
+    :return: None
+    """
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        # replace atomically, so that a partially written table is
+        # never read by another process.
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print('could not cache turn table at {}: {}'.format(path, e))
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass  # never created
+
 
-populate_arcs()
+table = build_turn_table()
+arcs = table.arcs
@@ -3,8 +3,12 @@ Module wrapping C code to read the I2C-attached ADS1115 ADC.
 Used to measure the angle of the steering wheel.
 """
 
+from collections import namedtuple
 from ctypes import *
+from errno import EAGAIN
 from os import strerror
+from statistics import median
+from time import monotonic, sleep
 
 clib = CDLL("libads1115.so", use_errno=True)
 
@@ -13,6 +17,19 @@ class c_ads1115(Structure):
 
 c_ads1115_p = POINTER(c_ads1115)
 
+class c_ads1115_reading(Structure):
+	_fields_ =	[("time_ns", c_int64),
+			 ("n", c_uint64),
+			 ("value", c_int16)]
+
+RING_SIZE = 256  # readings held by sampling ring; as in ads1115.h
+FILTER_READINGS = 5  # readings whose median is taken by filtered()
+
+# single conversion read by the background sampler.
+# time is in seconds on the same clock as time.monotonic, and n counts
+# readings from 1, so that a new reading can be told from one already seen.
+Reading = namedtuple("Reading", ["value", "time", "n"])
+
 # [XXX] obnoxious hack: because the ctypes library doesn't support enum types,
 # define all of our configuration parameters as integers and blindly assume
 # that they will always have the same binary representation as the respective
@@ -66,7 +83,7 @@ ads1115_open.errcheck = ads1115_open_errcheck
 
 def ads1115_config_errcheck(res, func, args):
 	if res != 0:
-		raise OSError("error configuring ADS1115 device: %s" % strerror(get_errno()))
+		raise OSError(get_errno(), "error configuring ADS1115 device: %s" % strerror(get_errno()))
 	return res
 
 ads1115_config = clib.ads1115_config
@@ -84,6 +101,30 @@ ads1115_sample.argtypes = [c_ads1115_p, POINTER(c_int16)]
 ads1115_sample.restype = c_int
 ads1115_sample.errcheck = ads1115_sample_errcheck
 
+def ads1115_sampling_errcheck(res, func, args):
+	if res != 0:
+		raise OSError(get_errno(), "error sampling ADS1115 device: %s" % strerror(get_errno()))
+	return res
+
+ads1115_start_sampling = clib.ads1115_start_sampling
+ads1115_start_sampling.argtypes = [c_ads1115_p]
+ads1115_start_sampling.restype = c_int
+ads1115_start_sampling.errcheck = ads1115_sampling_errcheck
+
+ads1115_stop_sampling = clib.ads1115_stop_sampling
+ads1115_stop_sampling.argtypes = [c_ads1115_p]
+ads1115_stop_sampling.restype = c_int
+ads1115_stop_sampling.errcheck = ads1115_sampling_errcheck
+
+ads1115_latest = clib.ads1115_latest
+ads1115_latest.argtypes = [c_ads1115_p, POINTER(c_ads1115_reading)]
+ads1115_latest.restype = c_int
+ads1115_latest.errcheck = ads1115_sampling_errcheck
+
+ads1115_read_block = clib.ads1115_read_block
+ads1115_read_block.argtypes = [c_ads1115_p, POINTER(c_ads1115_reading), c_uint]
+ads1115_read_block.restype = c_uint
+
 ads1115_free = clib.ads1115_free
 ads1115_free.argtypes = [c_ads1115_p]
 ads1115_free.restype = None
@@ -91,6 +132,8 @@ ads1115_free.restype = None
 class Ads1115:
 	def __init__(self, device_file, bus_address, mux_config, pga_config, mode, data_rate):
 		self.ads = None
+		self.sampling = False
+		self._reading = c_ads1115_reading()
 		self.ads = ads1115_open(
 			bytes(device_file, encoding="UTF-8"),
 			bus_address,
@@ -101,15 +144,96 @@ class Ads1115:
 		)
 
 	def config(self, mux_config, pga_config, mode, data_rate):
-		ads1115_config(self.ads, mux_config, mode, data_rate)
+		"""
+		Reconfigures the chip. The native library refuses this while the
+		background sampler owns the bus, so sampling is stopped around the
+		change and restarted after it, in one-shot mode as before.
+		"""
+		if not self.sampling:
+			ads1115_config(self.ads, mux_config, pga_config, mode, data_rate)
+			return
+		self.stop_sampling()
+		ads1115_config(self.ads, mux_config, pga_config, mode, data_rate)
+		self.start_sampling()
 
 	def sample(self):
+		"""
+		Gets a conversion value. While background sampling, this is the
+		latest reading, and does not touch the bus.
+		"""
+		if self.sampling:
+			return self.latest().value
 		tmp = c_int16(0)
 		ads1115_sample(self.ads, pointer(tmp))
 		return tmp.value
 
+	def start_sampling(self):
+		"""
+		Starts a native thread which reads every conversion as soon as
+		the chip reports it ready, pushing it with its time into a
+		lock-free ring from which the methods below read.
+		The chip is put in one-shot mode while sampling, so that each
+		reading is of a new conversion.
+		"""
+		ads1115_start_sampling(self.ads)
+		self.sampling = True
+
+	def stop_sampling(self):
+		if self.sampling:
+			self.sampling = False
+			ads1115_stop_sampling(self.ads)
+
+	def latest(self, timeout=1.):
+		"""
+		Gets newest reading of background sampler, waiting up to passed
+		timeout for the first reading to arrive.
+		:return: Reading
+		"""
+		deadline = monotonic() + timeout
+		while True:
+			try:
+				ads1115_latest(self.ads, byref(self._reading))
+			except OSError as e:
+				if e.errno != EAGAIN or monotonic() > deadline:
+					raise
+				sleep(0.001)
+				continue
+			return self._make_reading(self._reading)
+
+	def read_block(self, n):
+		"""
+		Gets up to n newest readings of background sampler, oldest
+		first. At most RING_SIZE - 1 readings are held.
+		:return: list of Reading
+		"""
+		readings = (c_ads1115_reading * n)()
+		count = ads1115_read_block(self.ads, readings, n)
+		return [self._make_reading(reading) for reading in readings[:count]]
+
+	def filtered(self, n=FILTER_READINGS):
+		"""
+		Gets median value of the n newest readings, which rejects single
+		noisy conversions.
+		:return: float
+		"""
+		values = [reading.value for reading in self.read_block(n)]
+		return median(values) if values else self.latest().value
+
+	def age(self):
+		"""
+		Gets time in seconds since the newest reading was taken.
+		:return: float
+		"""
+		return monotonic() - self.latest().time
+
+	@staticmethod
+	def _make_reading(reading):
+		return Reading(reading.value, reading.time_ns / 1e9, reading.n)
+
 	def free(self):
 		if self.ads:
+			# freeing also stops the sampling thread
+			self.sampling = False
 			ads1115_free(self.ads)
 			self.ads = None
 
@@ -8,9 +8,17 @@ from os import strerror
 
 clib = CDLL("libpca9685.so", use_errno=True)
 
+NUM_CHAN = 16
+CHAN_REGS = 4
+
 class c_pca9685(Structure):
 	_fields_ =	[("fd", c_int),
-			 ("freq", c_uint)]
+			 ("freq", c_uint),
+			 ("shadow", (c_uint8 * CHAN_REGS) * NUM_CHAN),
+			 ("assigned", c_uint16),
+			 ("synced", c_uint16),
+			 ("writes", c_ulong),
+			 ("skipped", c_ulong)]
 c_pca9685_p = POINTER(c_pca9685)
 
 def pca9685_open_errcheck(res, func, args):
@@ -39,6 +47,18 @@ pca9685_set_duty_cycle = clib.pca9685_set_duty_cycle
 pca9685_set_duty_cycle.argtypes = [c_pca9685_p, c_uint8, c_double]
 pca9685_set_duty_cycle.restype = c_int
 
+pca9685_set_duty_cycles = clib.pca9685_set_duty_cycles
+pca9685_set_duty_cycles.argtypes = [c_pca9685_p, POINTER(c_uint8), POINTER(c_double), c_uint]
+pca9685_set_duty_cycles.restype = c_int
+
+pca9685_all_off = clib.pca9685_all_off
+pca9685_all_off.argtypes = [c_pca9685_p]
+pca9685_all_off.restype = c_int
+
+pca9685_resync = clib.pca9685_resync
+pca9685_resync.argtypes = [c_pca9685_p]
+pca9685_resync.restype = c_int
+
 pca9685_set_pulse_width = clib.pca9685_set_pulse_width
 pca9685_set_pulse_width.argtypes = [c_pca9685_p, c_uint8, c_uint]
 pca9685_set_pulse_width.restype = c_int
@@ -54,6 +74,12 @@ def pca9685_io_errcheck(res, func, args):
 		verb = "setting the frequency of"
 	elif func is pca9685_set_duty_cycle:
 		verb = "setting duty cycle on"
+	elif func is pca9685_set_duty_cycles:
+		verb = "setting duty cycles on"
+	elif func is pca9685_all_off:
+		verb = "turning off all channels of"
+	elif func is pca9685_resync:
+		verb = "resynchronizing"
 	elif func is pca9685_set_pulse_width:
 		verb = "setting pulse width on"
 	elif func is pca9685_shutdown:
@@ -65,6 +91,9 @@ def pca9685_io_errcheck(res, func, args):
 pca9685_activate.errcheck = pca9685_io_errcheck
 pca9685_set_freq.errcheck = pca9685_io_errcheck
 pca9685_set_duty_cycle.errcheck = pca9685_io_errcheck
+pca9685_set_duty_cycles.errcheck = pca9685_io_errcheck
+pca9685_all_off.errcheck = pca9685_io_errcheck
+pca9685_resync.errcheck = pca9685_io_errcheck
 pca9685_set_pulse_width.errcheck = pca9685_io_errcheck
 pca9685_shutdown.errcheck = pca9685_io_errcheck
 
@@ -87,6 +116,10 @@ class PwmChannel:
 		self.chip.set_pulse_width(self.channel, pulse_width)
 	pulse_width = property(fset=set_pulse_width)
 
+	@property
+	def counts(self):
+		return self.chip.get_counts(self.channel)
+
 class PwmChip:
 	def __init__(self, device_file, bus_address):
 		self.pca = None
@@ -112,6 +145,55 @@ class PwmChip:
 	def set_duty_cycle(self, channel, duty_cycle):
 		pca9685_set_duty_cycle(self.pca, channel, duty_cycle)
 
+	def set_duty_cycles(self, duty_cycles):
+		"""
+		Sets duty cycles of several channels at once. The registers of
+		each run of consecutive channels are written in a single I2C
+		transaction. Channels whose quantised values are unchanged
+		since they were last written are skipped.
+		:param duty_cycles: dict of channel: duty cycle from 0 to 1
+		"""
+		n = len(duty_cycles)
+		channels = (c_uint8 * n)(*duty_cycles.keys())
+		values = (c_double * n)(*duty_cycles.values())
+		pca9685_set_duty_cycles(self.pca, channels, values, n)
+
+	def get_counts(self, channel):
+		"""
+		Gets on and off counts last programmed on passed channel, from
+		the chip's shadow registers. Bit 12 of a count is the channel's
+		full on or full off bit.
+		:return: (on, off) tuple, or None if channel is yet to be set
+		"""
+		if not self.pca.contents.assigned & (1 << channel):
+			return None
+		regs = self.pca.contents.shadow[channel]
+		return regs[0] | regs[1] << 8, regs[2] | regs[3] << 8
+
+	def resync(self):
+		"""
+		Rewrites every channel from the shadow registers, whether or not
+		the chip is believed to hold their values. Channel writes are
+		otherwise skipped when their quantised values are unchanged, so
+		this is used to recover after bus errors or a chip reset.
+		"""
+		pca9685_resync(self.pca)
+
+	@property
+	def writes(self):
+		return self.pca.contents.writes
+
+	@property
+	def skipped_writes(self):
+		return self.pca.contents.skipped
+
+	def all_off(self):
+		"""
+		Turns off every channel in a single I2C transaction, through
+		the ALL_LED registers. Intended for emergency stops.
+		"""
+		pca9685_all_off(self.pca)
+
 	def set_pulse_width(self, channel, usecs):
 		pca9685_set_pulse_width(self.pca, channel, usecs)
 
@@ -4,11 +4,36 @@ Wrapper for libquadratureencoder, a C library which uses a background
 thread to count the number of rotations in an encoder sensor
 """
 
+from collections import namedtuple
 from ctypes import *
-from os import strerror
+from os import close, pipe, strerror, write
+from struct import Struct
+from time import monotonic_ns
+
+from ..util.tick_ring import TickRing, VELOCITY_WINDOW
 
 clib = CDLL("libquadratureencoder.so", use_errno=True)
 
+class c_qenc_tick(Structure):
+	_fields_ =	[("time_ns", c_int64),
+			 ("n", c_uint64),
+			 ("value", c_int)]
+
+RING_SIZE = 1024  # ticks held by native ring; as in quadrature_encoder.h
+DEFAULT_CHIP = "/dev/gpiochip0"
+
+# edge ids of struct gpio_v2_line_event, from linux/gpio.h
+LINE_EVENT_RISING_EDGE = 1
+LINE_EVENT_FALLING_EDGE = 2
+
+# struct gpio_v2_line_event: timestamp_ns, id, offset, seqno, line_seqno,
+# followed by six reserved words.
+line_event = Struct("=QIIII24x")
+
+# edge counted by encoder. time is in seconds on the same clock as
+# time.monotonic, and n counts ticks from 1.
+Tick = namedtuple("Tick", ["value", "time", "n"])
+
 def qenc_launch_read_loop_errcheck(res, func, args):
 	if not bool(res):
 		raise OSError("error launching backround thread to read encoder ticks on GPIOs %u and %u: %s" % (
@@ -27,6 +52,33 @@ def qenc_get_encoder_value_errcheck(res, func, args):
 		raise OSError("error fetching encoder from background thread: %s" % strerror(get_errno()))
 	return res
 
+def qenc_launch_chardev_read_loop_errcheck(res, func, args):
+	if not bool(res):
+		raise OSError(get_errno(), "error launching background thread to read encoder line events on lines %u and %u of %s: %s" % (
+			args[1], args[2],
+			str(args[0], encoding="UTF-8"),
+			strerror(get_errno())
+		))
+	return res
+
+qenc_launch_chardev_read_loop = clib.qenc_launch_chardev_read_loop
+qenc_launch_chardev_read_loop.argtypes = [c_char_p, c_uint, c_uint]
+qenc_launch_chardev_read_loop.restype = c_void_p
+qenc_launch_chardev_read_loop.errcheck = qenc_launch_chardev_read_loop_errcheck
+
+def qenc_launch_event_read_loop_errcheck(res, func, args):
+	if not bool(res):
+		raise OSError(get_errno(), "error launching background thread to read encoder line events from fd %d: %s" % (
+			args[0],
+			strerror(get_errno())
+		))
+	return res
+
+qenc_launch_event_read_loop = clib.qenc_launch_event_read_loop
+qenc_launch_event_read_loop.argtypes = [c_int, c_uint, c_uint, c_int, c_int]
+qenc_launch_event_read_loop.restype = c_void_p
+qenc_launch_event_read_loop.errcheck = qenc_launch_event_read_loop_errcheck
+
 qenc_get_encoder_value = clib.qenc_get_encoder_value
 qenc_get_encoder_value.argtypes = [c_void_p, POINTER(c_int), c_void_p]
 qenc_get_encoder_value.restype = c_int
@@ -37,15 +89,68 @@ def qenc_terminate_read_loop_errcheck(res, func, args):
 		raise OSError("error terminating backround encoder read loop: %s" % strerror(get_errno()))
 	return res
 
+def qenc_read_ticks_errcheck(res, func, args):
+	if res < 0:
+		raise OSError("error reading encoder ticks: %s" % strerror(get_errno()))
+	return res
+
+qenc_read_ticks = clib.qenc_read_ticks
+qenc_read_ticks.argtypes = [c_void_p, POINTER(c_qenc_tick), c_size_t, c_uint64]
+qenc_read_ticks.restype = c_ssize_t
+qenc_read_ticks.errcheck = qenc_read_ticks_errcheck
+
+qenc_missed_events = clib.qenc_missed_events
+qenc_missed_events.argtypes = [c_void_p]
+qenc_missed_events.restype = c_ulong
+
 qenc_terminate_read_loop = clib.qenc_terminate_read_loop
 qenc_terminate_read_loop.argtypes = [c_void_p]
 qenc_terminate_read_loop.restype = c_int
 qenc_terminate_read_loop.errcheck = qenc_terminate_read_loop_errcheck
 
 class QuadratureEncoder:
-	def __init__(self, gpio_a, gpio_b):
+	"""
+	Encoder counted by a background thread.
+
+	If chip is passed, lines gpio_a and gpio_b of that GPIO character
+	device are read through the line event interface, in which the
+	kernel time stamps each edge and many edges are taken by one read.
+	Otherwise, the GPIOs are read through sysfs.
+
+	Each edge is kept with its time in a ring, from which speed and
+	acceleration are found without polling the lines.
+	"""
+	def __init__(self, gpio_a, gpio_b, chip=None):
+		self._prepare()
+		if chip is None:
+			self.enc = qenc_launch_read_loop(gpio_a, gpio_b)
+		else:
+			self.enc = qenc_launch_chardev_read_loop(
+				bytes(chip, encoding="UTF-8"), gpio_a, gpio_b)
+
+	@classmethod
+	def from_event_fd(cls, fd, line_a, line_b, a_value=0, b_value=0):
+		"""
+		Creates encoder counting line events read from fd, such as
+		the read end of a MockLineEventSource's pipe.
+		The encoder takes ownership of fd.
+		:param fd: int file descriptor
+		:param line_a: line offset of channel a in events
+		:param line_b: line offset of channel b in events
+		:param a_value: initial level of channel a
+		:param b_value: initial level of channel b
+		:return: QuadratureEncoder
+		"""
+		encoder = cls.__new__(cls)
+		encoder._prepare()
+		encoder.enc = qenc_launch_event_read_loop(
+			fd, line_a, line_b, a_value, b_value)
+		return encoder
+
+	def _prepare(self):
 		self.enc = None
-		self.enc = qenc_launch_read_loop(gpio_a, gpio_b)
+		self.ticks = TickRing(RING_SIZE)
+		self._tick_buf = (c_qenc_tick * RING_SIZE)()
 
 	def __enter__(self):
 		return self
@@ -55,6 +160,49 @@ class QuadratureEncoder:
 		qenc_get_encoder_value(self.enc, byref(val), None)
 		return val.value
 
+	def update(self):
+		"""
+		Moves ticks counted since the last update from the native ring
+		into self.ticks.
+		:return: list of new Ticks, oldest first
+		"""
+		n = qenc_read_ticks(self.enc, self._tick_buf, RING_SIZE, self.ticks.n)
+		new_ticks = []
+		for c_tick in self._tick_buf[:n]:
+			tick = Tick(c_tick.value, c_tick.time_ns * 1e-9, c_tick.n)
+			# ticks overwritten in the native ring are skipped
+			self.ticks.n = tick.n - 1
+			self.ticks.add(tick.time, tick.value)
+			new_ticks.append(tick)
+		return new_ticks
+
+	def velocity(self, window=VELOCITY_WINDOW):
+		"""
+		Gets velocity over the most recent window of time.
+		:param window: seconds
+		:return: float (ticks / s)
+		"""
+		self.update()
+		return self.ticks.velocity(monotonic_ns() * 1e-9, window)
+
+	def acceleration(self, window=VELOCITY_WINDOW):
+		"""
+		Gets acceleration over the most recent window of time.
+		:param window: seconds
+		:return: float (ticks / s^2)
+		"""
+		self.update()
+		return self.ticks.acceleration(monotonic_ns() * 1e-9, window)
+
+	@property
+	def missed_events(self):
+		"""
+		Gets number of line events known to have been lost, either by
+		the kernel's event buffer overflowing or by a repeated edge.
+		:return: int
+		"""
+		return qenc_missed_events(self.enc)
+
 	def __int__(self):
 		return self.get_value()
 
@@ -68,3 +216,105 @@ class QuadratureEncoder:
 
 	def __del__(self):
 		self.terminate()
+
+class MockLineEventSource:
+	"""
+	Source of line events written to a pipe, in the same form as those
+	read from a GPIO line request, with which an encoder may be driven
+	without hardware.
+	"""
+	def __init__(self, line_a=0, line_b=1, a_value=0, b_value=0):
+		self.line_a = line_a
+		self.line_b = line_b
+		self.a_value = a_value
+		self.b_value = b_value
+		self.seqno = 0
+		self.read_fd, self.write_fd = pipe()
+
+	def encoder(self):
+		"""
+		Creates encoder reading this source's events.
+		:return: QuadratureEncoder
+		"""
+		encoder = QuadratureEncoder.from_event_fd(
+			self.read_fd, self.line_a, self.line_b,
+			self.a_value, self.b_value)
+		self.read_fd = None  # now owned by encoder
+		return encoder
+
+	def edge(self, line, rising, time_ns=None):
+		"""
+		Writes a single edge of passed line.
+		:param line: line offset
+		:param rising: bool
+		:param time_ns: time stamp, or None for the current time
+		:return: None
+		"""
+		self.write_events([(line, rising, time_ns)])
+
+	def step(self, direction, time_ns=None):
+		"""
+		Writes the edge which moves the encoder one tick in passed
+		direction.
+		:param direction: 1 or -1
+		:param time_ns: time stamp, or None for the current time
+		:return: None
+		"""
+		self.steps(direction, [time_ns])
+
+	def steps(self, direction, times_ns):
+		"""
+		Writes an edge moving encoder one tick in passed direction for
+		each passed time stamp.
+		:param direction: 1 or -1
+		:param times_ns: iterable of time stamps (ns)
+		:return: None
+		"""
+		edges = []
+		for time_ns in times_ns:
+			# changing b when it equals a counts up, changing a counts down
+			if (self.a_value == self.b_value) == (direction > 0):
+				self.b_value ^= 1
+				edges.append((self.line_b, self.b_value, time_ns))
+			else:
+				self.a_value ^= 1
+				edges.append((self.line_a, self.a_value, time_ns))
+		self._write(edges)
+
+	def write_events(self, edges):
+		"""
+		Writes edges, each a tuple of (line, rising, time_ns).
+		:param edges: iterable of tuples
+		:return: None
+		"""
+		edges = list(edges)
+		for line, rising, _ in edges:
+			if line == self.line_a:
+				self.a_value = int(bool(rising))
+			elif line == self.line_b:
+				self.b_value = int(bool(rising))
+		self._write(edges)
+
+	def _write(self, edges):
+		buf = bytearray()
+		for line, rising, time_ns in edges:
+			self.seqno += 1
+			buf += line_event.pack(
+				monotonic_ns() if time_ns is None else time_ns,
+				LINE_EVENT_RISING_EDGE if rising else LINE_EVENT_FALLING_EDGE,
+				line, self.seqno, self.seqno)
+		view = memoryview(buf)
+		while view:
+			view = view[write(self.write_fd, view):]
+
+	def close(self):
+		for fd in (self.read_fd, self.write_fd):
+			if fd is not None:
+				close(fd)
+		self.read_fd = self.write_fd = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, ex_type, ex_value, backtrace):
+		self.close()
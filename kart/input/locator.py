@@ -23,7 +23,18 @@ class Locator:
     """
 
 
-class VirtualLocatorInput:
+class VirtualLocatorInput(LocatorInput):
     """
-    Class returning location data for testing
-    """
\ No newline at end of file
+    Class returning location data for testing, taken from the pose
+    of a simulated kart, such as a simulation.KartModel.
+    """
+    def __init__(self, model):
+        self.model = model
+
+    @property
+    def location(self):
+        """
+        Gets location of simulated kart
+        :return: simulation.Pose
+        """
+        return self.model.pose
\ No newline at end of file
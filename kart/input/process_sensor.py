@@ -0,0 +1,135 @@
+"""
+Module handling Kinect input in a separate worker process, so that
+acquisition and point cloud processing do not compete with logic
+and actuator threads for the GIL.
+
+The worker publishes each processed frame through a FrameRing in
+shared memory, from which the control process reads it without copying.
+"""
+import multiprocessing as mp
+import typing as ty
+
+import numpy as np
+
+from ..drive_data.data import DriveData
+from ..drive_data.frame_ring import FrameRing
+from ..kinect.pm.cyfunc import CLOUD_SHAPE
+from ..kinect.pm.kinect import KinGeo
+from .sensor import KinectInput
+
+# fields of each frame published by the worker;
+# the nearest non-traversable point found in each sampled column of
+# the point cloud.
+FRAME_FIELDS = {
+    'obstacles': ((CLOUD_SHAPE[1], 3), np.float64)
+}
+# time in s that worker waits between checks for a new kinect frame
+WORKER_POLL_INTERVAL = 0.002
+
+
+class ProcessKinectInput(object):
+    """
+    Input class with the same interface as KinectInput, whose
+    Kinect handling is carried out by a worker process.
+    """
+    def __init__(self, data: 'DriveData', start: bool=True,
+                 make_kinect: ty.Callable[[], KinGeo]=KinGeo):
+        """
+        :param data: DriveData
+        :param start: bool; if True, worker is started at once
+        :param make_kinect: function called within the worker to
+            create the KinGeo frames are taken from, such as one
+            reading from a synthetic source.
+        """
+        self.data = data
+        self.ring = FrameRing(FRAME_FIELDS)
+        self._last_frame_n = 0
+        self._stop = mp.Event()
+        self.worker = mp.Process(
+            target=sensor_worker,
+            args=(self.ring.name, self.ring.lock, self._stop, None,
+                  make_kinect),
+            name='Sensor Process',
+            daemon=True
+        )
+        if start:
+            self.worker.start()
+
+    def update(self) -> None:
+        """
+        Method called each loop of the kinect thread to update data
+        with the latest frame published by the worker, if any.
+        :return: None
+        """
+        frame = self.ring.latest(self._last_frame_n)
+        if frame is None:
+            return
+        self._last_frame_n = frame.frame_n
+        point_map = KinectInput.make_point_map(frame['obstacles'])
+        # the worker may have overwritten the frame while it was read
+        if not frame.valid:
+            return
+        self.data.publish_snapshot(point_map, frame.time_stamp)
+
+    @property
+    def worker_alive(self) -> bool:
+        return self.worker.is_alive()
+
+    def close(self) -> None:
+        """
+        Stops worker process and frees shared memory.
+        :return: None
+        """
+        self._stop.set()
+        if self.worker.is_alive():
+            self.worker.join(1)
+        if self.worker.is_alive():
+            self.worker.terminate()
+        self.ring.close()
+
+
+def sensor_worker(ring_name: str, ring_lock: 'mp.Lock', stop: 'mp.Event',
+                  kinect=None,
+                  make_kinect: ty.Callable[[], KinGeo]=KinGeo) -> None:
+    """
+    Main function of the sensor worker process.
+    Gets frames from the Kinect, finds obstacles within them, and
+    writes both into the ring with passed name until stopped.
+    The kinect is closed when the worker ends, along with the ring.
+    :param ring_name: name of FrameRing created by control process
+    :param ring_lock: lock of FrameRing created by control process
+    :param stop: multiprocessing Event which ends worker when set
+    :param kinect: KinGeo-like handler; made by make_kinect if None
+    :param make_kinect: function creating a KinGeo-like handler
+    :return: None
+    """
+    ring = FrameRing(FRAME_FIELDS, name=ring_name, lock=ring_lock)
+    try:
+        kinect = kinect if kinect else make_kinect()
+        try:
+            _publish_frames(kinect, ring, stop)
+        finally:
+            kinect.close()
+    finally:
+        ring.close()
+
+
+def _publish_frames(kinect, ring: FrameRing, stop: 'mp.Event') -> None:
+    """
+    Writes each new frame of passed kinect into ring until stopped.
+    :param kinect: KinGeo-like handler
+    :param ring: FrameRing
+    :param stop: multiprocessing Event which ends worker when set
+    :return: None
+    """
+    last_time_stamp = None
+    while not stop.is_set():
+        depth_map = kinect.depth_map
+        if depth_map.time_stamp == last_time_stamp:
+            stop.wait(WORKER_POLL_INTERVAL)
+            continue
+        ring.write(
+            depth_map.time_stamp,
+            obstacles=depth_map.nearest_non_traversable_points
+        )
+        last_time_stamp = depth_map.time_stamp
@@ -2,24 +2,55 @@
 Simple module handling accessing of information from kinect package,
 and updating data with that information
 """
-from scipy.spatial.kdtree import KDTree
-
 from ..drive_data.data import DriveData
+from ..drive_data.occupancy import OccupancyGrid
 from ..kinect.pm.kinect import KinGeo
 
 
 class KinectInput(object):
-    def __init__(self, data: 'DriveData'):
+    def __init__(self, data: 'DriveData', kinect_handler: KinGeo=None):
+        """
+        :param data: DriveData
+        :param kinect_handler: KinGeo frames are taken from; if None,
+            one reading from the attached Kinect is created.
+        """
         self.data = data
-        self.kinect_handler = KinGeo()
+        self.kinect_handler = kinect_handler if kinect_handler else KinGeo()
+        self._last_time_stamp = None  # of last published frame
 
     def update(self) -> None:
         """
         Method called each loop of the kinect thread to update data
         :return: None
         """
-        # get np array of nearest points for each sampled column of pixels
-        nearest_non_traversable_points = \
-            self.kinect_handler.point_cloud.nearest_non_traversable_points
-        col_avoid_point_map_tree = KDTree(nearest_non_traversable_points)
-        self.data.col_avoid_pointmap = col_avoid_point_map_tree
+        depth_map = self.kinect_handler.depth_map
+        # frames are retrieved more often than the kinect produces
+        # them; a frame already published should not be processed again
+        if depth_map.time_stamp == self._last_time_stamp:
+            return
+        # get point map from nearest points for each sampled column of
+        # pixels; other users of the same depth map share it.
+        point_map = depth_map.memoize(
+            'point_map',
+            lambda: self.make_point_map(
+                depth_map.nearest_non_traversable_points)
+        )
+        self.data.publish_snapshot(point_map, depth_map.time_stamp)
+        self._last_time_stamp = depth_map.time_stamp
+
+    @staticmethod
+    def make_point_map(nearest_non_traversable_points) -> OccupancyGrid:
+        """
+        Stamps passed obstacle points into a new OccupancyGrid.
+        The grid is not dilated; logic classes check each turn arc
+        against the band of cells it sweeps, which includes clearance.
+        :param nearest_non_traversable_points: np.ndarray (N, 3)
+        :return: OccupancyGrid
+        """
+        # columns in which no non-traversable point was found hold
+        # zeroed points, which do not represent obstacles.
+        obstacles = nearest_non_traversable_points[
+            nearest_non_traversable_points[:, 1] > 0]
+        point_map = OccupancyGrid()
+        point_map.stamp(obstacles)
+        return point_map
@@ -0,0 +1,274 @@
+"""
+Module holding lightweight instrumentation of the GoKart runtime.
+
+Each stage of the pipeline is timed into a fixed size histogram, and
+each sensor frame is traced from the publishing of its snapshot,
+identified by the Kinect's time stamp, to the PWM write of the
+targets found from it. A summary of timers, counters and recent
+traces may be served as JSON over HTTP on localhost while the kart
+runs, ex: with `curl http://127.0.0.1:8765/`.
+"""
+import json
+import threading as th
+import time
+import typing as ty
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .util.timing import Histogram
+
+TRACE_SLOTS = 64  # frame traces held; older traces are overwritten
+TELEMETRY_HOST = '127.0.0.1'  # only local clients may connect
+TELEMETRY_PORT = 8765
+PERCENTILES = 50, 90, 99
+
+# events in the life of a sensor frame, in the order they occur
+PUBLISHED = 'published'  # snapshot published by input
+LOGIC_START = 'logic_start'  # logic began a tic on snapshot
+TARGETS = 'targets'  # targets found from snapshot published by logic
+APPLIED = 'applied'  # targets written to pwm chip by actuator
+FRAME_EVENTS = PUBLISHED, LOGIC_START, TARGETS, APPLIED
+FRAME_LATENCY = 'frame_to_pwm'  # stage timing frames from publish to pwm
+
+
+class StageTimer:
+    """
+    Context manager timing each run of a stage into a histogram.
+    A timer is reused for every run of its stage, and so must only
+    be used by one thread at a time.
+    """
+    __slots__ = 'histogram', '_clock', '_start'
+
+    def __init__(self, histogram: Histogram, clock=time.perf_counter):
+        self.histogram = histogram
+        self._clock = clock
+        self._start = 0.
+
+    def __enter__(self) -> 'StageTimer':
+        self._start = self._clock()
+        return self
+
+    def __exit__(self, ex_type, ex_value, traceback) -> None:
+        self.histogram.add(self._clock() - self._start)
+
+
+class FrameTrace:
+    """
+    Times at which events occurred in the life of a single sensor
+    frame. Traces are held in a ring, and reset when their slot is
+    reused by a later frame.
+    """
+    __slots__ = 'seq', 'frame', 'times'
+
+    def __init__(self):
+        self.seq = 0  # sequence number of frame's snapshot
+        self.frame = None  # time stamp given to frame by sensor
+        self.times = [None] * len(FRAME_EVENTS)  # monotonic, by event
+
+    def reset(self, seq: int, frame) -> None:
+        self.seq = seq
+        self.frame = frame
+        for i in range(len(self.times)):
+            self.times[i] = None
+
+    def latency(self, start: str=PUBLISHED, end: str=APPLIED) -> float or None:
+        """
+        Gets time in seconds between two events of frame.
+        :param start: event name
+        :param end: event name
+        :return: float, or None if either event has not occurred
+        """
+        t0 = self.times[FRAME_EVENTS.index(start)]
+        t1 = self.times[FRAME_EVENTS.index(end)]
+        if t0 is None or t1 is None:
+            return None
+        return t1 - t0
+
+    def summary(self) -> dict:
+        return {
+            'seq': self.seq,
+            'frame': self.frame,
+            'times': dict(zip(FRAME_EVENTS, self.times)),
+            'latency': self.latency()
+        }
+
+
+class Instrumentation:
+    """
+    Holds stage timers, counters and frame traces of a GoKart.
+
+    Each stage and counter should be recorded by a single thread, as
+    each is when named after the loop that records it; reading them
+    from other threads may then be done without locks. Memory used
+    does not grow as the kart runs.
+    """
+    def __init__(self, clock=time.perf_counter, trace_slots: int=TRACE_SLOTS):
+        self.stages = {}  # Histogram of each stage's times (s), by name
+        self.counters = {}  # count of each counted event, by name
+        self._clock = clock
+        self._timers = {}
+        self._traces = [FrameTrace() for _ in range(trace_slots)]
+
+    def stage(self, name: str) -> StageTimer:
+        """
+        Gets timer of passed stage, for use as a context manager:
+            with instruments.stage('logic_tic'):
+                logic.tic()
+        :param name: stage name
+        :return: StageTimer
+        """
+        timer = self._timers.get(name)
+        if timer is None:
+            timer = self._timers[name] = \
+                StageTimer(self._histogram(name), self._clock)
+        return timer
+
+    def record(self, name: str, duration: float) -> None:
+        """
+        Records a time taken by passed stage.
+        :param name: stage name
+        :param duration: float (s)
+        :return: None
+        """
+        self._histogram(name).add(duration)
+
+    def count(self, name: str, n: int=1) -> None:
+        """
+        Adds n to passed counter.
+        :param name: counter name
+        :param n: int
+        :return: None
+        """
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def begin_frame(self, seq: int, frame=None, published: float=None) -> None:
+        """
+        Begins trace of a frame whose snapshot has been published,
+        overwriting the oldest trace.
+        :param seq: sequence number of frame's snapshot
+        :param frame: time stamp given to frame by sensor
+        :param published: monotonic time snapshot was published, or
+            None for the current time
+        :return: None
+        """
+        trace = self._traces[seq % len(self._traces)]
+        trace.reset(seq, frame)
+        trace.times[0] = time.monotonic() if published is None else published
+
+    def mark(self, seq: int, event: str, t: float=None) -> None:
+        """
+        Records the time of an event in the trace of a frame.
+        Only the first occurrence of each event is kept. Events of
+        frames whose trace has been overwritten are ignored.
+        Marking a frame as applied records its latency from publish.
+        :param seq: sequence number of frame's snapshot
+        :param event: one of FRAME_EVENTS
+        :param t: monotonic time of event, or None for the current time
+        :return: None
+        """
+        trace = self._traces[seq % len(self._traces)]
+        if trace.seq != seq:
+            return
+        i = FRAME_EVENTS.index(event)
+        if trace.times[i] is not None:
+            return
+        trace.times[i] = time.monotonic() if t is None else t
+        if event == APPLIED:
+            self.record(FRAME_LATENCY, trace.latency())
+
+    def traces(self, n: int=None) -> ty.List[FrameTrace]:
+        """
+        Gets most recent frame traces, oldest first.
+        :param n: maximum number of traces, or None for all held
+        :return: list of FrameTrace
+        """
+        traces = sorted((trace for trace in self._traces if trace.seq),
+                        key=lambda trace: trace.seq)
+        return traces[-n:] if n else traces
+
+    def summary(self, n_traces: int=8) -> dict:
+        """
+        Gets percentiles of each stage's times, counters, and most
+        recent frame traces.
+        :param n_traces: number of traces included
+        :return: dict
+        """
+        stages = {}
+        for name, histogram in list(self.stages.items()):
+            stats = {'n': histogram.n, 'mean': histogram.mean,
+                     'max': histogram.max}
+            for q in PERCENTILES:
+                stats['p{}'.format(q)] = histogram.percentile(q)
+            stages[name] = stats
+        return {
+            'stages': stages,
+            'counters': dict(self.counters),
+            'traces': [trace.summary() for trace in self.traces(n_traces)]
+        }
+
+    def _histogram(self, name: str) -> Histogram:
+        histogram = self.stages.get(name)
+        if histogram is None:
+            histogram = self.stages[name] = Histogram()
+        return histogram
+
+
+class TelemetryServer:
+    """
+    HTTP server answering each GET request with the JSON encoded
+    result of passed summary function. Requests are handled on a
+    background thread.
+    """
+    def __init__(self, summarize: ty.Callable[[], dict],
+                 host: str=TELEMETRY_HOST, port: int=TELEMETRY_PORT):
+        """
+        :param summarize: function returning a JSON serializable dict
+        :param host: address to listen on
+        :param port: port to listen on; 0 picks a free port
+        """
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ('/', '/telemetry'):
+                    self.send_error(404)
+                    return
+                body = json.dumps(
+                    summarize(), default=_json_default).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # requests are not logged
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = th.Thread(
+            target=self._server.serve_forever, name='Telemetry Thread',
+            daemon=True)
+
+    @property
+    def address(self) -> tuple:
+        """
+        Gets (host, port) server is listening on.
+        :return: tuple
+        """
+        return self._server.server_address[:2]
+
+    def start(self) -> 'TelemetryServer':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._thread.is_alive():
+            self._server.shutdown()
+        self._server.server_close()
+
+
+def _json_default(o):
+    # numpy scalars, such as sensor time stamps, are converted to
+    # python numbers; anything else is described as a string.
+    if hasattr(o, 'item'):
+        return o.item()
+    return str(o)
@@ -16,12 +16,18 @@ Main Module, holds GoKart class
 
 import threading as th
 import typing as ty
-import time
+
+from time import monotonic, perf_counter
 
 from .drive_data.data import DriveData
 from .input.sensor import KinectInput
+from .input.process_sensor import ProcessKinectInput
 from .drive_logic.logic import SimpleColAvoidLogic
 from .actuator.actuator import Actuator
+from .instrumentation import Instrumentation, TelemetryServer, \
+    LOGIC_START, TARGETS, APPLIED
+from .profiler import SamplingProfiler, SAMPLE_INTERVAL
+from .util.timing import LoopTimer, SKIP
 
 # Main function call frequencies.
 # Can be used to limit the amount of cpu time a thread uses
@@ -32,35 +38,133 @@ SENSOR_TH_FRQ = 60  # Hz
 LOGIC_FRQ = 60      # Hz
 ACTUATOR_FRQ = 60   # Hz
 MONITOR_FRQ = 20    # Hz, thread checking that other threads are functional
+# handling of deadlines missed by a loop; see util.timing
+LOOP_POLICY = SKIP
+# If True, kinect frames are acquired and processed in a worker
+# process, which publishes them through shared memory.
+PROCESS_SENSOR = False
 
 LOGIC_CLASS = SimpleColAvoidLogic
 
+# If True, logic tics as soon as a new sensor snapshot is published,
+# and new targets are applied by the actuator as soon as they are
+# published, rather than each waiting for its next fixed-rate loop.
+EVENT_DRIVEN = True
+# maximum time in s that the event-driven logic thread waits for a
+# snapshot before returning to its loop.
+EVENT_WAIT_TIMEOUT = 0.1
+# If True, stage timings, counters and frame traces are served as JSON
+# on localhost at instrumentation.TELEMETRY_PORT while the kart runs.
+SERVE_TELEMETRY = False
+# If set, stacks of the main threads are sampled while the kart runs,
+# and written to this path as collapsed stacks when main ends, to be
+# drawn as a flame graph. None disables the profiler.
+PROFILE_PATH = None
+PROFILE_INTERVAL = SAMPLE_INTERVAL  # s between profiler samples
+
+
+def loop(frq: float=0., exit_test: ty.Callable[[], bool]=None,
+         policy: str=LOOP_POLICY):
+    """
+    Returns a decorator that loops function at specified frq (in Hz)
+    for as long as program runs or until a passed exit_test
+    returns True.
+
+    This decorator is intended to be placed on a method, since it
+    passes a 'self' arg. If it in the future needs to be applied to
+    functions not belonging to a class, the implementation can be
+    updated for the wider scope of use.
+
+    Iterations are paced by a LoopTimer, whose statistics are stored
+    in the instance's loop_stats dict, under the method's name.
+
+    :param frq: frequency at which function is looped
+    :param exit_test: Callable[[] bool]
+    :param policy: timing.SKIP or timing.CATCH_UP; handling of
+        deadlines missed when an iteration overruns.
+    :return: decorator
+    """
+    def decorator(func):
+        def wrapper(self, *args, **kwargs):
+            timer = LoopTimer(func.__name__, frq, policy)
+            if hasattr(self, 'loop_stats'):
+                self.loop_stats[func.__name__] = timer.stats
+            # loop while exit test returns false if one has been passed
+            while not exit_test() if exit_test else True:
+                timer.start_iteration()
+                func(self, *args, **kwargs)  # call decorated method
+                # sleeps current thread until next deadline.
+                # while thread is sleeping, the cpu is free to
+                # work on other threads until the sleep time ends.
+                timer.end_iteration()
+        wrapper.__name__ = func.__name__  # rename wrapper with func's name
+        return wrapper
+    return decorator
+
 
 class GoKart:
     """
     Main class, holds references to data, logic, input, and control
     classes and calls them as appropriate.
     """
-    def __init__(self):
+    def __init__(self, event_driven: bool=EVENT_DRIVEN,
+                 process_sensor: bool=PROCESS_SENSOR,
+                 data: DriveData=None, kinect_input=None,
+                 actuator: Actuator=None,
+                 serve_telemetry: bool=SERVE_TELEMETRY,
+                 profile_path: str=PROFILE_PATH):
         """
         Instantiates GoKart class and creates instance of
         logic instances at start of run.
+        Input and actuator may be passed in, such as those of a
+        simulation, in which case they must share the passed data.
+        :param event_driven: bool; if False, logic and actuator
+            threads run at fixed rates regardless of new data.
+        :param process_sensor: bool; if True, kinect input is handled
+            by a worker process.
+        :param data: DriveData; created if None
+        :param kinect_input: input updating data; created if None
+        :param actuator: Actuator; created if None
+        :param serve_telemetry: bool; if True, telemetry is served on
+            localhost while main runs.
+        :param profile_path: path profile of main threads is written
+            to when main ends, or None to not profile.
         """
         # make main classes
-        self.data = DriveData()
-        self.kinect_input = KinectInput(self.data)
+        self.data = data if data else DriveData()
+        if kinect_input is None:
+            kinect_input = ProcessKinectInput(self.data) if \
+                process_sensor else KinectInput(self.data)
+        self.kinect_input = kinect_input
         # instantiate logic class.
         # This is a constant so that it is more easily exchangeable.
         self.logic = LOGIC_CLASS(self.data)
-        self.actuator = Actuator(self.data)
+        self.actuator = actuator if actuator else Actuator(self.data)
+        self.event_driven = event_driven
+        self._snapshot_seq = 0  # seq of last snapshot handled by logic
+        self._targets_seq = 0  # seq of last targets applied by actuator
+        # time in s from publishing of a sensor snapshot until targets
+        # found from it were applied by the actuator.
+        self.reaction_latency = None
+        self.loop_stats = {}  # LoopStats of each running loop, by name
+        self.late_loops = ()  # names of loops that overran recently
+        self._overruns = {}  # overruns of each loop at last monitor tic
+        # stage timings, counters and traces of frames through pipeline
+        self.instruments = Instrumentation()
+        self.serve_telemetry = serve_telemetry
+        self.telemetry_server = None
+        self.profile_path = profile_path
+        self.profiler = None
         self.kinect_th = th.Thread(
             target=self.kinect_main,
             name='Sensor Thread')
         self.logic_th = th.Thread(
-            target=self.logic_main,
+            target=self.logic_events_main if event_driven else
+            self.logic_main,
             name='Logic Thread')
         self.actuator_th = th.Thread(
-            target=self.actuator_main,
+            target=self.actuator_events_main if event_driven else
+            self.actuator_main,
             name='Actuator Thread')
         # convenience iterable
         self.main_threads = self.kinect_th, self.actuator_th, self.logic_th
@@ -73,6 +177,12 @@ class GoKart:
         :return: None
         """
         try:
+            if self.serve_telemetry:
+                self.telemetry_server = \
+                    TelemetryServer(self.telemetry).start()
+            if self.profile_path:
+                self.profiler = SamplingProfiler(
+                    self.main_threads, PROFILE_INTERVAL).start()
             [thread.start() for thread in self.main_threads]
             self.monitor()  # loop monitoring running threads
         except Exception as e:
@@ -80,8 +190,30 @@ class GoKart:
             # that we can prevent disaster
             self.failsafe_stop()
             raise e  # re-throw exception afterwards
+        finally:
+            # the profile is most wanted when a run has gone badly
+            self.stop_profiler()
+            if self.telemetry_server is not None:
+                self.telemetry_server.stop()  # releases port
+                self.telemetry_server = None
+            # a worker process and its shared memory, if input has them
+            close_input = getattr(self.kinect_input, 'close', None)
+            if close_input is not None:
+                close_input()
         # TODO: additional exit conditions, error handling, etc
 
+    def stop_profiler(self) -> None:
+        """
+        Stops profiler, if running, and writes its samples to
+        profile_path as collapsed stacks.
+        :return: None
+        """
+        if self.profiler is None:
+            return
+        self.profiler.stop()
+        self.profiler.write_collapsed(self.profile_path)
+        self.profiler = None
+
     @loop(SENSOR_TH_FRQ)
     def kinect_main(self) -> None:
         """
@@ -90,7 +222,27 @@ class GoKart:
         DriveData
         :return: None
         """
+        self.kinect_tic()
+
+    def kinect_tic(self) -> None:
+        """
+        Updates data from kinect input, and begins the trace of any
+        newly published frame.
+        :return: None
+        """
+        last_snapshot = self.data.latest_snapshot
+        start = perf_counter()
         self.kinect_input.update()
+        snapshot = self.data.latest_snapshot
+        if snapshot is last_snapshot:
+            # no new frame; the time taken to find that out is
+            # not counted as time taken by the stage.
+            self.instruments.count('repeated_frames')
+            return
+        self.instruments.record('kinect_update', perf_counter() - start)
+        self.instruments.count('frames')
+        self.instruments.begin_frame(
+            snapshot.seq, snapshot.time_stamp, snapshot.received_time)
 
     @loop(LOGIC_FRQ)
     def logic_main(self) -> None:
@@ -100,7 +252,57 @@ class GoKart:
         setting target speed / turn radius / any other values
         :return: None
         """
+        self.logic_tic()
+
+    @loop()
+    def logic_events_main(self) -> None:
+        """
+        Main method for logic handling thread in event-driven mode.
+        Carries out a logic tic as soon as a new sensor snapshot
+        has been published.
+        :return: None
+        """
+        snapshot = self.data.wait_for_snapshot(
+            self._snapshot_seq, EVENT_WAIT_TIMEOUT)
+        if snapshot is None:
+            return  # check for exit, then continue waiting
+        self._snapshot_seq = snapshot.seq
+        self.logic_tic()
+
+    def logic_tic(self) -> None:
+        """
+        Carries out one logic tic and publishes resulting targets.
+        Logic that finds targets from sensor snapshots only publishes
+        targets once per snapshot, so that the actuator does not
+        re-apply targets of a snapshot it has already acted on.
+        :return: None
+        """
+        start = monotonic()
+        timer_start = perf_counter()
         self.logic.tic()  # carry out one logic tic
+        snapshot = getattr(self.logic, 'snapshot', None)
+        if hasattr(self.logic, 'snapshot') and \
+                not self._is_new_snapshot(snapshot):
+            # no new snapshot; as in kinect_tic, such tics are not
+            # counted as time taken by the stage.
+            self.instruments.count('repeated_logic_tics')
+            return
+        self.data.publish_targets(
+            self.logic.target_speed,
+            self.logic.target_turn_radius,
+            snapshot
+        )
+        self.instruments.record('logic_tic', perf_counter() - timer_start)
+        if snapshot is not None:
+            self.instruments.mark(snapshot.seq, LOGIC_START, start)
+            self.instruments.mark(snapshot.seq, TARGETS)
+
+    def _is_new_snapshot(self, snapshot) -> bool:
+        # whether targets have yet to be published from passed snapshot
+        if snapshot is None:
+            return False
+        targets = self.data.latest_targets
+        return targets is None or targets.snapshot_seq != snapshot.seq
 
     @loop(ACTUATOR_FRQ)
     def actuator_main(self) -> None:
@@ -109,17 +311,87 @@ class GoKart:
         and turn radius (and any other values that may become important)
         :return: None
         """
-        self.actuator.tic()
+        self.actuator_tic(self.data.new_targets(self._targets_seq))
+
+    @loop()
+    def actuator_events_main(self) -> None:
+        """
+        Main method for actuator thread in event-driven mode.
+        Applies new targets as soon as they are published, and
+        otherwise updates output at ACTUATOR_FRQ, since steering
+        is adjusted continuously as the wheels turn.
+        :return: None
+        """
+        self.actuator_tic(self.data.wait_for_targets(
+            self._targets_seq, 1 / ACTUATOR_FRQ))
+
+    def actuator_tic(self, targets) -> None:
+        """
+        Applies passed targets, if any, and updates actuator output.
+        :param targets: DriveTargets or None
+        :return: None
+        """
+        with self.instruments.stage('actuator_tic'):
+            if targets is not None:
+                self.actuator.apply_targets(targets)
+                self._targets_seq = targets.seq
+                if targets.snapshot_time is not None:
+                    self.reaction_latency = \
+                        monotonic() - targets.snapshot_time
+            self.actuator.tic()
+        if targets is not None:
+            self.instruments.count('targets_applied')
+            if targets.snapshot_seq is not None:
+                self.instruments.mark(targets.snapshot_seq, APPLIED)
 
     @loop(MONITOR_FRQ)
     def monitor(self) -> None:
         """
         Method that monitors other threads for exit.
         If any main thread exits, calls fail-safe methods.
+        Also notes which loops have overrun since the last monitor tic.
         :return: None
         """
         if not self.all_threads_running:
             self.failsafe_stop()
+        overruns = {name: stats.overruns
+                    for name, stats in list(self.loop_stats.items())}
+        self.late_loops = tuple(
+            name for name, n in overruns.items()
+            if n > self._overruns.get(name, 0)
+        )
+        self._overruns = overruns
+
+    def loop_summary(self) -> dict:
+        """
+        Gets timing statistics of each running loop.
+        :return: dict of loop name: LoopStats summary dict
+        """
+        return {name: stats.summary()
+                for name, stats in list(self.loop_stats.items())}
+
+    def telemetry(self) -> dict:
+        """
+        Gets live statistics of the running kart: timings of each
+        stage and loop, counters, recent frame traces, and the state
+        of each thread.
+        :return: dict
+        """
+        summary = self.instruments.summary()
+        summary.update({
+            'loops': self.loop_summary(),
+            'late_loops': list(self.late_loops),
+            'reaction_latency': self.reaction_latency,
+            'threads': {thread.name: thread.is_alive()
+                        for thread in self.main_threads}
+        })
+        profiler = self.profiler
+        if profiler is not None:
+            summary['profile'] = {
+                'samples': profiler.thread_samples(),
+                'overhead': profiler.overhead
+            }
+        return summary
 
     def failsafe_stop(self) -> None:
         """
@@ -129,13 +401,18 @@ class GoKart:
         with as much physical safety as possible.
         :return: None
         """
-        # first attempt to instruct actuator to set speed to 0
+        self.instruments.count('failsafe_stops')
+        # first attempt to turn off all actuator outputs at once
+        try:
+            self.actuator.emergency_stop()
+            return
+        except Exception:
+            pass
+        # then attempt to instruct actuator to set speed to 0
         try:
             self.actuator.speed = 0
         except Exception:
             pass
-            # todo:
-            # set motor channel pwm to stop the motor
 
     @property
     def all_threads_running(self) -> bool:
@@ -145,41 +422,8 @@ class GoKart:
         exception, or any other cause.
         :return: bool
         """
-        return all(thread.is_alive() for thread in self.main_threads)
-
-
-def loop(frq: float=0., exit_test: ty.Callable[[], bool]=None):
-    """
-    Returns a decorator that loops function at specified frq (in Hz)
-    for as long as program runs or until a passed exit_test
-    returns True.
-
-    This decorator is intended to be placed on a method, since it
-    passes a 'self' arg. If it in the future needs to be applied to
-    functions not belonging to a class, the implementation can be
-    updated for the wider scope of use.
-
-    :param frq: frequency at which function is looped
-    :param exit_test: Callable[[] bool]
-    :return: decorator
-    """
-    loop_t = 1/frq if frq > 0 else 0
-
-    def decorator(func):
-        def wrapper(self, *args, **kwargs):
-            # loop while exit test returns false if one has been passed
-            while not exit_test() if exit_test else True:
-                # is there a better way to handle frequent sleeping?
-                start_time = time.time()
-                func(self, *args, **kwargs)  # call decorated method
-                elapsed_t = time.time() - start_time
-                if loop_t > elapsed_t:
-                    time.sleep(loop_t - elapsed_t)  # sleeps current thread
-                    # while thread is sleeping, the cpu is free to
-                    # work on other threads until the sleep time ends.
-        wrapper.__name__ = func.__name__  # rename wrapper with func's name
-        return wrapper
-    return decorator
+        return all(thread.is_alive() for thread in self.main_threads) and \
+            getattr(self.kinect_input, 'worker_alive', True)
 
 
 if __name__ == '__main__':
@@ -10,11 +10,11 @@ import vispy.scene as scene
 import vispy.app as app
 import PyQt5  # used by vispy.app, the import here is used as a marker.
 
-from scipy.spatial.kdtree import KDTree
 from vispy.scene import visuals
 
 from kart.kinect.pm.kinect import KinGeo
 from kart.drive_data.data import DriveData
+from kart.input.sensor import KinectInput
 from kart.drive_logic.logic import SimpleColAvoidLogic
 from kart.drive_logic.turn_table import Arc
 
@@ -83,11 +83,8 @@ class ComboDemoCanvas(scene.SceneCanvas):
             size=9)
 
     def _update_path_positions(self):
-        flat_points = []
-        for x, pos in enumerate(self.bound_point_data):
-            if pos[1] > 0:
-                flat_points.append((pos[0], pos[1]))
-        self.drive_data.col_avoid_pointmap = KDTree(flat_points)
+        self.drive_data.col_avoid_pointmap = \
+            KinectInput.make_point_map(self.bound_point_data)
         self.logic.tic()
         arc = Arc(self.logic.target_turn_radius)
         arc_positions = \
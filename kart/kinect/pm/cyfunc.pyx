@@ -5,8 +5,9 @@ used by the kinect module of the same package.
 
 import math
 import numpy as np
-import itertools as itr
+cimport cython
 cimport numpy as np
+from cython.parallel cimport prange
 
 
 cdef:
@@ -22,41 +23,136 @@ cdef:
     int CLOUD_WIDTH = math.ceil(SENSOR_PIXEL_WIDTH / SAMPLE_DISTANCE)
     float MAX_SLOPE = math.radians(20.)
     float SLOPE_COMPARISON_VAL = np.tan(MAX_SLOPE) ** 2
+    int NO_READING_DEPTH = 2047  # raw depth reported where no reading exists
     # generate sampled positions in advance
     np.ndarray X_SAMPLE_POSITIONS = \
         np.arange(0, SENSOR_PIXEL_WIDTH, SAMPLE_DISTANCE, np.uint16)
     np.ndarray Y_SAMPLE_POSITIONS = \
         np.arange(0, SENSOR_PIXEL_HEIGHT, SAMPLE_DISTANCE, np.uint16)
-    np.ndarray SAMPLE_POSITIONS = \
-        np.array([(x, y) for (x, y) in itr.product(
-            X_SAMPLE_POSITIONS,
-            Y_SAMPLE_POSITIONS
-        )], np.uint16)
+    # lookup tables, filled by build_lookup_tables() below
+    np.ndarray DEPTH_TO_METERS  # raw 11 bit depth -> depth in meters
+    np.ndarray SAMPLE_RAYS  # (CLOUD_HEIGHT, CLOUD_WIDTH, 3) ray per sample
+
+# (rows, columns) of each point cloud; visible from python, unlike the
+# sampling constants above, so that users may size buffers from it.
+CLOUD_SHAPE = CLOUD_HEIGHT, CLOUD_WIDTH
+
+
+cpdef void build_lookup_tables():
+    """
+    Builds the raw-depth-to-meters table and the table of rays for each
+    sampled pixel, so that point generation is reduced to gathers and
+    multiplies.
+    Must be re-run whenever sensor constants change; configure_sensor
+    does this.
+    :return: None
+    """
+    global DEPTH_TO_METERS, SAMPLE_RAYS
+    cdef np.ndarray angular_x, angular_y
+    DEPTH_TO_METERS = \
+        np.tan(np.arange(NO_READING_DEPTH + 1) / 2842.5 + 1.1863) / 8.09
+    # a zero depth collapses the point to the (0, 0, 0) marker value
+    DEPTH_TO_METERS[NO_READING_DEPTH] = 0
+    angular_x = \
+        (X_SAMPLE_POSITIONS.astype(np.float64) - HALF_SENSOR_PX_WIDTH) / \
+        SENSOR_PIXEL_WIDTH * SENSOR_ANGULAR_WIDTH
+    angular_y = \
+        (Y_SAMPLE_POSITIONS.astype(np.float64) - HALF_SENSOR_PX_HEIGHT) / \
+        SENSOR_PIXEL_HEIGHT * SENSOR_ANGULAR_HEIGHT + SENSOR_ANGULAR_ELEVATION
+    # each ray is the position of a point at a depth of one meter
+    SAMPLE_RAYS = np.empty((CLOUD_HEIGHT, CLOUD_WIDTH, 3), np.float64)
+    SAMPLE_RAYS[:, :, 0] = np.sin(angular_x)
+    SAMPLE_RAYS[:, :, 1] = 1
+    SAMPLE_RAYS[:, :, 2] = -np.sin(angular_y)[:, np.newaxis]
+
+
+def configure_sensor(angular_width=None, angular_height=None,
+                     angular_elevation=None):
+    """
+    Sets sensor constants (in radians) and rebuilds lookup tables
+    so that they remain correct, ex: when the sensor is mounted tilted.
+    Values not passed are left unchanged.
+    :return: None
+    """
+    global SENSOR_ANGULAR_WIDTH, SENSOR_ANGULAR_HEIGHT, \
+        SENSOR_ANGULAR_ELEVATION
+    if angular_width is not None:
+        SENSOR_ANGULAR_WIDTH = angular_width
+    if angular_height is not None:
+        SENSOR_ANGULAR_HEIGHT = angular_height
+    if angular_elevation is not None:
+        SENSOR_ANGULAR_ELEVATION = angular_elevation
+    build_lookup_tables()
+
+
+def sensor_config():
+    """
+    Gets sensor constants used when converting depth frames to points,
+    so that code modelling the sensor, such as the synthetic renderer,
+    follows them, including changes made by configure_sensor.
+    Angles are in radians; sample_distance is the number of pixels
+    between sampled pixels in each direction.
+    :return: dict of angular_width, angular_height, angular_elevation
+        and sample_distance
+    """
+    return {
+        'angular_width': SENSOR_ANGULAR_WIDTH,
+        'angular_height': SENSOR_ANGULAR_HEIGHT,
+        'angular_elevation': SENSOR_ANGULAR_ELEVATION,
+        'sample_distance': SAMPLE_DISTANCE
+    }
+
+
+build_lookup_tables()
 
 
 def point_arr_from_depth_arr(dm):
-    # make array that point positions will be stored in
-    points = np.ndarray((CLOUD_HEIGHT, CLOUD_WIDTH, 3), np.float32)
-    # for all combinations of x and y...
-    x_range = range(0, SENSOR_PIXEL_WIDTH, SAMPLE_DISTANCE)
-    y_range = range(0, SENSOR_PIXEL_HEIGHT, SAMPLE_DISTANCE)
+    """
+    Converts the sampled pixels of a depth map into an array of
+    point positions. The conversion runs without the GIL.
+    Pixels with no reading produce a zeroed point.
+    :param dm: np.ndarray of raw depth values (480, 640)
+    :return: np.ndarray (CLOUD_HEIGHT, CLOUD_WIDTH, 3)
+    """
     cdef:
-        int map_depth  # depth of map at each point
-        int arr_x_index  # point array x position
-        int arr_y_index  # point array y position
-        int x, y  # x and y indices in depth-map
-    for x, y in itr.product(x_range, y_range):
-        # create a point in the newly formed point-cloud.
-        map_depth = dm[y][x]
-        arr_x_index = int(x / SAMPLE_DISTANCE)
-        arr_y_index = int(y / SAMPLE_DISTANCE)
-        if map_depth == 2047:
-            # if depth is max value, set marker value and go on
-            points[arr_y_index][arr_x_index] = (0, 0, 0)
-            continue
-        points[arr_y_index][arr_x_index] = \
-            pos_from_depth_map_point(x, y, map_depth)
-    return points
+        const unsigned short[:, :] depth_view = np.asarray(dm, np.uint16)
+        const double[::1] table = DEPTH_TO_METERS
+        const double[:, :, ::1] rays = SAMPLE_RAYS
+        np.ndarray point_arr
+        double[:, :, ::1] points
+    if depth_view.shape[0] < (CLOUD_HEIGHT - 1) * SAMPLE_DISTANCE + 1 or \
+            depth_view.shape[1] < (CLOUD_WIDTH - 1) * SAMPLE_DISTANCE + 1:
+        raise ValueError(
+            'point_arr_from_depth_arr: Passed depth map of shape {} is '
+            'smaller than sensor'.format(np.shape(dm)))
+    point_arr = np.empty((CLOUD_HEIGHT, CLOUD_WIDTH, 3), np.float64)
+    points = point_arr
+    with nogil:
+        _fill_points(depth_view, table, rays, points)
+    return point_arr
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void _fill_points(const unsigned short[:, :] depth_view,
+                       const double[::1] table,
+                       const double[:, :, ::1] rays,
+                       double[:, :, ::1] points) nogil:
+    # rows are independent, and are divided between threads when
+    # built with OpenMP.
+    cdef:
+        Py_ssize_t row, column, axis
+        unsigned short raw
+        double depth
+    for row in prange(points.shape[0], schedule='static'):
+        for column in range(points.shape[1]):
+            raw = depth_view[row * SAMPLE_DISTANCE, column * SAMPLE_DISTANCE]
+            # raw depth is 11 bits; guard the gather against bad values
+            if raw > NO_READING_DEPTH:
+                raw = NO_READING_DEPTH
+            depth = table[raw]
+            for axis in range(3):
+                points[row, column, axis] = rays[row, column, axis] * depth
 
 
 cdef class PointCloud:
@@ -133,81 +229,137 @@ cdef class PointCloud:
         # its position has not yet been calculated.
         if point[1] != -1:
             return point
-        cdef unsigned short depth_map_x, depth_map_y
-        depth_map_x, depth_map_y = x * SAMPLE_DISTANCE, y * SAMPLE_DISTANCE
-        point = self._point_arr[y][x] = \
-            pos_from_depth_map_point(
-                depth_map_x,
-                depth_map_y,
-                self.depth_arr[depth_map_y, depth_map_x]
-            )
-        return point
+        cdef unsigned short map_depth
+        map_depth = self.depth_arr[y * SAMPLE_DISTANCE, x * SAMPLE_DISTANCE]
+        self._point_arr[y][x] = \
+            SAMPLE_RAYS[y, x] * DEPTH_TO_METERS[min(map_depth, NO_READING_DEPTH)]
+        return self._point_arr[y][x]
 
     cdef void fill_point_arr(self):
-        cdef:
-            unsigned short map_depth  # depth of map at each point
-            int arr_x_index  # point array x position
-            int arr_y_index  # point array y position
-            unsigned short x, y  # depth map indices
-        # for all combinations of x and y...
-        for x, y in SAMPLE_POSITIONS:
-            # get positions as they will appear in the point_arr
-            arr_x_index = int(x / SAMPLE_DISTANCE)
-            arr_y_index = int(y / SAMPLE_DISTANCE)
-            # check if point at determined point_arr position holds
-            # a marker value. If it does not, it has already been
-            # filled. We can then skip ahead to the next position
-            if self._point_arr[arr_y_index][arr_x_index][1] != -1:
-                continue
-            map_depth = self.depth_arr[y][x]
-            if map_depth == 2047:
-                # if depth is max value, set marker value and go on
-                self._point_arr[arr_y_index][arr_x_index] = (0, 0, 0)
-                continue
-            self._point_arr[arr_y_index][arr_x_index] = \
-                pos_from_depth_map_point(x, y, map_depth)
+        # the whole frame is converted at once; this is far cheaper
+        # than converting the remaining un-filled points one by one.
+        self._point_arr = point_arr_from_depth_arr(self.depth_arr)
 
     cdef np.ndarray _find_nearest_non_traversable_points(self):
-        # note: this method is largely un-optimized
-        active_x_positions = set(x for x in range(0, CLOUD_WIDTH))
-        removed_x_positions = set()
-        cdef np.ndarray points, p1, p2
-        cdef unsigned short x, y
-        points = np.zeros((CLOUD_WIDTH, 3), np.float64)
-
-        for y from CLOUD_HEIGHT > y >= 0:
-            # iterate from bottom of point cloud upwards
-            for x in active_x_positions:
-                if self._point_is_traversable(x, y):
-                    continue  # if point is traversable, go on to next
-                # if point is not traversable...
-                points[x] = self.get_point(x, y)  # add this point to array
-                # the nearest in this column has now been found,
-                # remove this column index from those checked
-                removed_x_positions.add(x)
-            # remove columns from active x positions that have been
-            # marked for removal
-            active_x_positions -= removed_x_positions
-            removed_x_positions.clear()
-        # printer(points)
+        cdef:
+            const double[:, :, ::1] point_view = \
+                np.ascontiguousarray(self.point_arr, np.float64)
+            np.ndarray points
+            double[:, ::1] nearest
+        # columns without a non-traversable point are left zeroed
+        points = np.zeros((point_view.shape[1], 3), np.float64)
+        nearest = points
+        with nogil:
+            _nearest_non_traversable(point_view, nearest)
         return points
 
-    cdef bint _point_is_traversable(self, unsigned short x, unsigned short y):
-        cdef np.ndarray points, p1, p2
-        cdef unsigned short x2
-        p1 = self[x, y]
-        # if p1 is zeroed, it does not represent a point in space.
-        # we'll return true as a default value.
-        if not p1.any():
-            return True
-        x2 = x -1 if x != 0 else 1
-        p2 = self[x2, y]
-        if p2[1] > 0 and not slope_in_bounds(p1, p2):
-            return False
-        cdef unsigned short y2
-        y2 = y -1 if y != 0 else 1
-        p2 = self[x, y2]
-        return not p2[1] > 1 or slope_in_bounds(p1, p2)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void _nearest_non_traversable(const double[:, :, ::1] points,
+                                   double[:, ::1] nearest) nogil:
+    # scans each column from the bottom of the point cloud upwards.
+    # columns are independent, and are divided between threads when
+    # built with OpenMP.
+    cdef Py_ssize_t row, column, axis
+    for column in prange(points.shape[1], schedule='static'):
+        for row in range(points.shape[0] - 1, -1, -1):
+            if _non_traversable(points, row, column):
+                for axis in range(3):
+                    nearest[column, axis] = points[row, column, axis]
+                break
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline bint _non_traversable(const double[:, :, ::1] points,
+                                  Py_ssize_t row, Py_ssize_t column) nogil:
+    # the first column and row are compared against the second.
+    cdef Py_ssize_t prev_column = column - 1 if column != 0 else 1
+    cdef Py_ssize_t prev_row = row - 1 if row != 0 else 1
+    # zeroed points do not represent a point in space
+    if points[row, column, 0] == 0 and points[row, column, 1] == 0 and \
+            points[row, column, 2] == 0:
+        return False
+    if points[row, prev_column, 1] > 0 and not _points_slope_in_bounds(
+            points, row, column, row, prev_column):
+        return True
+    return points[prev_row, column, 1] > 1 and not _points_slope_in_bounds(
+        points, row, column, prev_row, column)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline bint _points_slope_in_bounds(
+        const double[:, :, ::1] points, Py_ssize_t row1, Py_ssize_t column1,
+        Py_ssize_t row2, Py_ssize_t column2) nogil:
+    # nogil equivalent of slope_in_bounds, between two points of array
+    cdef:
+        double dx = points[row1, column1, 0] - points[row2, column2, 0]
+        double dy = points[row1, column1, 1] - points[row2, column2, 1]
+        double dz = points[row1, column1, 2] - points[row2, column2, 2]
+        double flat_distance_sq = dx * dx + dy * dy  # avoid sqrt
+    # if flat distance is 0, then the slope is vertical.
+    if flat_distance_sq == 0:
+        return False
+    return dz * dz / flat_distance_sq < SLOPE_COMPARISON_VAL
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def non_traversable_mask(point_arr):
+    """
+    Gets mask of points in a point array that are not traversable,
+    based on the slope from each point to its neighbour in the
+    previous column and to its neighbour in the previous row.
+    Zeroed points do not represent a point in space, and are
+    treated as traversable.
+    :param point_arr: np.ndarray (CLOUD_HEIGHT, CLOUD_WIDTH, 3); any
+        shape of at least 2 rows and columns of 3d points is accepted.
+    :return: np.ndarray of bool (CLOUD_HEIGHT, CLOUD_WIDTH)
+    """
+    cdef:
+        const double[:, :, ::1] point_view = \
+            np.ascontiguousarray(point_arr, np.float64)
+        np.ndarray mask
+        unsigned char[:, ::1] mask_view
+        Py_ssize_t row, column
+    # the first row and column are compared with their neighbours in
+    # the next row and column, which must exist, as indices are not
+    # checked.
+    if point_view.shape[0] < 2 or point_view.shape[1] < 2 or \
+            point_view.shape[2] != 3:
+        raise ValueError(
+            'non_traversable_mask: Passed point array of shape {} must '
+            'hold at least 2 rows and columns of 3d points'
+            .format(np.shape(point_arr)))
+    mask = np.empty(
+        (point_view.shape[0], point_view.shape[1]), np.uint8)
+    mask_view = mask
+    with nogil:
+        for row in range(point_view.shape[0]):
+            for column in range(point_view.shape[1]):
+                mask_view[row, column] = \
+                    _non_traversable(point_view, row, column)
+    return mask.view(np.bool_)
+
+
+def slopes_in_bounds(p1, p2):
+    """
+    Array equivalent of slope_in_bounds; compares each pair of points
+    along the last axis of the passed arrays.
+    :param p1: np.ndarray (..., 3)
+    :param p2: np.ndarray (..., 3)
+    :return: np.ndarray of bool
+    """
+    cdef np.ndarray dif, flat_distance_sq, v_difference_sq
+    dif = np.subtract(p1, p2)
+    flat_distance_sq = dif[..., 0] ** 2 + dif[..., 1] ** 2  # avoid sqrt
+    v_difference_sq = dif[..., 2] ** 2
+    # where flat distance is 0, the slope is vertical; the division
+    # then yields inf or nan, both of which compare as out of bounds.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return v_difference_sq / flat_distance_sq < SLOPE_COMPARISON_VAL
 
 # providing this function in both python and c to permit testing
 # from a python module. There may be a better way to do this?
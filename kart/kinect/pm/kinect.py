@@ -1,8 +1,15 @@
-import freenect as fn
+import threading as th
 import time as t
 import numpy as np
 
 from . import cyfunc
+from .sources import FrameSource, AsyncFreenectSource, SyncFreenectSource
+from .recording import DepthLogWriter, replay_source
+
+# If True, frames are acquired in the background through freenect's
+# callback api, rather than by blocking calls when they are needed.
+ASYNC_ACQUISITION = True
+FIRST_FRAME_TIMEOUT = 5.  # s, max time waited for sensor's first frame
 
 # grab PointCloud class from cyfunc so that it can be used here and
 # elsewhere more conveniently, without importing a cython file
@@ -16,25 +23,24 @@ class KinGeo:
 
     Supports a single Kinect in use
     """
-    ctx = False
     default_max_frq = 30  # max frq at which frames will be retrieved
 
-    def __init__(self):
+    def __init__(self, source: FrameSource=None):
         """
         Initializes Kinect handler
+        :param source: FrameSource from which depth frames are taken.
+            If None, a freenect source is used.
         """
-
-        if not KinGeo.ctx:
-            KinGeo.ctx = fn.init()
-
-        self.ctx = fn.init()
-        # self.device = fn.open_device(KinGeo.ctx, 1)
-        # assert self.device is not None
+        if source is None:
+            source = AsyncFreenectSource() if ASYNC_ACQUISITION else \
+                SyncFreenectSource()
+        self.source = source
+        self.source.start()
         self.last_access = 0.  # time of last kinect depth map access
         self._frame_time = 1./KinGeo.default_max_frq  # min time in s per frame
-        self._depth_map = None  # holds numpy array of
-        self._pc_timestamp = 0.
-        self._points_arr_timestamp = 0.
+        self._frame = None  # holds newest (depth, time stamp) frame
+        self._depth_map = None  # DepthMap of newest frame
+        self._lock = th.Lock()  # held while current frame is updated
         # todo: set inclination to 0
 
     @property
@@ -65,20 +71,28 @@ class KinGeo:
     @property
     def depth_map(self) -> 'DepthMap':
         """
-        Gets DepthMap for current sensor frame
+        Gets DepthMap for current sensor frame.
+        The same DepthMap is returned until a new frame arrives, so
+        that products derived from it are shared between callers.
+        May be called from multiple threads.
         :return: DepthMap
         """
-        # If elapsed time since last frame is greater than frame
-        # rate, update depth map.
-        if self.t_since_last_frame > self._frame_time:
-            # get depth map from first Kinect found
-            self._depth_map = fn.sync_get_depth()
-            if not self._depth_map:
-                raise OSError('Could not connect to Kinect')
-            self.last_access = t.time()
-        # Return the depth-map portion of the depth map array.
-        # The second part of the array is the timestamp.
-        return DepthMap(self._depth_map)
+        with self._lock:
+            # If elapsed time since last frame is greater than frame
+            # rate, update depth map with the newest frame, if one has
+            # arrived. Only the first frame is waited for.
+            if self.t_since_last_frame > self._frame_time:
+                frame = self.source.latest(
+                    0. if self._frame else FIRST_FRAME_TIMEOUT)
+                if frame:
+                    self._frame = frame
+                elif not self._frame:
+                    raise OSError('Could not connect to Kinect')
+                self.last_access = t.time()
+            if self._depth_map is None or \
+                    self._depth_map.arr is not self._frame:
+                self._depth_map = DepthMap(self._frame)
+            return self._depth_map
 
     @property
     def point_cloud(self) -> 'PointCloud':
@@ -88,28 +102,125 @@ class KinGeo:
         [column][row][point position]
         :return: PointCloud
         """
-        # build point cloud from current depth map
+        # get point cloud of current depth map
         return self.depth_map.point_cloud
 
     @property
     def points_arr(self):
-        return self.point_cloud.point_arr
+        return self.depth_map.point_arr
+
+    @property
+    def frame_stats(self) -> dict:
+        """
+        Gets counts of frames received, read, and dropped before
+        they were read.
+        :return: dict
+        """
+        return self.source.stats
+
+    def record(self, path: str) -> DepthLogWriter:
+        """
+        Begins recording every frame received from source to a depth
+        log at passed path.
+        :param path: str
+        :return: DepthLogWriter
+        """
+        self.stop_recording()
+        self.source.recorder = DepthLogWriter(path)
+        return self.source.recorder
+
+    def stop_recording(self) -> None:
+        """
+        Ends recording, if frames are being recorded.
+        :return: None
+        """
+        recorder = self.source.recorder
+        self.source.recorder = None
+        if recorder:
+            recorder.close()
+
+    def close(self) -> None:
+        """
+        Stops frame acquisition and recording.
+        :return: None
+        """
+        self.source.stop()
+        self.stop_recording()
+
+
+class ReplayKinGeo(KinGeo):
+    """
+    KinGeo taking frames from a recorded depth log rather than
+    a connected Kinect.
+    """
+    def __init__(self, path: str, speed: float=1., loop: bool=False):
+        """
+        :param path: path of depth log
+        :param speed: multiple of real time at which log is replayed,
+            or None to hand out each recorded frame in turn, as fast as
+            frames are asked for.
+        :param loop: whether to restart log once finished
+        """
+        super().__init__(replay_source(path, speed, loop))
+        if not speed:
+            self.access_hz = float('inf')  # every access gets a frame
+
+    @property
+    def finished(self) -> bool:
+        """
+        Gets whether all frames of log have been replayed.
+        :return: bool
+        """
+        return self.source.finished.is_set()
 
 
 class DepthMap:
+    """
+    Depth frame from the Kinect, along with products derived from it.
+    Each product is found once, when first needed, and then shared
+    by all threads using the DepthMap.
+    """
     def __init__(self, arr):
         self.arr = arr
-        self._point_cloud = None
+        self._products = {}
+        self._lock = th.RLock()  # held while a product is found
 
     @property
     def time_stamp(self):
         return self.arr[1]
 
+    def memoize(self, name: str, func):
+        """
+        Gets named product of depth map, calling passed function to
+        find it if it has not yet been found.
+        :param name: str
+        :param func: Callable[[], Any] producing product
+        :return: product
+        """
+        try:
+            return self._products[name]
+        except KeyError:
+            pass
+        # another thread may be finding the same product; wait for it
+        with self._lock:
+            if name not in self._products:
+                self._products[name] = func()
+            return self._products[name]
+
     @property
     def point_cloud(self) -> 'PointCloud':
-        if not self._point_cloud:
-            self._point_cloud = PointCloud(self.arr)
-        return self._point_cloud
+        return self.memoize('point_cloud', lambda: PointCloud(self.arr))
+
+    @property
+    def point_arr(self) -> np.ndarray:
+        return self.memoize('point_arr', lambda: self.point_cloud.point_arr)
+
+    @property
+    def nearest_non_traversable_points(self) -> np.ndarray:
+        return self.memoize(
+            'nearest_non_traversable_points',
+            lambda: self.point_cloud.nearest_non_traversable_points
+        )
 
     def dump(self, path: str) -> None:
         arr = self.arr[0]
@@ -0,0 +1,250 @@
+"""
+Module handling recording of depth frames to a log file, and replay of
+recorded logs in place of a Kinect.
+
+A log is an append-only file of fixed size records, each holding one
+depth frame with its time stamp, after a short header describing the
+frame shape. Alongside it, an index file holds the time stamps of each
+complete record. Records are only indexed once fully written, so a log
+cut short by a crash is still readable up to its last indexed frame.
+"""
+import os
+import queue
+import threading as th
+import time
+import typing as ty
+
+import numpy as np
+
+from .sources import BackgroundSource, FrameSource, DEPTH_SHAPE
+
+MAGIC = b'KDLOG\x00\x00\x01'  # identifies log files, and their version
+HEADER_SIZE = 64  # bytes; records begin on an aligned offset
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'), ('rows', '<u4'), ('columns', '<u4')])
+# time stamp of frame given by sensor, and monotonic time received
+INDEX_DTYPE = np.dtype([('time_stamp', '<i8'), ('received', '<f8')])
+INDEX_SUFFIX = '.idx'
+WRITE_QUEUE_SIZE = 90  # frames, ~3s at 30 fps, buffered before dropping
+
+
+def record_dtype(shape: tuple=DEPTH_SHAPE) -> np.dtype:
+    """
+    Gets dtype of a single log record holding frames of passed shape.
+    :param shape: rows, columns of depth frame
+    :return: np.dtype
+    """
+    return np.dtype([('index', INDEX_DTYPE), ('depth', '<u2', shape)])
+
+
+class DepthLogWriter:
+    """
+    Streams depth frames into a log file from a background thread,
+    so that the thread producing frames never waits on disk.
+    If frames arrive faster than they can be written, frames that do
+    not fit in the write queue are dropped and counted.
+    """
+    def __init__(self, path: str, shape: tuple=DEPTH_SHAPE,
+                 queue_size: int=WRITE_QUEUE_SIZE):
+        self.path = path
+        self.shape = tuple(shape)
+        self.written = 0
+        self.dropped = 0
+        self._dtype = record_dtype(shape)
+        self._queue = queue.Queue(queue_size)
+        header = np.zeros(1, HEADER_DTYPE)
+        header[0] = MAGIC, shape[0], shape[1]
+        self._log = open(path, 'wb')
+        self._log.write(header.tobytes().ljust(HEADER_SIZE, b'\x00'))
+        self._index = open(path + INDEX_SUFFIX, 'wb')
+        self._thread = th.Thread(
+            target=self._main, name='Depth Log Writer', daemon=True)
+        self._thread.start()
+
+    def write(self, depth: np.ndarray, time_stamp) -> bool:
+        """
+        Queues passed frame to be written to log. Does not block.
+        :param depth: np.ndarray of raw depth values; copied
+        :param time_stamp: time stamp of frame
+        :return: bool of whether frame was queued
+        """
+        record = np.empty((), self._dtype)
+        record['index'] = time_stamp, time.monotonic()
+        record['depth'] = depth
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def close(self) -> None:
+        """
+        Writes all queued frames, then closes log.
+        :return: None
+        """
+        self._queue.put(None)
+        self._thread.join()
+        self._log.close()
+        self._index.close()
+
+    def _main(self) -> None:
+        while True:
+            record = self._queue.get()
+            if record is None:
+                return
+            self._log.write(record.tobytes())
+            self._log.flush()
+            # record is complete; index it
+            self._index.write(record['index'].tobytes())
+            self._index.flush()
+            self.written += 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class DepthLog:
+    """
+    Recorded depth log, read through a memory map; frames are
+    views into the file, and are not copied.
+    A log must hold at least one complete frame to be opened.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        header = np.fromfile(path, HEADER_DTYPE, 1)
+        if not len(header) or header[0]['magic'] != MAGIC:
+            raise ValueError('{} is not a depth log'.format(path))
+        self.shape = int(header[0]['rows']), int(header[0]['columns'])
+        dtype = record_dtype(self.shape)
+        index = np.fromfile(path + INDEX_SUFFIX, INDEX_DTYPE)
+        n_complete = (os.path.getsize(path) - HEADER_SIZE) // dtype.itemsize
+        n_records = min(len(index), n_complete)
+        if not n_records:
+            # such as a recording stopped before its first frame
+            raise ValueError('{} holds no complete frames'.format(path))
+        self.index = index[:n_records]
+        self._records = np.memmap(path, dtype, 'r', HEADER_SIZE, (n_records,))
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __getitem__(self, i: int) -> ty.Tuple[np.ndarray, int]:
+        """
+        Gets frame with passed index.
+        :param i: int
+        :return: (depth, time stamp) tuple
+        """
+        return self._records['depth'][i], int(self.time_stamps[i])
+
+    @property
+    def time_stamps(self) -> np.ndarray:
+        return self.index['time_stamp']
+
+    @property
+    def received_times(self) -> np.ndarray:
+        return self.index['received']
+
+    @property
+    def duration(self) -> float:
+        """
+        Gets time in s between receipt of first and last frame.
+        :return: float
+        """
+        return float(self.received_times[-1] - self.received_times[0])
+
+    def find_frame(self, elapsed: float) -> int:
+        """
+        Gets index of last frame received at or before passed time
+        since the start of the recording.
+        :param elapsed: float (s)
+        :return: int
+        """
+        times = self.received_times - self.received_times[0]
+        return max(int(np.searchsorted(times, elapsed, 'right')) - 1, 0)
+
+
+class ReplaySource(BackgroundSource):
+    """
+    Source replaying a recorded depth log in real time, or at a
+    multiple of real time, on a background thread.
+    Frames arrive at the times they were originally received, so
+    frames may be dropped as they would have been when recorded.
+    """
+    def __init__(self, log: DepthLog, speed: float=1., loop: bool=False,
+                 clock=time.monotonic, wait=None):
+        """
+        :param log: DepthLog
+        :param speed: multiple of real time at which log is replayed
+        :param loop: whether to restart log once finished
+        :param clock: monotonic clock frames are timed by
+        :param wait: function waiting passed time in s on clock,
+            returning True if replay was stopped meanwhile; waits on
+            the source's stop event if None.
+        """
+        super().__init__()
+        self.log = log
+        self.speed = speed
+        self.loop = loop
+        self.finished = th.Event()
+        self._clock = clock
+        self._wait = wait if wait else self._stopped.wait
+
+    def acquire(self) -> None:
+        times = self.log.received_times - self.log.received_times[0]
+        while True:
+            start = self._clock()
+            for i in range(len(self.log)):
+                delay = start + times[i] / self.speed - self._clock()
+                if self._wait(max(delay, 0)):
+                    return
+                self._put(*self.log[i])
+            if not self.loop:
+                break
+        self.finished.set()
+
+
+class StepReplaySource(FrameSource):
+    """
+    Source replaying each frame of a recorded depth log in turn,
+    as fast as frames are asked for. Frames are views into the log.
+    """
+    def __init__(self, log: DepthLog, loop: bool=False):
+        self.log = log
+        self.loop = loop
+        self.position = 0  # index of next frame
+        self.finished = th.Event()
+
+    def latest(self, timeout: float=0.):
+        if self.position >= len(self.log):
+            if not self.loop:
+                self.finished.set()
+                return None
+            self.position = 0
+        frame = self.log[self.position]
+        self.position += 1
+        return frame
+
+    @property
+    def stats(self) -> dict:
+        return {'received': self.position, 'read': self.position,
+                'dropped': 0}
+
+
+def replay_source(path: str, speed: float=1., loop: bool=False) \
+        -> FrameSource:
+    """
+    Gets source replaying log at passed path.
+    :param path: path of depth log
+    :param speed: multiple of real time at which log is replayed,
+        or None to replay every frame as fast as it is asked for.
+    :param loop: whether to restart log once finished
+    :return: FrameSource
+    """
+    log = DepthLog(path)
+    if speed:
+        return ReplaySource(log, speed, loop)
+    return StepReplaySource(log, loop)
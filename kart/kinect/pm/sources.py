@@ -0,0 +1,283 @@
+"""
+Module holding sources of depth frames used by KinGeo.
+
+Each source returns frames as (depth array, time stamp) tuples, in
+the form returned by freenect.sync_get_depth.
+Background sources acquire frames on their own thread, keeping them in
+a preallocated DepthFrameRing, so that getting the newest frame never
+waits on the sensor.
+"""
+import threading as th
+import time
+import typing as ty
+
+import numpy as np
+
+try:
+    import freenect as fn
+except ImportError as e:
+    fn = None
+    print('could not import freenect: ' + str(e))
+
+DEPTH_SHAPE = (480, 640)  # rows, columns of kinect depth frame
+N_RING_FRAMES = 3  # frames held by ring of background sources
+
+
+class DepthFrameRing:
+    """
+    Preallocated ring of depth frames, written by one acquisition
+    thread and read by others.
+    Frames are copied in and out without holding the lock, so neither
+    side waits on the other's copy. Each slot has a sequence number,
+    bumped before the slot is rewritten, which a reader checks after
+    its copy; a frame overwritten while it was copied is dropped.
+    """
+    def __init__(self, n_frames: int=N_RING_FRAMES,
+                 shape: tuple=DEPTH_SHAPE):
+        self._buffers = np.zeros((n_frames,) + shape, np.uint16)
+        self._time_stamps = [None] * n_frames
+        self._seqs = [0] * n_frames  # times each slot has been written
+        self._newest = -1  # index of newest frame, or -1 if none
+        self._unread = False  # whether newest frame is yet to be read
+        self._lock = th.Lock()
+        self._new_frame = th.Condition(self._lock)
+        self.received = 0  # frames put into ring
+        self.read = 0  # frames handed out by ring
+        self.dropped = 0  # frames replaced before they were read
+
+    def put(self, depth: np.ndarray, time_stamp) -> None:
+        """
+        Copies passed frame into the ring, replacing the oldest frame.
+        :param depth: np.ndarray of raw depth values
+        :param time_stamp: time stamp of frame
+        :return: None
+        """
+        with self._lock:
+            i = (self._newest + 1) % len(self._buffers)
+            self._seqs[i] += 1  # readers still copying slot i will retry
+        self._buffers[i] = depth
+        with self._lock:
+            self._time_stamps[i] = time_stamp
+            if self._unread:
+                self.dropped += 1
+            self._newest = i
+            self._unread = True
+            self.received += 1
+            self._new_frame.notify_all()
+
+    def newest(self, timeout: float=0.) -> ty.Tuple[np.ndarray, ty.Any]:
+        """
+        Gets a copy of the newest frame not yet read, waiting up to
+        passed timeout for one to arrive.
+        :param timeout: maximum time in s to wait; 0 does not wait
+        :return: (depth, time stamp) tuple, or None
+        """
+        while True:
+            with self._lock:
+                if not self._unread and timeout:
+                    self._new_frame.wait_for(lambda: self._unread, timeout)
+                if not self._unread:
+                    return None
+                self._unread = False
+                i = self._newest
+                seq = self._seqs[i]
+                time_stamp = self._time_stamps[i]
+            depth = self._buffers[i].copy()
+            with self._lock:
+                if self._seqs[i] == seq:
+                    self.read += 1
+                    return depth, time_stamp
+                self.dropped += 1  # slot was rewritten while copied
+
+    @property
+    def stats(self) -> dict:
+        return {
+            'received': self.received,
+            'read': self.read,
+            'dropped': self.dropped
+        }
+
+
+class FrameSource:
+    """
+    Abstract source of depth frames.
+
+    If a recorder (such as a DepthLogWriter) is set, every frame
+    received by the source is passed to its write method.
+    """
+    recorder = None
+
+    def start(self) -> None:
+        """
+        Begins acquisition, if source acquires frames in background.
+        :return: None
+        """
+
+    def stop(self) -> None:
+        """
+        Ends acquisition.
+        :return: None
+        """
+
+    def latest(self, timeout: float=0.) -> ty.Tuple[np.ndarray, ty.Any]:
+        """
+        Gets the newest frame that has not yet been returned.
+        :param timeout: maximum time in s to wait for a frame
+        :return: (depth, time stamp) tuple, or None if no new frame
+        """
+        raise NotImplementedError
+
+    @property
+    def stats(self) -> dict:
+        """
+        Gets counts of frames received, read and dropped by source.
+        :return: dict
+        """
+        raise NotImplementedError
+
+
+class SyncFreenectSource(FrameSource):
+    """
+    Source getting each frame with a blocking call to
+    freenect.sync_get_depth.
+    """
+    def __init__(self):
+        if fn is None:
+            raise OSError('Could not connect to Kinect; freenect missing')
+        self.received = 0
+
+    def latest(self, timeout: float=0.):
+        frame = fn.sync_get_depth()
+        if not frame:
+            raise OSError('Could not connect to Kinect')
+        self.received += 1
+        if self.recorder:
+            self.recorder.write(*frame)
+        return frame
+
+    @property
+    def stats(self) -> dict:
+        return {'received': self.received, 'read': self.received,
+                'dropped': 0}
+
+
+class BackgroundSource(FrameSource):
+    """
+    Abstract source acquiring frames on its own thread into
+    a DepthFrameRing.
+    """
+    def __init__(self, n_frames: int=N_RING_FRAMES):
+        self.ring = DepthFrameRing(n_frames)
+        self._stopped = th.Event()
+        self._thread = None
+        self.error = None  # exception that ended acquisition, if any
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = th.Thread(
+            target=self._main, name=type(self).__name__, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(1)
+
+    def latest(self, timeout: float=0.):
+        if self.error:
+            raise OSError('frame acquisition failed') from self.error
+        return self.ring.newest(timeout)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    @property
+    def stats(self) -> dict:
+        return self.ring.stats
+
+    def _main(self) -> None:
+        try:
+            self.acquire()
+        except Exception as e:
+            self.error = e
+            raise
+
+    def acquire(self) -> None:
+        """
+        Puts frames into ring until source is stopped.
+        Run on the acquisition thread.
+        :return: None
+        """
+        raise NotImplementedError
+
+    def _put(self, depth: np.ndarray, time_stamp) -> None:
+        """
+        Puts a received frame into ring, and passes it to recorder.
+        :return: None
+        """
+        self.ring.put(depth, time_stamp)
+        recorder = self.recorder
+        if recorder:
+            recorder.write(depth, time_stamp)
+
+
+class AsyncFreenectSource(BackgroundSource):
+    """
+    Source using the callback api of freenect, whose run loop puts
+    each depth frame into the ring as soon as it is received.
+    """
+    def __init__(self, n_frames: int=N_RING_FRAMES):
+        if fn is None:
+            raise OSError('Could not connect to Kinect; freenect missing')
+        super().__init__(n_frames)
+
+    def acquire(self) -> None:
+        fn.runloop(depth=self._depth_callback, body=self._body)
+
+    def _depth_callback(self, dev, depth, time_stamp) -> None:
+        # passed array is only valid during callback; ring copies it
+        self._put(depth, time_stamp)
+
+    def _body(self, *args) -> None:
+        if self._stopped.is_set():
+            raise fn.Kill
+
+
+class SyntheticSource(BackgroundSource):
+    """
+    Source producing frames from a passed generator function at
+    a fixed rate, for use when no kinect is attached.
+    """
+    def __init__(
+            self,
+            generator: ty.Callable[[int], np.ndarray]=None,
+            frq: float=30.,
+            n_frames: int=N_RING_FRAMES
+    ):
+        """
+        :param generator: function returning raw depth array for passed
+            frame number. If None, produces frames with no readings.
+        :param frq: frequency in Hz at which frames are produced
+        :param n_frames: size of ring
+        """
+        super().__init__(n_frames)
+        self.generator = generator if generator else self.empty_frame
+        self.frq = frq
+
+    def acquire(self) -> None:
+        period = 1 / self.frq
+        deadline = time.monotonic()
+        frame_n = 0
+        while not self._stopped.is_set():
+            # time stamps increase like the kinect's own frame counter
+            self._put(self.generator(frame_n), frame_n)
+            frame_n += 1
+            deadline += period
+            self._stopped.wait(max(deadline - time.monotonic(), 0))
+
+    @staticmethod
+    def empty_frame(frame_n: int) -> np.ndarray:
+        return np.full(DEPTH_SHAPE, 2047, np.uint16)
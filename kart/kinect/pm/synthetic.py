@@ -0,0 +1,374 @@
+"""
+Module rendering synthetic Kinect depth frames from simple scene
+descriptions, for tests and benchmarks run without a Kinect.
+
+Rays are cast from the sensor through each pixel, using the inverse
+of the depth model by which cyfunc converts depth frames to points,
+so that a rendered surface is placed back where it was described.
+
+Scenes are described in the same sensor-relative frame as point
+clouds: x is lateral (positive right), y is distance ahead, and z is
+height, with the sensor at the origin.
+"""
+import math
+import typing as ty
+
+import numpy as np
+
+from .cyfunc import sensor_config
+from .sources import DEPTH_SHAPE
+
+SAMPLE_DISTANCE = sensor_config()['sample_distance']  # px between samples
+NO_READING_DEPTH = 2047
+MAX_READING_DEPTH = 2046
+MAX_RANGE = 8.  # m, depth beyond which the sensor gives no reading
+SENSOR_HEIGHT = 0.5  # m, default height of sensor above ground
+
+
+def depth_to_raw(depth: np.ndarray) -> np.ndarray:
+    """
+    Converts depth in meters to raw kinect depth values; the
+    inverse of the conversion made by cyfunc.
+    Depths beyond MAX_RANGE, where the depth model diverges, produce
+    the value given where the sensor has no reading.
+    :param depth: np.ndarray of depths (m)
+    :return: np.ndarray of np.uint16
+    """
+    with np.errstate(invalid='ignore'):
+        raw = np.round((np.arctan(depth * 8.09) - 1.1863) * 2842.5)
+        valid = (depth <= MAX_RANGE) & (raw >= 0) & \
+            (raw <= MAX_READING_DEPTH)
+    return np.where(valid, raw, NO_READING_DEPTH).astype(np.uint16)
+
+
+class Primitive:
+    """
+    Abstract scene element.
+    """
+    def intersect(self, rays: np.ndarray) -> np.ndarray:
+        """
+        Gets depth at which each passed ray first meets primitive.
+        Each ray is the position of its point at a depth of 1, so that
+        the position at which it meets the primitive is depth * ray.
+        :param rays: np.ndarray (N, 3)
+        :return: np.ndarray (N,) of depth, inf where ray misses
+        """
+        raise NotImplementedError
+
+    def bounds(self) -> tuple or None:
+        """
+        Gets sphere enclosing primitive, used to skip rays that can
+        not meet it.
+        :return: (center, radius) tuple, or None if unbounded
+        """
+        return None
+
+
+class Ground(Primitive):
+    """
+    Flat, level ground below the sensor.
+    """
+    def __init__(self, z: float=-SENSOR_HEIGHT):
+        self.z = z
+
+    def intersect(self, rays):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            depth = self.z / rays[:, 2]
+        return np.where(depth > 0, depth, np.inf)
+
+
+class Box(Primitive):
+    """
+    Box resting on the ground, rotated by yaw (radians) about its
+    vertical axis.
+    """
+    def __init__(self, x: float, y: float, width: float, length: float,
+                 height: float, yaw: float=0., z: float=-SENSOR_HEIGHT):
+        self.center = np.array((x, y, z + height / 2))
+        self.half_size = np.array((width, length, height)) / 2
+        self.yaw = yaw
+
+    def intersect(self, rays):
+        cos, sin = math.cos(self.yaw), math.sin(self.yaw)
+        # rays and center in the frame of the box, in which it is
+        # axis aligned, then intersected by the slab method.
+        x, y = rays[:, 0], rays[:, 1]
+        c = self.center
+        local = (
+            (cos * x + sin * y, cos * c[0] + sin * c[1]),
+            (cos * y - sin * x, cos * c[1] - sin * c[0]),
+            (rays[:, 2], c[2])
+        )
+        near = np.full(len(rays), -np.inf)
+        far = np.full(len(rays), np.inf)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for (direction, center), half_size in zip(local, self.half_size):
+                t1 = (center - half_size) / direction
+                t2 = (center + half_size) / direction
+                # rays parallel to a slab give nan where they lie on its
+                # edge; fmin and fmax leave them unbounded by it.
+                np.fmax(near, np.fmin(t1, t2), out=near)
+                np.fmin(far, np.fmax(t1, t2), out=far)
+        return np.where((near <= far) & (near > 0), near, np.inf)
+
+    def bounds(self):
+        return self.center, float(np.linalg.norm(self.half_size))
+
+
+def Wall(x1: float, y1: float, x2: float, y2: float, height: float=2.,
+         thickness: float=0.1, z: float=-SENSOR_HEIGHT) -> Box:
+    """
+    Gets a thin box standing on the ground between two passed points.
+    :return: Box
+    """
+    return Box(
+        (x1 + x2) / 2, (y1 + y2) / 2, math.hypot(x2 - x1, y2 - y1),
+        thickness, height, math.atan2(y2 - y1, x2 - x1), z)
+
+
+class Cone(Primitive):
+    """
+    Upright cone, such as a traffic cone, resting on the ground.
+    """
+    def __init__(self, x: float, y: float, radius: float=0.15,
+                 height: float=0.5, z: float=-SENSOR_HEIGHT):
+        self.x, self.y, self.z = x, y, z
+        self.radius = radius
+        self.height = height
+
+    def intersect(self, rays):
+        k_sq = (self.radius / self.height) ** 2
+        apex = self.z + self.height
+        # points p = t * ray on cone surface satisfy
+        # (px - x)^2 + (py - y)^2 = k^2 (apex - pz)^2
+        a = rays[:, 0] ** 2 + rays[:, 1] ** 2 - k_sq * rays[:, 2] ** 2
+        b = -2 * (rays[:, 0] * self.x + rays[:, 1] * self.y) + \
+            2 * k_sq * apex * rays[:, 2]
+        c = self.x ** 2 + self.y ** 2 - k_sq * apex ** 2
+        with np.errstate(invalid='ignore', divide='ignore'):
+            root = np.sqrt(b * b - 4 * a * c)
+            roots = np.stack(((-b - root) / (2 * a), (-b + root) / (2 * a)))
+            z = roots * rays[:, 2]
+            valid = (roots > 0) & (z >= self.z) & (z <= apex)
+        return np.where(valid, roots, np.inf).min(axis=0)
+
+    def bounds(self):
+        return np.array((self.x, self.y, self.z + self.height / 2)), \
+            math.hypot(self.radius, self.height / 2)
+
+
+class Ramp(Primitive):
+    """
+    Plane rising from the ground at passed slope (radians), beginning
+    at passed position and climbing in the direction of yaw, where a
+    yaw of 0 climbs directly away from the sensor.
+    """
+    def __init__(self, x: float, y: float, width: float, length: float,
+                 slope: float, yaw: float=0., z: float=-SENSOR_HEIGHT):
+        self.axis = np.array((math.sin(yaw), math.cos(yaw)))  # climb
+        self.lateral = np.array((self.axis[1], -self.axis[0]))
+        self.start = np.array((x, y))
+        self.width = width
+        self.length = length
+        self.tan = math.tan(slope)
+        self.z = z
+        rise = self.tan * length
+        self._bounds = (
+            np.append(self.start + self.axis * length / 2, z + rise / 2),
+            math.sqrt(length ** 2 + width ** 2 + rise ** 2) / 2
+        )
+
+    def intersect(self, rays):
+        along = rays[:, :2] @ self.axis
+        across = rays[:, :2] @ self.lateral
+        s0 = self.start @ self.axis
+        l0 = self.start @ self.lateral
+        # rise above ground is tan * (t * along - s0) at depth t
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = (self.z - self.tan * s0) / (rays[:, 2] - self.tan * along)
+            s = t * along - s0
+            lateral = t * across - l0
+            valid = (t > 0) & (s >= 0) & (s <= self.length) & \
+                (np.abs(lateral) <= self.width / 2)
+        return np.where(valid, t, np.inf)
+
+    def bounds(self):
+        return self._bounds
+
+
+class Scene:
+    """
+    Collection of primitives rendered together.
+    """
+    def __init__(self, primitives: ty.Iterable[Primitive]=(),
+                 ground: bool=True, sensor_height: float=SENSOR_HEIGHT):
+        self.primitives = list(primitives)
+        if ground:
+            self.primitives.append(Ground(-sensor_height))
+
+    def add(self, primitive: Primitive) -> 'Scene':
+        self.primitives.append(primitive)
+        return self
+
+    def depth(self, rays: np.ndarray) -> np.ndarray:
+        """
+        Gets depth of nearest surface met by each passed ray.
+        :param rays: np.ndarray (N, 3)
+        :return: np.ndarray (N,), inf where no surface is met
+        """
+        depth = np.full(len(rays), np.inf)
+        for primitive in self.primitives:
+            np.minimum(depth, primitive.intersect(rays), out=depth)
+        return depth
+
+
+def clutter_scene(n_obstacles: int, seed: int=0, width: float=8.,
+                  near: float=1., far: float=8.,
+                  sensor_height: float=SENSOR_HEIGHT) -> Scene:
+    """
+    Gets scene with passed number of boxes and cones placed at random
+    in front of the sensor.
+    :param n_obstacles: int
+    :param seed: seed of random placement
+    :param width: m, width of area obstacles are placed in
+    :param near: m, least distance ahead at which obstacles are placed
+    :param far: m, greatest distance ahead at which obstacles are placed
+    :return: Scene
+    """
+    random = np.random.RandomState(seed)
+    z = -sensor_height
+    scene = Scene(sensor_height=sensor_height)
+    for _ in range(n_obstacles):
+        x = random.uniform(-width / 2, width / 2)
+        y = random.uniform(near, far)
+        if random.rand() < 0.5:
+            scene.add(Box(
+                x, y, *random.uniform(0.1, 0.8, 2), random.uniform(0.2, 1.2),
+                yaw=random.uniform(0, math.pi), z=z))
+        else:
+            scene.add(Cone(x, y, random.uniform(0.1, 0.3),
+                           random.uniform(0.3, 0.8), z=z))
+    return scene
+
+
+class Renderer:
+    """
+    Renders scenes to kinect depth frames.
+
+    If sampled_only is True, only the pixels sampled by cyfunc when
+    point clouds are made are rendered, and all others are left with
+    no reading. This is many times faster, and produces the same
+    point clouds.
+
+    Sensor angles not passed are those cyfunc converts frames with,
+    read at each render, so that frames follow changes made by
+    cyfunc.configure_sensor.
+    """
+    def __init__(self, sampled_only: bool=True,
+                 angular_width: float=None,
+                 angular_height: float=None,
+                 angular_elevation: float=None,
+                 shape: tuple=DEPTH_SHAPE):
+        self.shape = shape
+        self.sampled_only = sampled_only
+        self._step = SAMPLE_DISTANCE if sampled_only else 1
+        self._angles = {
+            'angular_width': angular_width,
+            'angular_height': angular_height,
+            'angular_elevation': angular_elevation
+        }
+        self._rays_angles = None  # angles rays were last found with
+        self._update_rays()
+
+    def _update_rays(self) -> None:
+        """
+        Finds the ray of each rendered pixel, if sensor angles have
+        changed since they were last found.
+        :return: None
+        """
+        config = sensor_config()
+        angles = tuple(config[name] if angle is None else angle
+                       for name, angle in self._angles.items())
+        if angles == self._rays_angles:
+            return
+        angular_width, angular_height, angular_elevation = angles
+        rows, columns = self.shape
+        angular_x = (np.arange(0, columns, self._step) - columns // 2) / \
+            columns * angular_width
+        angular_y = (np.arange(0, rows, self._step) - rows // 2) / rows * \
+            angular_height + angular_elevation
+        self._rays = np.empty((len(angular_y), len(angular_x), 3))
+        self._rays[:, :, 0] = np.sin(angular_x)
+        self._rays[:, :, 1] = 1
+        self._rays[:, :, 2] = -np.sin(angular_y)[:, np.newaxis]
+        # x / y and -z / y of each rendered column and row, which
+        # increase monotonically, and so bound the rays meeting a volume
+        self._x_ratios = self._rays[0, :, 0]
+        self._z_ratios = -self._rays[:, 0, 2]
+        self._rays_angles = angles
+
+    def render(self, scene: Scene) -> np.ndarray:
+        """
+        Renders passed scene.
+        :param scene: Scene
+        :return: np.ndarray of raw depth values (480, 640) uint16
+        """
+        self._update_rays()
+        depth = np.full(self._rays.shape[:2], np.inf)
+        for primitive in scene.primitives:
+            window = self._window(primitive.bounds())
+            if window is None:
+                continue  # primitive is out of view
+            rays = self._rays[window]
+            window_depth = depth[window]
+            np.minimum(
+                window_depth,
+                primitive.intersect(rays.reshape(-1, 3)).reshape(
+                    rays.shape[:2]),
+                out=window_depth
+            )
+        raw = depth_to_raw(depth)
+        if not self.sampled_only:
+            return raw
+        frame = np.full(self.shape, NO_READING_DEPTH, np.uint16)
+        frame[::self._step, ::self._step] = raw
+        return frame
+
+    def _window(self, bounds) -> tuple or None:
+        """
+        Gets slices of rendered rows and columns whose rays may meet
+        a volume with passed bounds.
+        :param bounds: (center, radius) tuple, or None if unbounded
+        :return: (rows slice, columns slice), or None if none may
+        """
+        full = slice(None), slice(None)
+        if bounds is None:
+            return full
+        (x, y, z), radius = bounds
+        if y + radius <= 0:
+            return None  # volume is behind sensor
+        if y - radius <= 0:
+            return full  # volume reaches sensor; no rays are skipped
+        # extremes of x / y and z / y over the box enclosing the sphere
+        ys = y - radius, y + radius
+        x_ratios = [(x + dx) / y_ for dx in (-radius, radius) for y_ in ys]
+        z_ratios = [(z + dz) / y_ for dz in (-radius, radius) for y_ in ys]
+        columns = np.searchsorted(
+            self._x_ratios, (min(x_ratios), max(x_ratios)))
+        rows = np.searchsorted(
+            self._z_ratios, (-max(z_ratios), -min(z_ratios)))
+        columns = max(columns[0] - 1, 0), columns[1] + 1
+        rows = max(rows[0] - 1, 0), rows[1] + 1
+        if columns[0] >= len(self._x_ratios) or \
+                rows[0] >= len(self._z_ratios) or \
+                columns[1] <= 0 or rows[1] <= 0:
+            return None
+        return slice(*rows), slice(*columns)
+
+    def frame(self, scene: Scene, time_stamp=0) -> tuple:
+        """
+        Renders passed scene as a frame, in the form returned by
+        freenect and accepted by DepthMap.
+        :return: (depth, time stamp) tuple
+        """
+        return self.render(scene), time_stamp
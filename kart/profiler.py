@@ -0,0 +1,170 @@
+"""
+Module holding a sampling profiler, which periodically samples the
+stacks of chosen threads, such as the GoKart's sensor, logic and
+actuator threads, so that the threads and functions in which time is
+spent can be found after a run.
+
+Samples are written as collapsed stacks, one line per distinct stack:
+    Logic Thread;kart.kart:GoKart.logic_tic;... 42
+which may be drawn as a flame graph, ex: with flamegraph.pl or
+speedscope.
+
+The time taken by sampling is measured, and the interval between
+samples is stretched as needed so that the profiler never takes more
+than max_overhead of one core's time; it may be left enabled for
+real runs of the kart.
+"""
+import sys
+import threading as th
+import time
+import typing as ty
+
+SAMPLE_INTERVAL = 0.005  # s between samples
+MAX_OVERHEAD = 0.02  # max fraction of time spent taking samples
+MAX_STACK_DEPTH = 48  # frames kept from the innermost frame outwards
+MAX_STACKS = 4096  # distinct stacks held; others are counted as OTHER
+OTHER = '[other]'  # stack of samples once MAX_STACKS is reached
+TRUNCATED = '[truncated]'  # marks stacks deeper than MAX_STACK_DEPTH
+
+
+class SamplingProfiler:
+    """
+    Samples stacks of passed threads on a background thread.
+    Memory used is bounded by max_stacks, however long it runs.
+    """
+    def __init__(self, threads: ty.Iterable[th.Thread],
+                 interval: float=SAMPLE_INTERVAL,
+                 max_overhead: float=MAX_OVERHEAD,
+                 max_depth: int=MAX_STACK_DEPTH,
+                 max_stacks: int=MAX_STACKS):
+        """
+        :param threads: threads to sample; they need not yet be started
+        :param interval: s between samples
+        :param max_overhead: max fraction of time spent sampling
+        :param max_depth: max frames kept of each stack
+        :param max_stacks: max distinct stacks held
+        """
+        self.threads = list(threads)
+        self.interval = interval
+        self.max_overhead = max_overhead
+        self.max_depth = max_depth
+        self.max_stacks = max_stacks
+        # count of samples of each (thread name, stack) pair, where
+        # stack is a tuple of code objects, outermost first.
+        self.stacks = {}
+        self.n_samples = 0  # sampling passes taken
+        self.sampling_time = 0.  # s spent taking samples
+        self._labels = {}  # label of each sampled code object
+        self._start_time = None
+        self._stop = th.Event()
+        self._thread = th.Thread(
+            target=self._run, name='Profiler Thread', daemon=True)
+
+    def start(self) -> 'SamplingProfiler':
+        self._start_time = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """
+        Stops sampling, and waits for the sampling thread to exit.
+        :return: None
+        """
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def sample(self) -> None:
+        """
+        Takes one sample of the stack of each passed thread that is
+        running.
+        :return: None
+        """
+        frames = sys._current_frames()
+        for thread in self.threads:
+            frame = frames.get(thread.ident)
+            if frame is None:
+                continue
+            codes = []
+            while frame is not None and len(codes) < self.max_depth:
+                code = frame.f_code
+                if code not in self._labels:
+                    self._labels[code] = _label(frame)
+                codes.append(code)
+                frame = frame.f_back
+            if frame is not None:
+                codes.append(TRUNCATED)
+            codes.reverse()
+            key = thread.name, tuple(codes)
+            if key not in self.stacks and \
+                    len(self.stacks) >= self.max_stacks:
+                key = thread.name, (OTHER,)
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+        self.n_samples += 1
+
+    @property
+    def overhead(self) -> float:
+        """
+        Gets fraction of time since start spent taking samples.
+        :return: float
+        """
+        if self._start_time is None:
+            return 0.
+        elapsed = time.perf_counter() - self._start_time
+        return self.sampling_time / elapsed if elapsed > 0 else 0.
+
+    def thread_samples(self) -> ty.Dict[str, int]:
+        """
+        Gets number of samples taken of each thread.
+        :return: dict of thread name: int
+        """
+        counts = {}
+        for (name, _), n in list(self.stacks.items()):
+            counts[name] = counts.get(name, 0) + n
+        return counts
+
+    def collapsed(self) -> ty.List[str]:
+        """
+        Gets samples as collapsed stacks, rooted at thread name, most
+        sampled first.
+        :return: list of str lines
+        """
+        lines = []
+        for (name, codes), n in sorted(
+                list(self.stacks.items()), key=lambda item: -item[1]):
+            labels = [name] + [self._labels.get(code, code)
+                               for code in codes]
+            lines.append('{} {}'.format(';'.join(labels), n))
+        return lines
+
+    def write_collapsed(self, path: str) -> None:
+        """
+        Writes samples as collapsed stacks to passed path.
+        :param path: str
+        :return: None
+        """
+        with open(path, 'w') as f:
+            for line in self.collapsed():
+                f.write(line + '\n')
+
+    def _run(self) -> None:
+        clock = time.perf_counter
+        delay = self.interval
+        while not self._stop.wait(delay):
+            start = clock()
+            self.sample()
+            cost = clock() - start
+            self.sampling_time += cost
+            # stretch interval so that sampling stays within overhead
+            delay = max(self.interval, cost / self.max_overhead - cost)
+
+
+def _label(frame) -> str:
+    # module and qualified name of a frame's function. Frames outside a
+    # module, and older pythons without co_qualname, fall back on
+    # file and plain name. Semicolons separate frames in the collapsed
+    # format, and are replaced.
+    code = frame.f_code
+    module = frame.f_globals.get('__name__') or code.co_filename
+    name = getattr(code, 'co_qualname', code.co_name)
+    return '{}:{}'.format(module, name).replace(';', ',')
@@ -6,3 +6,8 @@ since editing values in a python file is just as easy as editing a
 text-like conf file. Easier perhaps, in that python expressions
 can be used.
 """
+import os
+
+# directory in which generated data, such as turn tables, is cached
+# between runs. If None, nothing is cached.
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'gokart')
@@ -0,0 +1,622 @@
+"""
+Closed loop kinematic simulation of the kart, standing in for its
+motors, steering sensor, and Kinect, so that the GoKart control code
+can be run, and soak tested, without hardware.
+
+The kart is modeled as a bicycle, referenced at its rear axle, whose
+drive motor accelerates and decelerates at fixed rates, and whose
+steering motor turns the wheels at a rate set by its duty cycle.
+The model is controlled through virtual PWM and ADC chips, so that
+a VirtualActuator drives it exactly as an Actuator drives the kart.
+Depth frames are rendered from the model's pose by the synthetic
+scene renderer.
+
+Each loop of the GoKart thread set is run in lockstep with the model
+on simulated time, at its configured frequency, so that simulations
+are repeatable and run as much faster than real time as the host
+allows. Since the time taken by control code is not charged to
+simulated time, the latency of the kart's decisions is measured in
+real time, as compute_latency.
+
+Usage:
+    python -m kart.simulation [--laps N] [--seed N] [--json PATH]
+"""
+import argparse
+import json
+import math
+import sys
+import time
+import typing as ty
+
+import numpy as np
+
+from . import kart as kart_module
+from .actuator.actuator import VirtualActuator, SPEED_CHANNEL, \
+    STEER_DIRECTION_CHANNEL, STEER_RATE_CHANNEL
+from .const.phys_const import WHEEL_BASE, TRACK, MAX_SPEED, \
+    ACCELERATION_RATE, DECELERATION_RATE, MAX_WHEEL_TURN_RATE, \
+    MIN_WHEEL_TURN_ANGLE, MAX_WHEEL_TURN_ANGLE, MIN_WHEEL_TURN_VALUE, \
+    MID_WHEEL_TURN_VALUE, MAX_WHEEL_TURN_VALUE
+from .drive_data.data import DriveData
+from .input.locator import VirtualLocatorInput
+from .input.sensor import KinectInput
+from .kinect.pm.kinect import KinGeo
+from .kinect.pm.sources import FrameSource
+from .kinect.pm.synthetic import Renderer, Scene, Box, Cone, \
+    MAX_RANGE, SENSOR_HEIGHT
+from .util.timing import Histogram
+
+PHYSICS_FRQ = 240  # Hz, rate at which the kart model is stepped
+KINECT_FRQ = 30  # Hz, rate at which the kinect produces frames
+N_PWM_CHANNELS = 16
+# extent of kart body around its rear axle, used to find collisions
+KART_REAR_OVERHANG = 0.2  # m
+KART_FRONT_OVERHANG = 0.3  # m, ahead of front axle
+KART_HALF_WIDTH = TRACK / 2 + 0.1  # m, including wheels
+# ring shaped track around which laps are driven
+TRACK_INNER_RADIUS = 4.  # m
+TRACK_OUTER_RADIUS = 9.  # m
+TRACK_WALL_SEGMENTS = 32  # straight walls making up outer wall
+TRACK_WALL_HEIGHT = 1.  # m
+N_TRACK_OBSTACLES = 6  # obstacles placed at random along track
+LAP_TIMEOUT = 120.  # s of simulated time allowed for each lap
+STALL_TIME = 5.  # s of simulated time kart may stand still in a lap
+STALL_SPEED = 0.05  # m/s, below which kart is considered still
+# outcomes of a lap
+COMPLETED = 'completed'
+COLLISION = 'collision'
+STALLED = 'stalled'
+TIMED_OUT = 'timed_out'
+
+
+class Pose(ty.NamedTuple):
+    """
+    Position of kart's rear axle, and its heading; a heading of 0
+    faces along the y axis, and headings increase turning right.
+    """
+    x: float
+    y: float
+    heading: float
+
+    def to_kart_frame(self, x, y) -> tuple:
+        """
+        Gets passed world positions relative to kart, as lateral
+        (positive right) and forward distances.
+        :param x: float or np.ndarray
+        :param y: float or np.ndarray
+        :return: (lateral, forward) tuple
+        """
+        dx, dy = x - self.x, y - self.y
+        cos, sin = math.cos(self.heading), math.sin(self.heading)
+        return cos * dx - sin * dy, sin * dx + cos * dy
+
+
+class VirtualPwmChannel:
+    """
+    Channel of a VirtualPwmChip, used as pca9685.PwmChannel.
+    """
+    def __init__(self, chip: 'VirtualPwmChip', channel: int):
+        self.chip = chip
+        self.channel = channel
+
+    def get_duty_cycle(self) -> float:
+        return self.chip.duty_cycles[self.channel]
+
+    def set_duty_cycle(self, duty_cycle: float) -> None:
+        self.chip.set_duty_cycle(self.channel, duty_cycle)
+
+    duty_cycle = property(fget=get_duty_cycle, fset=set_duty_cycle)
+
+
+class VirtualPwmChip:
+    """
+    Stand-in for pca9685.PwmChip, holding the duty cycle set on each
+    channel for a KartModel to read.
+    """
+    def __init__(self, n_channels: int=N_PWM_CHANNELS):
+        self.duty_cycles = [0.] * n_channels
+        self.active = False
+
+    def activate(self, frequency: int=0) -> None:
+        self.active = True
+
+    def get_channel(self, channel: int) -> VirtualPwmChannel:
+        return VirtualPwmChannel(self, channel)
+
+    def set_duty_cycle(self, channel: int, duty_cycle: float) -> None:
+        # the chip can only produce duty cycles from 0 to 1
+        self.duty_cycles[channel] = min(max(float(duty_cycle), 0.), 1.)
+
+    def set_duty_cycles(self, duty_cycles: dict) -> None:
+        for channel, duty_cycle in duty_cycles.items():
+            self.set_duty_cycle(channel, duty_cycle)
+
+    def all_off(self) -> None:
+        self.duty_cycles = [0.] * len(self.duty_cycles)
+
+    def resync(self) -> None:
+        pass  # virtual chip can not fall out of sync
+
+    def shutdown(self) -> None:
+        self.duty_cycles = [0.] * len(self.duty_cycles)
+
+
+class VirtualAdc:
+    """
+    Stand-in for ads1115.Ads1115, sampling the steering position
+    sensor of a KartModel.
+    """
+    def __init__(self, model: 'KartModel'):
+        self.model = model
+
+    def sample(self) -> int:
+        """
+        Gets value the steering position sensor would give at the
+        model's wheel angle; the inverse of Actuator.wheel_angle.
+        :return: int
+        """
+        angle = self.model.wheel_angle
+        if angle >= 0:
+            value = MID_WHEEL_TURN_VALUE + angle / MAX_WHEEL_TURN_ANGLE * \
+                (MAX_WHEEL_TURN_VALUE - MID_WHEEL_TURN_VALUE)
+        else:
+            value = MID_WHEEL_TURN_VALUE - angle / MIN_WHEEL_TURN_ANGLE * \
+                (MID_WHEEL_TURN_VALUE - MIN_WHEEL_TURN_VALUE)
+        return int(round(value))
+
+
+class KartModel:
+    """
+    Kinematic bicycle model of the kart, driven by the duty cycles
+    set on its virtual PWM chip.
+    """
+    def __init__(self, pose: Pose=Pose(0., 0., 0.),
+                 acceleration: float=ACCELERATION_RATE,
+                 deceleration: float=DECELERATION_RATE,
+                 max_wheel_turn_rate: float=MAX_WHEEL_TURN_RATE):
+        self.acceleration = acceleration
+        self.deceleration = deceleration
+        self.max_wheel_turn_rate = max_wheel_turn_rate
+        self.pwm = VirtualPwmChip()
+        self.adc = VirtualAdc(self)
+        self.reset(pose)
+
+    def reset(self, pose: Pose) -> None:
+        """
+        Places kart at rest at passed pose, with wheels straight.
+        :param pose: Pose
+        :return: None
+        """
+        self.pose = pose
+        self.speed = 0.  # m/s
+        self.wheel_angle = 0.  # radians, positive right
+        self.distance = 0.  # m travelled since reset
+        self.pwm.shutdown()
+
+    def step(self, dt: float) -> None:
+        """
+        Advances model by passed time.
+        :param dt: float (s)
+        :return: None
+        """
+        duty_cycles = self.pwm.duty_cycles
+        # steering motor turns wheels until they reach their limits
+        direction = 1 if duty_cycles[STEER_DIRECTION_CHANNEL] >= 0.5 else -1
+        self.wheel_angle = min(max(
+            self.wheel_angle + direction * dt * self.max_wheel_turn_rate *
+            duty_cycles[STEER_RATE_CHANNEL],
+            MIN_WHEEL_TURN_ANGLE), MAX_WHEEL_TURN_ANGLE)
+        # drive motor approaches the speed set by its throttle
+        target_speed = duty_cycles[SPEED_CHANNEL] * MAX_SPEED
+        if target_speed > self.speed:
+            self.speed = min(self.speed + self.acceleration * dt,
+                             target_speed)
+        else:
+            self.speed = max(self.speed - self.deceleration * dt,
+                             target_speed)
+        # rear axle moves along heading, which turns at a rate set by
+        # wheel angle; heading is integrated at the step's midpoint.
+        x, y, heading = self.pose
+        step_distance = self.speed * dt
+        turn = step_distance * math.tan(self.wheel_angle) / WHEEL_BASE
+        mid_heading = heading + turn / 2
+        self.pose = Pose(
+            x + step_distance * math.sin(mid_heading),
+            y + step_distance * math.cos(mid_heading),
+            heading + turn
+        )
+        self.distance += step_distance
+
+    def body_points(self, n_points: int=6) -> np.ndarray:
+        """
+        Gets points along the kart's center line, which with a radius
+        of KART_HALF_WIDTH cover its body.
+        :param n_points: int
+        :return: np.ndarray (n_points, 2) of world positions
+        """
+        x, y, heading = self.pose
+        along = np.linspace(
+            -KART_REAR_OVERHANG, WHEEL_BASE + KART_FRONT_OVERHANG, n_points)
+        return np.stack((x + along * math.sin(heading),
+                         y + along * math.cos(heading)), axis=1)
+
+
+class TrackBox(ty.NamedTuple):
+    """
+    Box standing on the ground, in world coordinates; yaw rotates
+    it counter-clockwise, as in synthetic.Box.
+    """
+    x: float
+    y: float
+    width: float
+    length: float
+    height: float
+    yaw: float = 0.
+
+    @property
+    def radius(self) -> float:
+        return math.hypot(self.width, self.length) / 2
+
+    def primitive(self, pose: Pose, sensor_height: float) -> Box:
+        lateral, forward = pose.to_kart_frame(self.x, self.y)
+        return Box(lateral, forward, self.width, self.length, self.height,
+                   self.yaw + pose.heading, -sensor_height)
+
+    def distance(self, points: np.ndarray) -> np.ndarray:
+        """
+        Gets distance of each passed ground position from box.
+        :param points: np.ndarray (N, 2)
+        :return: np.ndarray (N,)
+        """
+        cos, sin = math.cos(self.yaw), math.sin(self.yaw)
+        dx, dy = points[:, 0] - self.x, points[:, 1] - self.y
+        outside = np.maximum(np.abs(np.stack(
+            (cos * dx + sin * dy, -sin * dx + cos * dy), axis=1)) -
+            (self.width / 2, self.length / 2), 0)
+        return np.hypot(outside[:, 0], outside[:, 1])
+
+
+class TrackCone(ty.NamedTuple):
+    """
+    Upright cone, in world coordinates.
+    """
+    x: float
+    y: float
+    radius: float
+    height: float
+
+    def primitive(self, pose: Pose, sensor_height: float) -> Cone:
+        lateral, forward = pose.to_kart_frame(self.x, self.y)
+        return Cone(lateral, forward, self.radius, self.height,
+                    -sensor_height)
+
+    def distance(self, points: np.ndarray) -> np.ndarray:
+        return np.maximum(np.hypot(
+            points[:, 0] - self.x, points[:, 1] - self.y) - self.radius, 0)
+
+
+def track_wall(x1: float, y1: float, x2: float, y2: float,
+               thickness: float=0.1) -> TrackBox:
+    """
+    Gets box making up a straight wall between two passed points.
+    :return: TrackBox
+    """
+    return TrackBox(
+        (x1 + x2) / 2, (y1 + y2) / 2, math.hypot(x2 - x1, y2 - y1),
+        thickness, TRACK_WALL_HEIGHT, math.atan2(y2 - y1, x2 - x1))
+
+
+class Track:
+    """
+    Ring shaped track around the origin, bounded by walls, with
+    obstacles placed at random along it.
+    Laps begin at the start pose and are driven counter-clockwise.
+    """
+    def __init__(self, seed: int=0, n_obstacles: int=N_TRACK_OBSTACLES,
+                 inner_radius: float=TRACK_INNER_RADIUS,
+                 outer_radius: float=TRACK_OUTER_RADIUS,
+                 n_wall_segments: int=TRACK_WALL_SEGMENTS):
+        self.inner_radius = inner_radius
+        self.outer_radius = outer_radius
+        mid_radius = (inner_radius + outer_radius) / 2
+        self.start_pose = Pose(mid_radius, 0., 0.)
+        self.obstacles = []
+        # bounding circles, used to find obstacles near a position
+        self._centers = np.empty((0, 2))
+        self._radii = np.empty(0)
+        for radius, n_segments in (
+                (outer_radius, n_wall_segments),
+                (inner_radius, max(int(
+                    n_wall_segments * inner_radius / outer_radius), 8))):
+            angles = np.linspace(0, 2 * math.pi, n_segments + 1)
+            corners = radius * np.stack((np.cos(angles), np.sin(angles)), 1)
+            for a, b in zip(corners[:-1], corners[1:]):
+                self.add(track_wall(*a, *b))
+        random = np.random.RandomState(seed)
+        for _ in range(n_obstacles):
+            # obstacles are kept clear of the start of each lap
+            angle = random.uniform(0.15, 0.95) * 2 * math.pi
+            radius = random.uniform(inner_radius + 1, outer_radius - 1)
+            x, y = radius * math.cos(angle), radius * math.sin(angle)
+            if random.rand() < 0.5:
+                self.add(TrackBox(
+                    x, y, *random.uniform(0.3, 1., 2),
+                    random.uniform(0.3, 1.), random.uniform(0, math.pi)))
+            else:
+                self.add(TrackCone(
+                    x, y, random.uniform(0.15, 0.3), random.uniform(0.4, 0.8)))
+
+    def add(self, obstacle: TrackBox or TrackCone) -> 'Track':
+        self.obstacles.append(obstacle)
+        self._centers = np.vstack((self._centers, (obstacle.x, obstacle.y)))
+        self._radii = np.append(self._radii, obstacle.radius)
+        return self
+
+    def nearby(self, x: float, y: float, distance: float) -> list:
+        """
+        Gets obstacles which may be within passed distance of position.
+        :return: list
+        """
+        gaps = np.hypot(self._centers[:, 0] - x,
+                        self._centers[:, 1] - y) - self._radii
+        return [self.obstacles[i] for i in np.flatnonzero(gaps <= distance)]
+
+    def scene(self, pose: Pose, sensor_height: float=SENSOR_HEIGHT) -> Scene:
+        """
+        Gets scene visible to a sensor at passed pose.
+        :param pose: Pose
+        :param sensor_height: m
+        :return: Scene
+        """
+        return Scene((o.primitive(pose, sensor_height)
+                      for o in self.nearby(pose.x, pose.y, MAX_RANGE)),
+                     sensor_height=sensor_height)
+
+    def collides(self, model: KartModel) -> bool:
+        """
+        Gets whether kart's body touches any obstacle.
+        :param model: KartModel
+        :return: bool
+        """
+        x, y, _ = model.pose
+        reach = WHEEL_BASE + KART_FRONT_OVERHANG + KART_HALF_WIDTH
+        obstacles = self.nearby(x, y, reach)
+        if not obstacles:
+            return False
+        points = model.body_points()
+        return any((obstacle.distance(points) < KART_HALF_WIDTH).any()
+                   for obstacle in obstacles)
+
+    def progress(self, pose: Pose) -> float:
+        """
+        Gets angle in radians of passed pose around the track's center.
+        :param pose: Pose
+        :return: float
+        """
+        return math.atan2(pose.y, pose.x)
+
+
+class SimulatedKinectSource(FrameSource):
+    """
+    Source of depth frames rendered from the pose of a simulated kart,
+    captured when the simulation reaches each frame's time.
+    """
+    def __init__(self, track: Track, model: KartModel,
+                 renderer: Renderer=None):
+        self.track = track
+        self.model = model
+        self.renderer = renderer if renderer else Renderer()
+        self.received = 0
+        self.read = 0
+        self.dropped = 0
+        self._frame = None  # captured frame not yet read
+
+    def capture(self) -> int:
+        """
+        Renders frame from current pose of model.
+        :return: int time stamp of frame
+        """
+        if self._frame is not None:
+            self.dropped += 1
+        time_stamp = self.received
+        self._frame = self.renderer.frame(
+            self.track.scene(self.model.pose), time_stamp)
+        self.received += 1
+        return time_stamp
+
+    def latest(self, timeout: float=0.):
+        frame, self._frame = self._frame, None
+        if frame is not None:
+            self.read += 1
+        return frame
+
+    @property
+    def stats(self) -> dict:
+        return {'received': self.received, 'read': self.read,
+                'dropped': self.dropped}
+
+
+class SoakStats:
+    """
+    Statistics of laps driven by a Simulation.
+    """
+    def __init__(self):
+        self.outcomes = {outcome: 0 for outcome in
+                         (COMPLETED, COLLISION, STALLED, TIMED_OUT)}
+        self.sim_time = 0.  # s of simulated time
+        self.wall_time = 0.  # s of real time taken to simulate
+        self.distance = 0.  # m driven
+        # real time from publishing of a snapshot until targets found
+        # from it were applied by the actuator; the kart's reaction
+        # latency, as measured by GoKart.
+        self.compute_latency = Histogram()
+
+    @property
+    def laps(self) -> int:
+        return sum(self.outcomes.values())
+
+    @property
+    def collision_rate(self) -> float:
+        """
+        Gets fraction of laps that ended in a collision.
+        :return: float
+        """
+        return self.outcomes[COLLISION] / self.laps if self.laps else 0.
+
+    @property
+    def real_time_factor(self) -> float:
+        return self.sim_time / self.wall_time if self.wall_time else 0.
+
+    def summary(self) -> dict:
+        return {
+            'laps': self.laps,
+            'outcomes': dict(self.outcomes),
+            'collision_rate': self.collision_rate,
+            'distance': self.distance,
+            'sim_time': self.sim_time,
+            'wall_time': self.wall_time,
+            'real_time_factor': self.real_time_factor,
+            'compute_latency': self.compute_latency.summary()
+        }
+
+
+class Simulation:
+    """
+    Runs GoKart control code in lockstep with a KartModel driven
+    around a Track.
+    """
+    def __init__(self, track: Track=None, physics_frq: float=PHYSICS_FRQ):
+        self.track = track if track else Track()
+        self.model = KartModel(self.track.start_pose)
+        self.source = SimulatedKinectSource(self.track, self.model)
+        kinect = KinGeo(self.source)
+        # frames are limited by simulated time, not real time
+        kinect.access_hz = float('inf')
+        self.data = DriveData()
+        self.kart = kart_module.GoKart(
+            event_driven=False,
+            data=self.data,
+            kinect_input=KinectInput(self.data, kinect),
+            actuator=VirtualActuator(self.data, self.model)
+        )
+        self.locator = VirtualLocatorInput(self.model)
+        self.dt = 1 / physics_frq
+        self.time = 0.  # s of simulated time
+        self.stats = SoakStats()
+        # loops run in lockstep; each is run when simulated time reaches
+        # its next deadline, in the order the pipeline passes data.
+        self._loops = [
+            [1 / KINECT_FRQ, self.source.capture],
+            [1 / kart_module.SENSOR_TH_FRQ, self.kart.kinect_tic],
+            [1 / kart_module.LOGIC_FRQ, self.kart.logic_tic],
+            [1 / kart_module.ACTUATOR_FRQ, self._actuator_tic],
+        ]
+        self._deadlines = [0.] * len(self._loops)
+
+    def step(self) -> None:
+        """
+        Runs each loop that is due, then advances model by one step.
+        :return: None
+        """
+        for i, (period, func) in enumerate(self._loops):
+            if self.time >= self._deadlines[i]:
+                func()
+                self._deadlines[i] += period
+        self.model.step(self.dt)
+        self.time += self.dt
+
+    def run_lap(self, timeout: float=LAP_TIMEOUT) -> str:
+        """
+        Drives kart from track's start pose until it completes a lap,
+        collides, stalls, or runs out of time.
+        :param timeout: s of simulated time allowed
+        :return: str outcome of lap
+        """
+        self.model.reset(self.track.start_pose)
+        wall_start = time.perf_counter()
+        start_time = self.time
+        still_since = self.time
+        last_angle = self.track.progress(self.model.pose)
+        progress = 0.
+        outcome = TIMED_OUT
+        while self.time - start_time < timeout:
+            self.step()
+            angle = self.track.progress(self.model.pose)
+            # unwrap change in angle around track, counter-clockwise
+            progress += (angle - last_angle + math.pi) % (2 * math.pi) - \
+                math.pi
+            last_angle = angle
+            if self.model.speed > STALL_SPEED:
+                still_since = self.time
+            if self.track.collides(self.model):
+                outcome = COLLISION
+                break
+            if progress >= 2 * math.pi:
+                outcome = COMPLETED
+                break
+            if self.time - still_since > STALL_TIME:
+                outcome = STALLED
+                break
+        self.stats.outcomes[outcome] += 1
+        self.stats.sim_time += self.time - start_time
+        self.stats.wall_time += time.perf_counter() - wall_start
+        self.stats.distance += self.model.distance
+        return outcome
+
+    def _actuator_tic(self) -> None:
+        kart = self.kart
+        targets = self.data.new_targets(kart._targets_seq)
+        kart.actuator_tic(targets)
+        # targets are published once for each snapshot they are found
+        # from, so each applied snapshot is counted once.
+        if targets is not None and targets.snapshot_time is not None:
+            self.stats.compute_latency.add(kart.reaction_latency)
+
+
+def soak(n_laps: int, seed: int=0, n_obstacles: int=N_TRACK_OBSTACLES,
+         report: ty.Callable[[int, str], None]=None) -> SoakStats:
+    """
+    Drives passed number of simulated laps, each around a track with
+    differently placed obstacles.
+    :param n_laps: int
+    :param seed: seed of obstacle placement of first lap
+    :param n_obstacles: obstacles placed along each track
+    :param report: function called with lap number and outcome of
+        each lap, if passed.
+    :return: SoakStats
+    """
+    simulation = Simulation(Track(seed, n_obstacles))
+    for lap in range(n_laps):
+        if lap:
+            # obstacles are placed again, but control state carries
+            # on, as it would between laps of the kart.
+            track = Track(seed + lap, n_obstacles)
+            simulation.track = simulation.source.track = track
+        outcome = simulation.run_lap()
+        if report:
+            report(lap, outcome)
+    return simulation.stats
+
+
+def main(args=None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Drives simulated laps with the GoKart control code.')
+    parser.add_argument('--laps', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--obstacles', type=int, default=N_TRACK_OBSTACLES,
+                        help='obstacles placed along each lap')
+    parser.add_argument('--json', help='path to write statistics to')
+    args = parser.parse_args(args)
+
+    stats = soak(args.laps, args.seed, args.obstacles,
+                 lambda lap, outcome: print('lap {}: {}'.format(lap, outcome)))
+    summary = stats.summary()
+    print(json.dumps(summary, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Module holding TickRing, a ring of time stamped encoder values from
+which speed and acceleration are estimated over a sliding window.
+"""
+import numpy as np
+
+TICK_RING_SIZE = 1024  # ticks held by ring
+VELOCITY_WINDOW = 0.1  # default window (s) over which velocity is found
+
+
+class TickRing:
+    """
+    Ring of the most recent encoder ticks, each being the time of an
+    edge and the encoder value after it.
+
+    Ticks are written twice, a ring's length apart, so that the held
+    ticks are always a contiguous, time ordered slice of the arrays,
+    which may be searched without copying.
+    """
+    def __init__(self, capacity: int=TICK_RING_SIZE):
+        self.capacity = capacity
+        self._times = np.zeros(2 * capacity, np.float64)
+        self._values = np.zeros(2 * capacity, np.int64)
+        self.n = 0  # ticks added in total
+
+    def add(self, time: float, value: int) -> None:
+        """
+        Adds a tick. Ticks must be added in order of time.
+        :param time: time (s) of tick
+        :param value: encoder value after tick
+        :return: None
+        """
+        i = self.n % self.capacity
+        self._times[i] = self._times[i + self.capacity] = time
+        self._values[i] = self._values[i + self.capacity] = value
+        self.n += 1
+
+    def __len__(self) -> int:
+        return min(self.n, self.capacity)
+
+    @property
+    def times(self) -> np.ndarray:
+        """
+        Gets times of held ticks, oldest first.
+        :return: view of float array
+        """
+        start = (self.n - len(self)) % self.capacity
+        return self._times[start:start + len(self)]
+
+    @property
+    def values(self) -> np.ndarray:
+        """
+        Gets encoder values of held ticks, oldest first.
+        :return: view of int array
+        """
+        start = (self.n - len(self)) % self.capacity
+        return self._values[start:start + len(self)]
+
+    def velocity(self, now: float, window: float=VELOCITY_WINDOW) -> float:
+        """
+        Gets velocity over the window of time ending at now.
+
+        Velocity is found from the first and last tick in the window,
+        so that it is timed by edges rather than by the window.
+        Once no tick has been seen for longer than the interval
+        between ticks, speed is limited to one tick in the time since
+        the last, so that the estimate falls away when the encoder
+        stops, rather than holding its last value.
+        :param now: time (s) at which window ends
+        :param window: length of window (s)
+        :return: float (ticks / s)
+        """
+        times, values = self.times, self.values
+        start = np.searchsorted(times, now - window, 'left')
+        end = np.searchsorted(times, now, 'right')
+        if end - start < 2:
+            return 0.
+        span = times[end - 1] - times[start]
+        if span <= 0:
+            return 0.
+        change = float(values[end - 1] - values[start])
+        velocity = change / span
+        idle = now - times[end - 1]
+        if idle > 0 and abs(velocity) > 1 / idle:
+            velocity = np.copysign(1 / idle, change)
+        return velocity
+
+    def acceleration(self, now: float,
+                     window: float=VELOCITY_WINDOW) -> float:
+        """
+        Gets acceleration over the window of time ending at now, from
+        the change in velocity between the window's two halves.
+        :param now: time (s) at which window ends
+        :param window: length of window (s)
+        :return: float (ticks / s^2)
+        """
+        half = window / 2
+        return (self.velocity(now, half) -
+                self.velocity(now - half, half)) / half
@@ -0,0 +1,209 @@
+"""
+Module holding classes used to pace loops and to record how well
+they keep to their schedule.
+"""
+import bisect
+import math
+import time
+
+# policies for deadlines missed by a loop that overran its period
+SKIP = 'skip'  # drop missed deadlines, keeping phase of schedule
+CATCH_UP = 'catch_up'  # run once for each missed deadline, without sleep
+
+
+class Histogram:
+    """
+    Histogram with fixed, logarithmically spaced buckets, suited to
+    durations that range over several orders of magnitude.
+    Adding a value is cheap and does not allocate.
+    """
+    def __init__(self, min_value: float=1e-5, max_value: float=10.,
+                 buckets_per_decade: int=5):
+        n_buckets = int(math.ceil(
+            math.log10(max_value / min_value) * buckets_per_decade))
+        self.edges = [min_value * 10 ** (i / buckets_per_decade)
+                      for i in range(n_buckets + 1)]
+        # counts[0] holds values below the first edge, and counts[-1]
+        # values at or above the last.
+        self.counts = [0] * (n_buckets + 2)
+        self.n = 0
+        self.total = 0.
+        self.max = 0.
+
+    def add(self, value: float) -> None:
+        """
+        Adds a value to histogram.
+        :param value: float
+        :return: None
+        """
+        self.counts[bisect.bisect_right(self.edges, value)] += 1
+        self.n += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.n if self.n else 0.
+
+    def percentile(self, q: float) -> float:
+        """
+        Gets an upper bound of the passed percentile of added values,
+        to the resolution of the histogram's buckets.
+        :param q: percentile from 0 to 100
+        :return: float
+        """
+        if not self.n:
+            return 0.
+        threshold = q / 100 * self.n
+        count = 0
+        for i, bucket_count in enumerate(self.counts):
+            count += bucket_count
+            if count >= threshold and bucket_count:
+                return min(self.edges[i], self.max) \
+                    if i < len(self.edges) else self.max
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            'n': self.n,
+            'mean': self.mean,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'max': self.max
+        }
+
+
+class LoopStats:
+    """
+    Statistics of a single paced loop.
+    Written only by the loop's own thread; may be read from any thread.
+    """
+    def __init__(self, name: str, frq: float):
+        self.name = name
+        self.frq = frq
+        self.iterations = 0
+        self.overruns = 0  # iterations that ended after the next deadline
+        self.skipped = 0  # deadlines dropped under the SKIP policy
+        self.exec_times = Histogram()  # s taken by each iteration
+        # difference between actual and scheduled start of iterations
+        self.lateness = Histogram()
+        self.max_period_jitter = 0.  # max abs difference from period
+        self._period_jitter_total = 0.
+        self._first_start = None
+        self._last_start = None
+
+    def record_start(self, start: float, deadline: float or None) -> None:
+        """
+        Records start of an iteration.
+        :param start: monotonic time iteration started
+        :param deadline: monotonic time iteration was scheduled for
+        :return: None
+        """
+        if deadline is not None:
+            self.lateness.add(max(start - deadline, 0.))
+        if self._last_start is None:
+            self._first_start = start
+        elif self.frq > 0:
+            jitter = abs(start - self._last_start - 1 / self.frq)
+            self._period_jitter_total += jitter
+            if jitter > self.max_period_jitter:
+                self.max_period_jitter = jitter
+        self._last_start = start
+
+    def record_end(self, exec_time: float, overran: bool) -> None:
+        """
+        Records end of an iteration.
+        :param exec_time: time in s taken by iteration
+        :param overran: whether iteration ended after next deadline
+        :return: None
+        """
+        self.iterations += 1
+        self.exec_times.add(exec_time)
+        if overran:
+            self.overruns += 1
+
+    @property
+    def mean_period_jitter(self) -> float:
+        return self._period_jitter_total / (self.iterations - 1) \
+            if self.iterations > 1 else 0.
+
+    @property
+    def achieved_frq(self) -> float:
+        """
+        Gets mean frequency at which iterations have started.
+        :return: float (Hz)
+        """
+        if self.iterations < 2 or self._last_start == self._first_start:
+            return 0.
+        return (self.iterations - 1) / (self._last_start - self._first_start)
+
+    def summary(self) -> dict:
+        return {
+            'name': self.name,
+            'frq': self.frq,
+            'achieved_frq': self.achieved_frq,
+            'iterations': self.iterations,
+            'overruns': self.overruns,
+            'skipped': self.skipped,
+            'mean_period_jitter': self.mean_period_jitter,
+            'max_period_jitter': self.max_period_jitter,
+            'exec_time': self.exec_times.summary(),
+            'lateness': self.lateness.summary()
+        }
+
+
+class LoopTimer:
+    """
+    Paces iterations of a loop at a fixed frequency.
+
+    Deadlines are absolute times on a monotonic clock, each one period
+    after the last, so that time taken by iterations and by waking from
+    sleep does not accumulate as drift.
+    A frequency of 0 runs iterations back to back.
+    """
+    def __init__(self, name: str, frq: float=0., policy: str=SKIP,
+                 clock=time.monotonic, sleep=time.sleep):
+        assert policy in (SKIP, CATCH_UP), 'unknown policy: %s' % policy
+        self.period = 1 / frq if frq > 0 else 0.
+        self.policy = policy
+        self.stats = LoopStats(name, frq)
+        self._clock = clock
+        self._sleep = sleep
+        self._deadline = None  # scheduled start of next iteration
+        self._start = None
+
+    def start_iteration(self) -> None:
+        """
+        Called at the start of each iteration.
+        :return: None
+        """
+        self._start = self._clock()
+        if self._deadline is None:
+            self._deadline = self._start
+        self.stats.record_start(
+            self._start, self._deadline if self.period else None)
+
+    def end_iteration(self) -> None:
+        """
+        Called at the end of each iteration. Sleeps until the next
+        deadline, handling deadlines that have already passed
+        according to policy.
+        :return: None
+        """
+        now = self._clock()
+        if not self.period:
+            self.stats.record_end(now - self._start, False)
+            return
+        self._deadline += self.period
+        overran = now > self._deadline
+        self.stats.record_end(now - self._start, overran)
+        if overran and self.policy == SKIP:
+            # move to the next deadline that lies ahead, in phase
+            # with the original schedule.
+            missed = int((now - self._deadline) / self.period) + 1
+            self._deadline += missed * self.period
+            self.stats.skipped += missed
+        remaining = self._deadline - now
+        if remaining > 0:
+            self._sleep(remaining)
@@ -9,6 +9,9 @@
 #include <time.h>
 #include <errno.h>
 #include <endian.h>
+#include <string.h>
+#include <pthread.h>
+#include <stdatomic.h>
 
 #include <linux/i2c-dev.h>
 
@@ -16,6 +19,10 @@
 
 #define EXTRACT_CONFIG(reg, mask, offset)		(((reg) & (mask)) >> (offset))
 #define ALTER_CONFIG(reg, mask, offset, val)		((reg) = ((reg) & ~(mask)) | (((int) (val)) << (offset)))
+#define RING_MASK					(ADS1115_RING_SIZE - 1)
+// fraction of a conversion period waited between checks of whether a
+// conversion is ready, once a full period has passed.
+#define POLL_DIVISOR					8
 
 static inline int set_reg_pointer(ads1115_t ads, uint8_t regnum) {
 	if (ads->regnum != regnum && write(ads->fd, &regnum, sizeof(regnum)) < 0)
@@ -83,27 +90,44 @@ ads1115_t ads1115_open(
 	enum ads1115_mode mode,
 	enum ads1115_data_rate datarate
 ) {
-	ads1115_t ads = NULL;
+	int fd;
 
-	if (!(ads = malloc(sizeof(*ads))))
+	if ((fd = open(dev, O_RDWR)) < 0)
 		return NULL;
-	ads->fd = -1;
-
-	if ((ads->fd = open(dev, O_RDWR)) < 0)
-		goto fail;
 
-	if (ioctl(ads->fd, I2C_SLAVE, slave_addr))
-		goto fail;
+	if (ioctl(fd, I2C_SLAVE, slave_addr)) {
+		close(fd);
+		return NULL;
+	}
 
-	if (ads1115_config(ads, muxconf, pgaconf, mode, datarate))
-		goto fail;
+	return ads1115_open_fd(fd, muxconf, pgaconf, mode, datarate);
+}
 
-	return ads;
+ads1115_t ads1115_open_fd(
+	int fd,
+	enum ads1115_mux_config muxconf,
+	enum ads1115_pga_gain pgaconf,
+	enum ads1115_mode mode,
+	enum ads1115_data_rate datarate
+) {
+	ads1115_t ads = NULL;
 
-   fail:
-	ads1115_free(ads);
+	if (!(ads = malloc(sizeof(*ads)))) {
+		close(fd);
+		return NULL;
+	}
+	ads->fd = fd;
+	ads->regnum = UINT8_MAX;	// register pointer not yet known
+	atomic_init(&ads->sampling, 0);
+	atomic_init(&ads->sampler_errno, 0);
+	atomic_init(&ads->head, 0);
+
+	if (ads1115_config(ads, muxconf, pgaconf, mode, datarate)) {
+		ads1115_free(ads);
+		return NULL;
+	}
 
-	return NULL;
+	return ads;
 }
 
 int ads1115_config(
@@ -115,6 +139,12 @@ int ads1115_config(
 ) {
 	uint16_t config_reg;
 
+	// the sampling thread owns the bus, and the config, while it runs
+	if (atomic_load(&ads->sampling)) {
+		errno = EBUSY;
+		return -1;
+	}
+
 	if (get_reg(ads, ADS1115_REG_CONFIG, &config_reg))
 		return -1;
 
@@ -150,6 +180,8 @@ int ads1115_sample(ads1115_t ads, int16_t *res) {
 		if (set_reg(ads, ADS1115_REG_CONFIG, ads->config))
 			return -1;
 
+		// wait one conversion period, then check for the conversion
+		// being ready at a fraction of the period.
 		waittime.tv_sec = 0;
 		waittime.tv_nsec = 1000000000L / get_sps(ads);
 		do {
@@ -159,6 +191,7 @@ int ads1115_sample(ads1115_t ads, int16_t *res) {
 			} while (s && errno == EINTR && timer.tv_nsec > 0);
 			if (s)
 				return -1;
+			waittime.tv_nsec = 1000000000L / get_sps(ads) / POLL_DIVISOR;
 
 			if (get_reg(ads, ADS1115_REG_CONFIG, &ads->config))
 				return -1;
@@ -171,7 +204,150 @@ int ads1115_sample(ads1115_t ads, int16_t *res) {
 	return 0;
 }
 
+static void push_reading(ads1115_t ads, int16_t value) {
+	struct timespec now;
+	uint_fast64_t head;
+	struct ads1115_reading *slot;
+
+	clock_gettime(CLOCK_MONOTONIC, &now);
+	head = atomic_load_explicit(&ads->head, memory_order_relaxed);
+	slot = &ads->ring[head & RING_MASK];
+	slot->time_ns = (int64_t) now.tv_sec * 1000000000L + now.tv_nsec;
+	slot->n = head + 1;
+	slot->value = value;
+	// reading is published once complete
+	atomic_store_explicit(&ads->head, head + 1, memory_order_release);
+}
+
+static void *sampler_main(void *arg) {
+	ads1115_t ads = arg;
+	int16_t value;
+
+	// each one-shot conversion is started, waited on until the chip
+	// reports it ready, and read, so that every reading is new.
+	while (atomic_load(&ads->sampling)) {
+		if (ads1115_sample(ads, &value)) {
+			atomic_store(&ads->sampler_errno, errno ? errno : EIO);
+			break;
+		}
+		push_reading(ads, value);
+	}
+
+	return NULL;
+}
+
+int ads1115_start_sampling(ads1115_t ads) {
+	int err;
+
+	if (atomic_load(&ads->sampling)) {
+		errno = EBUSY;
+		return -1;
+	}
+
+	ads->config_before_sampling = ads->config;
+	if (ads1115_config(
+		ads,
+		ADS1115_MUX_CONFIG_DEFAULT,
+		ADS1115_PGA_GAIN_DEFAULT,
+		ADS1115_MODE_ONE_SHOT,
+		ADS1115_DATA_RATE_DEFAULT
+	))
+		return -1;
+
+	atomic_store(&ads->sampler_errno, 0);
+	atomic_store(&ads->sampling, 1);
+	if ((err = pthread_create(&ads->sampler, NULL, sampler_main, ads))) {
+		atomic_store(&ads->sampling, 0);
+		errno = err;
+		return -1;
+	}
+
+	return 0;
+}
+
+int ads1115_stop_sampling(ads1115_t ads) {
+	int err;
+
+	if (!atomic_exchange(&ads->sampling, 0))
+		return 0;
+
+	if ((err = pthread_join(ads->sampler, NULL))) {
+		errno = err;
+		return -1;
+	}
+
+	// restore mode chip was in before sampling began
+	return ads1115_config(
+		ads,
+		ADS1115_MUX_CONFIG_DEFAULT,
+		ADS1115_PGA_GAIN_DEFAULT,
+		(enum ads1115_mode) EXTRACT_CONFIG(
+			ads->config_before_sampling,
+			ADS1115_MODE_MASK,
+			ADS1115_MODE_OFFSET
+		),
+		ADS1115_DATA_RATE_DEFAULT
+	);
+}
+
+// fails with the error that stopped sampling, if any.
+static int check_sampler(ads1115_t ads) {
+	int err;
+
+	if ((err = atomic_load(&ads->sampler_errno))) {
+		errno = err;
+		return -1;
+	}
+
+	return 0;
+}
+
+int ads1115_latest(ads1115_t ads, struct ads1115_reading *out) {
+	uint_fast64_t head;
+
+	if (check_sampler(ads))
+		return -1;
+
+	do {
+		if (!(head = atomic_load_explicit(&ads->head, memory_order_acquire))) {
+			errno = EAGAIN;
+			return -1;
+		}
+		memcpy(out, &ads->ring[(head - 1) & RING_MASK], sizeof(*out));
+		atomic_thread_fence(memory_order_acquire);
+		// retry if the slot was overwritten while it was copied
+	} while (atomic_load_explicit(&ads->head, memory_order_relaxed) - head >= RING_MASK);
+
+	return 0;
+}
+
+unsigned ads1115_read_block(ads1115_t ads, struct ads1115_reading *out, unsigned n) {
+	uint_fast64_t head, first, valid_from, i;
+
+	head = atomic_load_explicit(&ads->head, memory_order_acquire);
+	if (n > RING_MASK)
+		n = RING_MASK;
+	first = head > n ? head - n : 0;
+
+	for (i = first; i < head; i++)
+		memcpy(&out[i - first], &ads->ring[i & RING_MASK], sizeof(*out));
+	atomic_thread_fence(memory_order_acquire);
+
+	// readings whose slots were reused while they were copied are dropped
+	i = atomic_load_explicit(&ads->head, memory_order_relaxed);
+	valid_from = i > RING_MASK ? i - RING_MASK : 0;
+	if (valid_from > first) {
+		if (valid_from >= head)
+			return 0;
+		memmove(out, &out[valid_from - first], (head - valid_from) * sizeof(*out));
+		first = valid_from;
+	}
+
+	return head - first;
+}
+
 void ads1115_free(ads1115_t ads) {
+	ads1115_stop_sampling(ads);
 	if (ads->fd >= 0) {
 		if ((enum ads1115_mode) EXTRACT_CONFIG(
 				ads->config,
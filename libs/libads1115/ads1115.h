@@ -3,6 +3,8 @@
 #define _ADS1115_H_
 
 #include <stdint.h>
+#include <pthread.h>
+#include <stdatomic.h>
 
 #define ADS1115_REG_CONVERSION			0x0
 #define ADS1115_REG_CONFIG			0x1
@@ -19,10 +21,28 @@
 #define ADS1115_DATA_RATE_MASK			0x00e0
 #define ADS1115_DATA_RATE_OFFSET		5
 
+// number of readings held by the sampling ring; must be a power of 2
+#define ADS1115_RING_SIZE			256
+
+struct ads1115_reading {
+	int64_t time_ns;	// CLOCK_MONOTONIC time conversion was read
+	uint64_t n;		// number of reading, counting from 1
+	int16_t value;
+};
+
 struct ads1115 {
 	int fd;
 	uint16_t config;
 	uint8_t regnum;
+
+	// background sampling; readings are written into the ring by the
+	// sampling thread alone, and may be read from any thread.
+	pthread_t sampler;
+	atomic_int sampling;
+	atomic_int sampler_errno;	// error that stopped sampling, if any
+	uint16_t config_before_sampling;
+	atomic_uint_fast64_t head;	// readings written to ring
+	struct ads1115_reading ring[ADS1115_RING_SIZE];
 };
 
 typedef struct ads1115 *ads1115_t;
@@ -76,6 +96,16 @@ ads1115_t ads1115_open(
 	enum ads1115_data_rate datarate
 );
 
+// takes ownership of fd, an I2C device already addressed to the chip
+ads1115_t ads1115_open_fd(
+	int fd,
+	enum ads1115_mux_config muxconf,
+	enum ads1115_pga_gain pgaconf,
+	enum ads1115_mode mode,
+	enum ads1115_data_rate datarate
+);
+
+// fails with EBUSY while sampling; stop sampling to reconfigure.
 int ads1115_config(
 	ads1115_t ads,
 	enum ads1115_mux_config muxconf,
@@ -86,6 +116,14 @@ int ads1115_config(
 
 int ads1115_sample(ads1115_t ads, int16_t *res);
 
+int ads1115_start_sampling(ads1115_t ads);
+
+int ads1115_stop_sampling(ads1115_t ads);
+
+int ads1115_latest(ads1115_t ads, struct ads1115_reading *out);
+
+unsigned ads1115_read_block(ads1115_t ads, struct ads1115_reading *out, unsigned n);
+
 void ads1115_free(ads1115_t ads);
 
 #endif /* _ADS1115_H_ */
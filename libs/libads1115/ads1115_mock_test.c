@@ -0,0 +1,79 @@
+
+/*
+ * Runs the sampling thread against a file of all-ones registers, in place
+ * of an I2C device, and checks that the chip cannot be reconfigured under it.
+ */
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <err.h>
+#include <errno.h>
+#include <time.h>
+#include <unistd.h>
+
+#include "ads1115.h"
+
+// bytes of register data the file holds; every read reports a conversion ready
+#define REGS_SIZE			(1 << 20)
+
+int main(void) {
+	static unsigned char regs[REGS_SIZE];
+	char path[] = "/tmp/ads1115_mock_XXXXXX";
+	struct timespec delay = {
+		.tv_sec = 0,
+		.tv_nsec = 10000000,
+	};
+	struct ads1115_reading reading;
+	ads1115_t ads;
+	int fd;
+
+	if ((fd = mkstemp(path)) < 0)
+		err(EXIT_FAILURE, "error creating register file");
+	unlink(path);
+	memset(regs, 0xff, sizeof(regs));
+	if (write(fd, regs, sizeof(regs)) != sizeof(regs) || lseek(fd, 0, SEEK_SET))
+		err(EXIT_FAILURE, "error filling register file");
+
+	if (!(ads = ads1115_open_fd(
+		fd,
+		ADS1115_MUX_CONFIG_SINGLE_AIN0,
+		ADS1115_PGA_GAIN_4V096,
+		ADS1115_MODE_ONE_SHOT,
+		ADS1115_DATA_RATE_860SPS
+	)))
+		err(EXIT_FAILURE, "error opening ADS1115");
+
+	if (ads1115_start_sampling(ads))
+		err(EXIT_FAILURE, "error starting sampling");
+	nanosleep(&delay, NULL);
+	if (ads1115_latest(ads, &reading))
+		err(EXIT_FAILURE, "no reading from sampler");
+
+	if (!ads1115_config(
+		ads,
+		ADS1115_MUX_CONFIG_SINGLE_AIN1,
+		ADS1115_PGA_GAIN_DEFAULT,
+		ADS1115_MODE_DEFAULT,
+		ADS1115_DATA_RATE_DEFAULT
+	))
+		errx(EXIT_FAILURE, "reconfigured while sampling");
+	if (errno != EBUSY)
+		err(EXIT_FAILURE, "expected EBUSY while sampling");
+
+	if (ads1115_stop_sampling(ads))
+		err(EXIT_FAILURE, "error stopping sampling");
+	if (ads1115_config(
+		ads,
+		ADS1115_MUX_CONFIG_SINGLE_AIN1,
+		ADS1115_PGA_GAIN_DEFAULT,
+		ADS1115_MODE_DEFAULT,
+		ADS1115_DATA_RATE_DEFAULT
+	))
+		err(EXIT_FAILURE, "error reconfiguring after sampling");
+
+	ads1115_free(ads);
+	printf("ok\n");
+
+	return 0;
+}
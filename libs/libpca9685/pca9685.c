@@ -9,24 +9,29 @@
 #include <errno.h>
 #include <math.h>
 #include <stdint.h>
+#include <string.h>
+#include <unistd.h>
 
 #include <linux/i2c-dev.h>
 
 #include "pca9685.h"
 
-#define NUM_CHAN			16
+#define NUM_CHAN			PCA9685_NUM_CHAN
 #define PWM_INCREMENTS			4096
 #define INTERNAL_OSC_HZ			28672000
 
 #define MODE1_ADDR			0x00
 #define MODE1_SLEEP			0x10
 #define MODE1_ALLCALL			0x01
+#define MODE1_AI			0x20
 #define MODE1_RESTART			0x80
 #define MODE2_ADDR			0x01
 #define MODE2_OCH			0x08
 #define CHAN_BASE_REG			0x06
 #define CHAN_N_FULL_ON			0x10
 #define CHAN_N_FULL_OFF			0x10
+#define ALL_LED_BASE_REG		0xfa
+#define CHAN_REGS			PCA9685_CHAN_REGS
 #define PRESCALE_ADDR			0xfe
 #define PRESCALE_MIN			0x03
 #define PRESCALE_MAX			0xff
@@ -48,6 +53,11 @@ struct pca9685 *pca9685_open(const char *dev, uint8_t bus_addr) {
 		goto fail;
 
 	ret->freq = 0;
+	// register values are unknown until written
+	ret->assigned = 0;
+	ret->synced = 0;
+	ret->writes = 0;
+	ret->skipped = 0;
 
 	return ret;
 
@@ -77,6 +87,10 @@ int pca9685_activate(struct pca9685 *pca, unsigned freq) {
 	}
 
 	mode1 &= ~(MODE1_RESTART | MODE1_SLEEP | MODE1_ALLCALL);
+	// register address is incremented after each byte written, so
+	// that the registers of several channels are written in one
+	// transaction.
+	mode1 |= MODE1_AI;
 	mode2 |= MODE2_OCH;
 
 	if (i2c_smbus_write_byte_data(pca->fd, MODE2_ADDR, mode2) < 0)
@@ -124,46 +138,138 @@ int pca9685_set_freq(struct pca9685 *pca, unsigned freq) {
 	return 0;
 }
 
-int pca9685_set_duty_cycle(struct pca9685 *pca, uint8_t channel, double dc) {
-	uint8_t on_lsb, on_msb, off_lsb, off_msb, chan_base_addr;
+// fills the four LEDn_ON_L..LEDn_OFF_H register values of a channel
+static void duty_cycle_to_regs(double dc, uint8_t *regs) {
 	unsigned width_increments;
 
-	if (dc > 1.0 || dc < 0.0 || channel >= NUM_CHAN) {
-		errno = ERANGE;
-		return -1;
-	}
-
-	chan_base_addr = CHAN_BASE_REG + (channel * 4);
-
 	if (dc == 1.0) {
-		on_lsb = 0x00;
-		on_msb = CHAN_N_FULL_ON;
-		off_lsb = 0x00;
-		off_msb = 0x00;
+		regs[0] = 0x00;
+		regs[1] = CHAN_N_FULL_ON;
+		regs[2] = 0x00;
+		regs[3] = 0x00;
 	} else if (dc == 0.0) {
-		on_lsb = 0x00;
-		on_msb = 0x00;
-		off_lsb = 0x00;
-		off_msb = CHAN_N_FULL_OFF;
+		regs[0] = 0x00;
+		regs[1] = 0x00;
+		regs[2] = 0x00;
+		regs[3] = CHAN_N_FULL_OFF;
 	} else {
-		on_lsb = 0x00;
-		on_msb = 0x00;
+		regs[0] = 0x00;
+		regs[1] = 0x00;
 		width_increments = round((PWM_INCREMENTS-1) * dc);
-		off_lsb =  width_increments & 0x00ff;
-		off_msb = (width_increments & 0x0f00) >> 8;
+		regs[2] =  width_increments & 0x00ff;
+		regs[3] = (width_increments & 0x0f00) >> 8;
 	}
+}
+
+// writes len register values beginning at passed register address in a
+// single I2C transaction, relying on register auto-increment.
+static int write_regs(struct pca9685 *pca, uint8_t addr, const uint8_t *regs, size_t len) {
+	uint8_t buf[1 + NUM_CHAN * CHAN_REGS];
+	ssize_t written;
 
-	if (
-		i2c_smbus_write_byte_data(pca->fd, chan_base_addr + 0,  on_lsb) ||
-		i2c_smbus_write_byte_data(pca->fd, chan_base_addr + 1,  on_msb) ||
-		i2c_smbus_write_byte_data(pca->fd, chan_base_addr + 2, off_lsb) ||
-		i2c_smbus_write_byte_data(pca->fd, chan_base_addr + 3, off_msb)
-	)
+	buf[0] = addr;
+	memcpy(buf + 1, regs, len);
+
+	if ((written = write(pca->fd, buf, len + 1)) < 0)
+		return -1;
+	if ((size_t) written != len + 1) {
+		errno = EIO;
 		return -1;
+	}
+
+	return 0;
+}
+
+int pca9685_set_duty_cycle(struct pca9685 *pca, uint8_t channel, double dc) {
+	return pca9685_set_duty_cycles(pca, &channel, &dc, 1);
+}
+
+// writes shadow values of each channel in mask, writing each run of
+// consecutive channels in one transaction. Every channel in mask is
+// marked not synced before writing, and marked synced once written,
+// so that channels of runs left unwritten after a failed write are
+// not skipped as unchanged by later calls.
+static int write_channels(struct pca9685 *pca, uint16_t mask) {
+	unsigned i, first;
+	uint16_t run;
+
+	pca->synced &= ~mask;
+	for (i = 0; i < NUM_CHAN; i++) {
+		if (!(mask & (1 << i)))
+			continue;
+		run = 0;
+		for (first = i; i < NUM_CHAN && (mask & (1 << i)); i++)
+			run |= 1 << i;
+		if (write_regs(pca, CHAN_BASE_REG + first * CHAN_REGS,
+				pca->shadow[first], (i - first) * CHAN_REGS))
+			return -1;
+		pca->synced |= run;
+		pca->writes += i - first;
+	}
 
 	return 0;
 }
 
+int pca9685_set_duty_cycles(struct pca9685 *pca, const uint8_t *channels, const double *dcs, unsigned n) {
+	uint8_t regs[CHAN_REGS];
+	uint16_t seen = 0, changed = 0, bit;
+	unsigned i;
+
+	for (i = 0; i < n; i++) {
+		if (dcs[i] > 1.0 || dcs[i] < 0.0 || channels[i] >= NUM_CHAN) {
+			errno = ERANGE;
+			return -1;
+		}
+		if (seen & (1 << channels[i])) {
+			errno = EINVAL;
+			return -1;
+		}
+		seen |= 1 << channels[i];
+	}
+
+	// only channels whose register values differ from those known
+	// to be held by the chip are written.
+	for (i = 0; i < n; i++) {
+		bit = 1 << channels[i];
+		duty_cycle_to_regs(dcs[i], regs);
+		if ((pca->synced & bit) && !memcmp(pca->shadow[channels[i]], regs, CHAN_REGS)) {
+			pca->skipped++;
+			continue;
+		}
+		memcpy(pca->shadow[channels[i]], regs, CHAN_REGS);
+		pca->assigned |= bit;
+		changed |= bit;
+	}
+
+	return write_channels(pca, changed);
+}
+
+int pca9685_all_off(struct pca9685 *pca) {
+	uint8_t regs[CHAN_REGS];
+	unsigned i;
+
+	// the ALL_LED registers set every channel at once
+	duty_cycle_to_regs(0.0, regs);
+	for (i = 0; i < NUM_CHAN; i++)
+		memcpy(pca->shadow[i], regs, CHAN_REGS);
+	pca->assigned = 0xffff;
+
+	if (write_regs(pca, ALL_LED_BASE_REG, regs, CHAN_REGS)) {
+		pca->synced = 0;
+		return -1;
+	}
+	pca->synced = 0xffff;
+	pca->writes++;
+
+	return 0;
+}
+
+int pca9685_resync(struct pca9685 *pca) {
+	// every channel with a shadow value is written, whether or not
+	// the chip is believed to hold it, such as after a bus error.
+	return write_channels(pca, pca->assigned);
+}
+
 int pca9685_set_pulse_width(struct pca9685 *pca, uint8_t channel, unsigned usecs) {
 	if (!pca->freq) {
 		errno = EBADE;
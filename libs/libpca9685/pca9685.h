@@ -4,15 +4,28 @@
 
 #include <stdint.h>
 
+#define PCA9685_NUM_CHAN		16
+#define PCA9685_CHAN_REGS		4
+
 struct pca9685 {
 	int fd;
 	unsigned freq;
+	// last values written, or to be written, to the LEDn_ON_L..
+	// LEDn_OFF_H registers of each channel
+	uint8_t shadow[PCA9685_NUM_CHAN][PCA9685_CHAN_REGS];
+	uint16_t assigned;	// bit set for each channel with a shadow value
+	uint16_t synced;	// bit set for each channel known to match its shadow
+	unsigned long writes;	// channel writes sent to the chip
+	unsigned long skipped;	// channel writes skipped as unchanged
 };
 
 struct pca9685 *pca9685_open(const char *dev, uint8_t bus_addr);
 int pca9685_activate(struct pca9685 *pca, unsigned freq);
 int pca9685_set_freq(struct pca9685 *pca, unsigned freq);
 int pca9685_set_duty_cycle(struct pca9685 *pca, uint8_t channel, double dc);
+int pca9685_set_duty_cycles(struct pca9685 *pca, const uint8_t *channels, const double *dcs, unsigned n);
+int pca9685_all_off(struct pca9685 *pca);
+int pca9685_resync(struct pca9685 *pca);
 int pca9685_set_pulse_width(struct pca9685 *pca, uint8_t channel, unsigned usecs);
 int pca9685_shutdown(struct pca9685 *pca);
 void pca9685_close(struct pca9685 *pca);
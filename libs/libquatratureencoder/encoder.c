@@ -10,6 +10,9 @@
 #include <errno.h>
 #include <sys/stat.h>
 #include <fcntl.h>
+#include <stdint.h>
+#include <sys/ioctl.h>
+#include <linux/gpio.h>
 
 #include "quadrature_encoder.h"
 
@@ -24,6 +27,12 @@
 #define GPIO_DIR_IN			"in"
 #define GPIO_DIR_OUT			"out"
 
+#define QENC_RING_MASK			(QENC_RING_SIZE - 1)
+#define QENC_CONSUMER			"quadrature-encoder"
+#define QENC_EVENT_BATCH		64	/* line events taken per read() */
+#define QENC_KERNEL_EVENT_BUFFER	256	/* line events queued by kernel */
+#define QENC_THREAD_PRIORITY		99
+
 static int stuff_file(const char *file, const char *string, size_t len) {
 	FILE *fh;
 	size_t s;
@@ -89,7 +98,7 @@ static inline int get_gpio_value(int valfd, int *out) {
 	return 0;
 }
 
-inline void subtract_timespecs(
+static inline void subtract_timespecs(
 	const struct timespec *a,
 	const struct timespec *b,
 	struct timespec *res
@@ -102,6 +111,34 @@ inline void subtract_timespecs(
 	}
 }
 
+/*
+ * Gets the change in encoder value from a transition between states,
+ * in which only one of the two lines may have changed.
+ */
+static inline int quadrature_diff(int old_a, int old_b, int a, int b) {
+	if (old_a == 0 && a == 1)
+		return old_b * 2 - 1;
+	else if (old_a == 1 && a == 0)
+		return old_b * -2 + 1;
+	else if (old_b == 0 && b == 1)
+		return old_a * -2 + 1;
+	else // (old_b == 1 && b == 0)
+		return old_a * 2 - 1;
+}
+
+static inline int64_t timespec_to_ns(const struct timespec *t) {
+	return (int64_t)t->tv_sec * 1000000000 + t->tv_nsec;
+}
+
+/* must be called with ctx->lock held */
+static inline void push_tick(struct encoder_ctx *ctx, int64_t time_ns) {
+	struct qenc_tick *tick = &ctx->ring[ctx->ticks & QENC_RING_MASK];
+
+	tick->time_ns = time_ns;
+	tick->n = ++ctx->ticks;
+	tick->value = ctx->value;
+}
+
 static void *read_loop(void *arg) {
 	struct encoder_ctx *ctx = arg;
 	struct pollfd pollfds[2];
@@ -138,20 +175,14 @@ static void *read_loop(void *arg) {
 			goto error;
 		}
 
-		if (old_a == 0 && a == 1)
-			diff = old_b * 2 - 1;
-		else if (old_a == 1 && a == 0)
-			diff = old_b * -2 + 1;
-		else if (old_b == 0 && b == 1)
-			diff = old_a * -2 + 1;
-		else // (old_b == 1 && b == 0)
-			diff = old_a * 2 - 1;
+		diff = quadrature_diff(old_a, old_b, a, b);
 
 		pthread_setcancelstate(PTHREAD_CANCEL_DISABLE, &dummy);
 		if (pthread_mutex_lock(&ctx->lock))
 			goto error;
 
 		ctx->value += diff;
+		push_tick(ctx, timespec_to_ns(&start_sample));
 
 		clock_gettime(CLOCK_MONOTONIC, &end_sample);
 		subtract_timespecs(&end_sample, &start_sample, &ctx->last_sampletime);
@@ -174,6 +205,128 @@ static void *read_loop(void *arg) {
 	return NULL; /* NOT REACHED */
 }
 
+/*
+ * Applies a batch of line events, taking each line's level from the
+ * edge of its events, and the time of each tick from the kernel's
+ * time stamp of the edge. Must be called with ctx->lock held.
+ */
+static void apply_line_events(struct encoder_ctx *ctx, const struct gpio_v2_line_event *events, size_t n) {
+	int a, b;
+	size_t i;
+
+	for (i = 0; i < n; ++i) {
+		const struct gpio_v2_line_event *event = &events[i];
+		int level = event->id == GPIO_V2_LINE_EVENT_RISING_EDGE;
+
+		/* the kernel drops events once its buffer is full */
+		if (ctx->last_seqno && event->seqno != ctx->last_seqno + 1)
+			ctx->missed += event->seqno - ctx->last_seqno - 1;
+		ctx->last_seqno = event->seqno;
+
+		a = ctx->a_value;
+		b = ctx->b_value;
+		if (event->offset == ctx->a_number)
+			a = level;
+		else if (event->offset == ctx->b_number)
+			b = level;
+		else
+			continue;
+
+		/* an edge matching the line's level means one was missed */
+		if (a == ctx->a_value && b == ctx->b_value) {
+			++ctx->missed;
+			continue;
+		}
+
+		ctx->value += quadrature_diff(ctx->a_value, ctx->b_value, a, b);
+		ctx->a_value = a;
+		ctx->b_value = b;
+		push_tick(ctx, event->timestamp_ns);
+	}
+}
+
+static void record_error(struct encoder_ctx *ctx, int errnum) {
+	if (!pthread_mutex_lock(&ctx->lock)) {
+		++ctx->err_count;
+		ctx->errnum = errnum;
+		pthread_mutex_unlock(&ctx->lock);
+	}
+}
+
+static void *event_read_loop(void *arg) {
+	struct encoder_ctx *ctx = arg;
+	struct gpio_v2_line_event events[QENC_EVENT_BATCH];
+	struct timespec start_sample, end_sample;
+	size_t filled = 0;
+	ssize_t len;
+	int dummy;
+
+	while (1) {
+		/* read() is the loop's only cancellation point */
+		len = read(ctx->line_fd, (char *)events + filled, sizeof(events) - filled);
+		if (len == 0)
+			return NULL; /* event source was closed */
+		if (len < 0) {
+			if (errno == EINTR)
+				continue;
+			/* reported by the next qenc_get_encoder_value() */
+			record_error(ctx, errno);
+			return NULL;
+		}
+
+		clock_gettime(CLOCK_MONOTONIC, &start_sample);
+		filled += len;
+
+		pthread_setcancelstate(PTHREAD_CANCEL_DISABLE, &dummy);
+		if (pthread_mutex_lock(&ctx->lock)) {
+			record_error(ctx, errno);
+			return NULL;
+		}
+
+		apply_line_events(ctx, events, filled / sizeof(*events));
+
+		clock_gettime(CLOCK_MONOTONIC, &end_sample);
+		subtract_timespecs(&end_sample, &start_sample, &ctx->last_sampletime);
+
+		pthread_mutex_unlock(&ctx->lock);
+		pthread_setcancelstate(PTHREAD_CANCEL_ENABLE, &dummy);
+
+		/* keep any partly read event for the next read */
+		memmove(events, (char *)events + filled - filled % sizeof(*events), filled % sizeof(*events));
+		filled %= sizeof(*events);
+	}
+
+	return NULL; /* NOT REACHED */
+}
+
+/*
+ * Starts thread at real time priority, or at normal priority if the
+ * process may not use real time scheduling.
+ */
+static int start_read_thread(struct encoder_ctx *ctx, void *(*loop)(void *)) {
+	pthread_attr_t thread_attr;
+	struct sched_param thread_priority = {
+		.sched_priority = QENC_THREAD_PRIORITY,
+	};
+	int ret;
+
+	if (pthread_attr_init(&thread_attr))
+		return -1;
+
+	ret = (
+		pthread_attr_setinheritsched(&thread_attr, PTHREAD_EXPLICIT_SCHED) ||
+		pthread_attr_setschedpolicy(&thread_attr, SCHED_FIFO) ||
+		pthread_attr_setschedparam(&thread_attr, &thread_priority) ||
+		pthread_create(&ctx->thread, &thread_attr, loop, ctx)
+	);
+	pthread_attr_destroy(&thread_attr);
+
+	if (ret && pthread_create(&ctx->thread, NULL, loop, ctx))
+		return -1;
+
+	return 0;
+}
+
 int qenc_get_encoder_value(struct encoder_ctx *ctx, int *enc_val, struct timespec *last_sampling) {
 	int ret = 0;
 
@@ -196,23 +349,135 @@ int qenc_get_encoder_value(struct encoder_ctx *ctx, int *enc_val, struct timespe
 	return ret;
 }
 
-struct encoder_ctx *qenc_launch_read_loop(unsigned gpio_a, unsigned gpio_b) {
-	char gpio_a_filename[FILENAME_MAX+1];
-	char gpio_b_filename[FILENAME_MAX+1];
+/*
+ * Copies ticks counted after the tick numbered after, oldest first.
+ * Ticks which have already been overwritten in the ring are skipped.
+ * Returns number of ticks copied, at most n.
+ */
+ssize_t qenc_read_ticks(struct encoder_ctx *ctx, struct qenc_tick *ticks, size_t n, uint64_t after) {
+	uint64_t first;
+	size_t i;
+
+	if (pthread_mutex_lock(&ctx->lock))
+		return -1;
+
+	first = after + 1;
+	if (ctx->ticks > QENC_RING_SIZE && first <= ctx->ticks - QENC_RING_SIZE)
+		first = ctx->ticks - QENC_RING_SIZE + 1;
+
+	for (i = 0; i < n && first + i <= ctx->ticks; ++i)
+		ticks[i] = ctx->ring[(first + i - 1) & QENC_RING_MASK];
+
+	pthread_mutex_unlock(&ctx->lock);
+
+	return i;
+}
+
+unsigned long qenc_missed_events(struct encoder_ctx *ctx) {
+	unsigned long missed;
+
+	pthread_mutex_lock(&ctx->lock);
+	missed = ctx->missed;
+	pthread_mutex_unlock(&ctx->lock);
+
+	return missed;
+}
+
+static struct encoder_ctx *alloc_ctx(enum qenc_backend backend, unsigned a_number, unsigned b_number) {
 	struct encoder_ctx *ctx;
-	pthread_attr_t thread_attr;
-	struct sched_param thread_priority = {
-		.sched_priority = 99,
-	};
 
 	if (!(ctx = calloc(1, sizeof(*ctx))))
 		return NULL;
+	ctx->backend = backend;
 	ctx->a_fd = -1;
 	ctx->b_fd = -1;
+	ctx->line_fd = -1;
+	ctx->a_number = a_number;
+	ctx->b_number = b_number;
 	pthread_mutex_init(&ctx->lock, NULL);
-	ctx->a_number = gpio_a;
-	ctx->b_number = gpio_b;
 
+	return ctx;
+}
+
+/*
+ * Launches read loop on events read from fd, which must yield
+ * struct gpio_v2_line_event records, as a GPIO line request does.
+ * Any other source of such records, such as a pipe, may be used to
+ * drive the encoder without hardware. The loop takes ownership of fd.
+ */
+struct encoder_ctx *qenc_launch_event_read_loop(int fd, unsigned line_a, unsigned line_b, int a_value, int b_value) {
+	struct encoder_ctx *ctx;
+
+	if (!(ctx = alloc_ctx(QENC_BACKEND_LINE_EVENTS, line_a, line_b)))
+		return NULL;
+	ctx->line_fd = fd;
+	ctx->a_value = !!a_value;
+	ctx->b_value = !!b_value;
+
+	if (start_read_thread(ctx, event_read_loop)) {
+		pthread_mutex_destroy(&ctx->lock);
+		free(ctx);
+		return NULL;
+	}
+
+	return ctx;
+}
+
+/*
+ * Launches read loop on lines of GPIO character device chip, such as
+ * /dev/gpiochip0, through the line event interface. Each edge is time
+ * stamped by the kernel, and many edges are taken by a single read.
+ */
+struct encoder_ctx *qenc_launch_chardev_read_loop(const char *chip, unsigned line_a, unsigned line_b) {
+	struct gpio_v2_line_request req;
+	struct gpio_v2_line_values values = {
+		.mask = 0x3,
+	};
+	struct encoder_ctx *ctx;
+	int chip_fd, errnum;
+
+	if ((chip_fd = open(chip, O_RDONLY | O_CLOEXEC)) < 0)
+		return NULL;
+
+	memset(&req, 0, sizeof(req));
+	req.offsets[0] = line_a;
+	req.offsets[1] = line_b;
+	req.num_lines = 2;
+	strncpy(req.consumer, QENC_CONSUMER, sizeof(req.consumer) - 1);
+	req.config.flags =
+		GPIO_V2_LINE_FLAG_INPUT |
+		GPIO_V2_LINE_FLAG_EDGE_RISING |
+		GPIO_V2_LINE_FLAG_EDGE_FALLING;
+	req.event_buffer_size = QENC_KERNEL_EVENT_BUFFER;
+
+	if (ioctl(chip_fd, GPIO_V2_GET_LINE_IOCTL, &req) < 0) {
+		errnum = errno;
+		close(chip_fd);
+		errno = errnum;
+		return NULL;
+	}
+	close(chip_fd);
+
+	if (
+		ioctl(req.fd, GPIO_V2_LINE_GET_VALUES_IOCTL, &values) < 0 ||
+		!(ctx = qenc_launch_event_read_loop(req.fd, line_a, line_b, values.bits & 0x1, values.bits & 0x2))
+	) {
+		errnum = errno;
+		close(req.fd);
+		errno = errnum;
+		return NULL;
+	}
+
+	return ctx;
+}
+
+struct encoder_ctx *qenc_launch_read_loop(unsigned gpio_a, unsigned gpio_b) {
+	char gpio_a_filename[FILENAME_MAX+1];
+	char gpio_b_filename[FILENAME_MAX+1];
+	struct encoder_ctx *ctx;
+
+	if (!(ctx = alloc_ctx(QENC_BACKEND_SYSFS, gpio_a, gpio_b)))
+		return NULL;
 	if (
 		export_gpio(gpio_a) ||
 		export_gpio(gpio_b) ||
@@ -237,17 +502,9 @@ struct encoder_ctx *qenc_launch_read_loop(unsigned gpio_a, unsigned gpio_b) {
 	)
 		goto fail;
 
-	if (
-		pthread_attr_init(&thread_attr) ||
-		pthread_attr_setinheritsched(&thread_attr, PTHREAD_EXPLICIT_SCHED) ||
-		pthread_attr_setschedpolicy(&thread_attr, SCHED_FIFO) ||
-		pthread_attr_setschedparam(&thread_attr, &thread_priority) ||
-		pthread_create(&ctx->thread, &thread_attr, read_loop, ctx)
-	)
+	if (start_read_thread(ctx, read_loop))
 		goto fail;
 
-	pthread_attr_destroy(&thread_attr);
-
 	return ctx;
 
    fail:
@@ -259,6 +516,7 @@ struct encoder_ctx *qenc_launch_read_loop(unsigned gpio_a, unsigned gpio_b) {
 	unexport_gpio(gpio_a);
 	unexport_gpio(gpio_b);
 
+	pthread_mutex_destroy(&ctx->lock);
 	free(ctx);
 
 	return NULL;
@@ -274,9 +532,12 @@ int qenc_terminate_read_loop(struct encoder_ctx *ctx) {
 	)
 		return -1;
 
-	if (
-		close(ctx->a_fd) |
+	if (ctx->backend == QENC_BACKEND_LINE_EVENTS) {
+		if (close(ctx->line_fd))
+			ret = -1;
+	} else if (
 		close(ctx->a_fd) |
+		close(ctx->b_fd) |
 		unexport_gpio(ctx->a_number) |
 		unexport_gpio(ctx->b_number)
 	)
@@ -0,0 +1,109 @@
+
+/*
+ * Drives the line event read loop from a pipe, in place of a GPIO
+ * line request, and checks the counted value and ticks.
+ */
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <err.h>
+#include <time.h>
+#include <unistd.h>
+#include <pthread.h>
+#include <linux/gpio.h>
+
+#include <quadrature_encoder.h>
+
+#define LINE_A				23
+#define LINE_B				24
+#define N_STEPS				3000
+#define STEP_NS				100000
+
+/* levels of lines a and b through one cycle, turning forwards */
+static const int cycle[4][2] = {{0, 0}, {0, 1}, {1, 1}, {1, 0}};
+
+static void wait_for_value(struct encoder_ctx *ctx, int expected) {
+	struct timespec delay = {
+		.tv_sec = 0,
+		.tv_nsec = 1000000,
+	};
+	int enc_val = 0, i;
+
+	for (i = 0; i < 1000; ++i) {
+		if (qenc_get_encoder_value(ctx, &enc_val, NULL))
+			err(EXIT_FAILURE, "error reading encoder value");
+		if (enc_val == expected)
+			return;
+		nanosleep(&delay, NULL);
+	}
+
+	errx(EXIT_FAILURE, "encoder value %d, expected %d", enc_val, expected);
+}
+
+static void write_steps(int fd, int from, int n, int direction, uint32_t *seqno) {
+	struct gpio_v2_line_event event;
+	int i, step, next;
+
+	for (i = 0; i < n; ++i) {
+		step = ((from + i * direction) % 4 + 4) % 4;
+		next = ((step + direction) % 4 + 4) % 4;
+
+		memset(&event, 0, sizeof(event));
+		event.timestamp_ns = (uint64_t)(*seqno + 1) * STEP_NS;
+		event.seqno = ++*seqno;
+		if (cycle[step][0] != cycle[next][0]) {
+			event.offset = LINE_A;
+			event.id = cycle[next][0] ? GPIO_V2_LINE_EVENT_RISING_EDGE : GPIO_V2_LINE_EVENT_FALLING_EDGE;
+		} else {
+			event.offset = LINE_B;
+			event.id = cycle[next][1] ? GPIO_V2_LINE_EVENT_RISING_EDGE : GPIO_V2_LINE_EVENT_FALLING_EDGE;
+		}
+
+		if (write(fd, &event, sizeof(event)) != sizeof(event))
+			err(EXIT_FAILURE, "error writing line event");
+	}
+}
+
+int main(void) {
+	struct encoder_ctx *ctx;
+	struct qenc_tick ticks[QENC_RING_SIZE];
+	uint32_t seqno = 0;
+	ssize_t n;
+	int fds[2];
+
+	if (pipe(fds))
+		err(EXIT_FAILURE, "error creating pipe");
+
+	if (!(ctx = qenc_launch_event_read_loop(fds[0], LINE_A, LINE_B, 0, 0)))
+		err(EXIT_FAILURE, "error launching read loop");
+
+	write_steps(fds[1], 0, N_STEPS, 1, &seqno);
+	wait_for_value(ctx, N_STEPS);
+
+	write_steps(fds[1], N_STEPS, N_STEPS / 2, -1, &seqno);
+	wait_for_value(ctx, N_STEPS / 2);
+
+	/* only the last QENC_RING_SIZE ticks are kept */
+	if ((n = qenc_read_ticks(ctx, ticks, QENC_RING_SIZE, 0)) != QENC_RING_SIZE)
+		errx(EXIT_FAILURE, "read %zd ticks, expected %d", n, QENC_RING_SIZE);
+	if (ticks[n - 1].n != seqno || ticks[n - 1].value != N_STEPS / 2)
+		errx(EXIT_FAILURE, "last tick %llu has value %d",
+			(unsigned long long)ticks[n - 1].n, ticks[n - 1].value);
+	if (ticks[n - 1].time_ns != (int64_t)seqno * STEP_NS)
+		errx(EXIT_FAILURE, "last tick has wrong time stamp");
+
+	if ((n = qenc_read_ticks(ctx, ticks, QENC_RING_SIZE, seqno - 10)) != 10)
+		errx(EXIT_FAILURE, "read %zd new ticks, expected 10", n);
+
+	if (qenc_missed_events(ctx))
+		errx(EXIT_FAILURE, "%lu events missed", qenc_missed_events(ctx));
+
+	if (qenc_terminate_read_loop(ctx))
+		err(EXIT_FAILURE, "error terminating read loop");
+	close(fds[1]);
+
+	printf("ok\n");
+
+	return 0;
+}
@@ -2,12 +2,32 @@
 #ifndef _QUADRATURE_ENCODER_H_
 #define _QUADRATURE_ENCODER_H_
 
+#include <stdint.h>
+#include <sys/types.h>
+
+#define QENC_RING_SIZE			1024	/* ticks held; power of two */
+
+enum qenc_backend {
+	QENC_BACKEND_SYSFS,
+	QENC_BACKEND_LINE_EVENTS,
+};
+
+/* a single edge counted by the encoder */
+struct qenc_tick {
+	int64_t time_ns;	/* CLOCK_MONOTONIC time of edge */
+	uint64_t n;		/* counts ticks from 1 */
+	int value;		/* encoder value after edge */
+};
+
 struct encoder_ctx {
 	pthread_mutex_t lock;
 	int value;
 
+	enum qenc_backend backend;
+
 	int a_fd;
 	int b_fd;
+	int line_fd;
 
 	int a_value;
 	int b_value;
@@ -18,13 +38,23 @@ struct encoder_ctx {
 	unsigned err_count;
 	int errnum;
 
+	unsigned long missed;
+	uint32_t last_seqno;
+
 	struct timespec last_sampletime;
 
 	pthread_t thread;
+
+	uint64_t ticks;
+	struct qenc_tick ring[QENC_RING_SIZE];
 };
 
 struct encoder_ctx *qenc_launch_read_loop(unsigned gpio_a, unsigned gpio_b);
+struct encoder_ctx *qenc_launch_chardev_read_loop(const char *chip, unsigned line_a, unsigned line_b);
+struct encoder_ctx *qenc_launch_event_read_loop(int fd, unsigned line_a, unsigned line_b, int a_value, int b_value);
 int qenc_get_encoder_value(struct encoder_ctx *ctx, int *enc_val, struct timespec *last_sampling);
+ssize_t qenc_read_ticks(struct encoder_ctx *ctx, struct qenc_tick *ticks, size_t n, uint64_t after);
+unsigned long qenc_missed_events(struct encoder_ctx *ctx);
 int qenc_terminate_read_loop(struct encoder_ctx *ctx);
 
 #endif /* _QUADRATURE_ENCODER_H_ */
@@ -1,15 +1,24 @@
+import os
+
 from distutils.core import setup, Extension
 from Cython.Build import cythonize
 
 import numpy
 
+# set KART_OPENMP=1 to divide cyfunc's loops between threads with OpenMP.
+# without it, the loops still run without the GIL, on a single thread.
+OPENMP = os.environ.get('KART_OPENMP', '') not in ('', '0')
+OPENMP_ARGS = ['-fopenmp'] if OPENMP else []
+
 setup(
     name='gokart',
     ext_modules=cythonize(Extension(
         name='kart.kinect.pm.cyfunc',
         sources=['kart/kinect/pm/cyfunc.pyx'],
         include_dirs=[numpy.get_include()],
-        extra_compile_args=["-ffast-math"]  # rmv if inexplicable errors occur
+        # rmv -ffast-math if inexplicable errors occur
+        extra_compile_args=["-ffast-math"] + OPENMP_ARGS,
+        extra_link_args=OPENMP_ARGS
     )),
     install_requires=[
         'pip>=8.1.1',  # setup of req. in lower versions have led to errors
@@ -20,6 +20,10 @@ class TestActuator(TestCase):
         if chan_num == 2:
             return self.chan2
 
+    def mock_duty_cycles_setter(self, duty_cycles: dict):
+        for chan_num, duty_cycle in duty_cycles.items():
+            self.mock_channel_getter(chan_num).set_duty_cycle(duty_cycle)
+
     def mock_duty_cycle_setter(self, pulse_width: float):
         self.pulse_width = pulse_width
 
@@ -33,6 +37,7 @@ class TestActuator(TestCase):
     def test_that_setting_speed_0_results_in_speed_pulse_width_0(self):
         mock_pwm = Mock(name='mock_pwm')
         mock_pwm.get_channel = self.mock_channel_getter
+        mock_pwm.set_duty_cycles = self.mock_duty_cycles_setter
         a = Actuator(None, mock_pwm)  # data instance will not be used
         a.speed = 0
         self.chan0.set_duty_cycle.assert_called_with(0)
@@ -40,6 +45,7 @@ class TestActuator(TestCase):
     def test_setting_max_speed_results_in_speed_pulse_width_1(self):
         mock_pwm = Mock(name='mock_pwm')
         mock_pwm.get_channel = self.mock_channel_getter
+        mock_pwm.set_duty_cycles = self.mock_duty_cycles_setter
         a = Actuator(None, mock_pwm)  # data instance will not be used
         a.speed = MAX_SPEED
         self.chan0.set_duty_cycle.assert_called_with(1)
@@ -49,6 +55,7 @@ class TestActuator(TestCase):
     def test_calling_stop_wheel_turn_results_in_steer_mag_pw_of_0(self):
         mock_pwm = Mock(name='mock_pwm')
         mock_pwm.get_channel = self.mock_channel_getter
+        mock_pwm.set_duty_cycles = self.mock_duty_cycles_setter
         a = Actuator(None, mock_pwm)  # data instance will not be used
         a.stop_wheel_turn()
         self.chan2.set_duty_cycle.assert_called_with(0)
@@ -56,6 +63,7 @@ class TestActuator(TestCase):
     def test_calling_turn_wheels_right_results_in_correct_direction_pw(self):
         mock_pwm = Mock(name='mock_pwm')
         mock_pwm.get_channel = self.mock_channel_getter
+        mock_pwm.set_duty_cycles = self.mock_duty_cycles_setter
         a = Actuator(None, mock_pwm)  # data instance will not be used
         a.turn_wheels_right()
         self.chan1.set_duty_cycle.assert_called_with(1)
@@ -63,6 +71,7 @@ class TestActuator(TestCase):
     def test_calling_turn_wheels_left_results_in_correct_direction_pw(self):
         mock_pwm = Mock(name='mock_pwm')
         mock_pwm.get_channel = self.mock_channel_getter
+        mock_pwm.set_duty_cycles = self.mock_duty_cycles_setter
         a = Actuator(None, mock_pwm)  # data instance will not be used
         a.turn_wheels_left()
         self.chan1.set_duty_cycle.assert_called_with(0)
@@ -70,6 +79,7 @@ class TestActuator(TestCase):
     def test_calling_turn_wheels_with_0_radius_results_in_correct_pw(self):
         mock_pwm = Mock(name='mock_pwm')
         mock_pwm.get_channel = self.mock_channel_getter
+        mock_pwm.set_duty_cycles = self.mock_duty_cycles_setter
         a = Actuator(None, mock_pwm)  # data instance will not be used
         a.turn_wheels(0)
         self.chan2.set_duty_cycle.assert_called_with(0)
@@ -77,6 +87,7 @@ class TestActuator(TestCase):
     def test_calling_turn_wheels_with_left_value_results_in_correct_pw(self):
         mock_pwm = Mock(name='mock_pwm')
         mock_pwm.get_channel = self.mock_channel_getter
+        mock_pwm.set_duty_cycles = self.mock_duty_cycles_setter
         a = Actuator(None, mock_pwm)  # data instance will not be used
         a.turn_wheels(-1)
         self.chan1.set_duty_cycle.assert_called_with(0)
@@ -85,6 +96,7 @@ class TestActuator(TestCase):
     def test_calling_turn_wheels_with_right_value_results_in_correct_pw(self):
         mock_pwm = Mock(name='mock_pwm')
         mock_pwm.get_channel = self.mock_channel_getter
+        mock_pwm.set_duty_cycles = self.mock_duty_cycles_setter
         a = Actuator(None, mock_pwm)  # data instance will not be used
         a.turn_wheels(1)
         self.chan1.set_duty_cycle.assert_called_with(1)
@@ -93,6 +105,7 @@ class TestActuator(TestCase):
     def test_calling_turn_wheels_w_right_fraction_results_in_correct_pw(self):
         mock_pwm = Mock(name='mock_pwm')
         mock_pwm.get_channel = self.mock_channel_getter
+        mock_pwm.set_duty_cycles = self.mock_duty_cycles_setter
         a = Actuator(None, mock_pwm)  # data instance will not be used
         a.turn_wheels(0.5)
         self.chan1.set_duty_cycle.assert_called_with(1)
@@ -101,6 +114,7 @@ class TestActuator(TestCase):
     def test_calling_turn_wheels_w_left_fraction_results_in_correct_pw(self):
         mock_pwm = Mock(name='mock_pwm')
         mock_pwm.get_channel = self.mock_channel_getter
+        mock_pwm.set_duty_cycles = self.mock_duty_cycles_setter
         a = Actuator(None, mock_pwm)  # data instance will not be used
         a.turn_wheels(-0.75)
         self.chan1.set_duty_cycle.assert_called_with(0)
@@ -114,6 +128,7 @@ class TestActuator(TestCase):
         """
         mock_pwm = Mock(name='mock_pwm')
         mock_pwm.get_channel = self.mock_channel_getter
+        mock_pwm.set_duty_cycles = self.mock_duty_cycles_setter
         a = Actuator(None, mock_pwm)  # data instance will not be used
         a.turn_wheels(1.89)
         self.chan1.set_duty_cycle.assert_called_with(1)
@@ -127,11 +142,21 @@ class TestActuator(TestCase):
         """
         mock_pwm = Mock(name='mock_pwm')
         mock_pwm.get_channel = self.mock_channel_getter
+        mock_pwm.set_duty_cycles = self.mock_duty_cycles_setter
         a = Actuator(None, mock_pwm)  # data instance will not be used
         a.turn_wheels(-15.7)
         self.chan1.set_duty_cycle.assert_called_with(0)
         self.chan2.set_duty_cycle.assert_called_with(1)
 
+    def test_emergency_stop_turns_off_all_channels_at_once(self):
+        mock_pwm = Mock(name='mock_pwm')
+        mock_pwm.get_channel = self.mock_channel_getter
+        mock_pwm.set_duty_cycles = self.mock_duty_cycles_setter
+        a = Actuator(None, mock_pwm)  # data instance will not be used
+        a.emergency_stop()
+        mock_pwm.all_off.assert_called_once_with()
+        self.assertEqual(0, a.speed)
+
     # RADIUS TO WHEEL ANGLE TESTS
 
     def test_radius_to_wheel_angle_returns_correctly_at_10m_right_radius(self):
@@ -141,6 +166,7 @@ class TestActuator(TestCase):
             'Wheel base has changed, this test should be refactored'
         mock_pwm = Mock(name='mock_pwm')
         mock_pwm.get_channel = self.mock_channel_getter
+        mock_pwm.set_duty_cycles = self.mock_duty_cycles_setter
         a = Actuator(None, mock_pwm)  # data instance will not be used
         # assert floats are equal to 7 places
         self.assertAlmostEquals(0.103627459997, a._radius_to_wheel_angle(10))
@@ -152,6 +178,7 @@ class TestActuator(TestCase):
             'Wheel base has changed, this test should be refactored'
         mock_pwm = Mock(name='mock_pwm')
         mock_pwm.get_channel = self.mock_channel_getter
+        mock_pwm.set_duty_cycles = self.mock_duty_cycles_setter
         a = Actuator(None, mock_pwm)  # data instance will not be used
         # assert floats are equal to 7 places
         self.assertAlmostEquals(0.205075900383, a._radius_to_wheel_angle(5))
@@ -163,6 +190,7 @@ class TestActuator(TestCase):
             'Wheel base has changed, this test should be refactored'
         mock_pwm = Mock(name='mock_pwm')
         mock_pwm.get_channel = self.mock_channel_getter
+        mock_pwm.set_duty_cycles = self.mock_duty_cycles_setter
         a = Actuator(None, mock_pwm)  # data instance will not be used
         # assert floats are equal to 7 places
         self.assertAlmostEquals(0, a._radius_to_wheel_angle(0))
@@ -174,6 +202,7 @@ class TestActuator(TestCase):
             'Wheel base has changed, this test should be refactored'
         mock_pwm = Mock(name='mock_pwm')
         mock_pwm.get_channel = self.mock_channel_getter
+        mock_pwm.set_duty_cycles = self.mock_duty_cycles_setter
         a = Actuator(None, mock_pwm)  # data instance will not be used
         # assert floats are equal to 7 places
         self.assertAlmostEquals(-0.205075900383, a._radius_to_wheel_angle(-5))
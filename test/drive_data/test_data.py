@@ -0,0 +1,82 @@
+"""
+Tests that DriveData publishes sensor snapshots correctly.
+"""
+
+import threading as th
+
+from unittest import TestCase
+
+from kart.drive_data.data import DriveData, SNAPSHOT_SLOTS
+from kart.drive_data.occupancy import OccupancyGrid
+
+
+class TestSensorSnapshots(TestCase):
+    def test_no_snapshot_before_first_publish(self):
+        data = DriveData()
+        self.assertIsNone(data.latest_snapshot)
+        self.assertIsNone(data.new_snapshot(0))
+        self.assertIsNone(data.col_avoid_pointmap)
+
+    def test_published_snapshots_are_numbered_in_order(self):
+        data = DriveData()
+        seqs = [data.publish_snapshot(OccupancyGrid(), i).seq
+                for i in range(5)]
+        self.assertEqual([1, 2, 3, 4, 5], seqs)
+        self.assertEqual(4, data.latest_snapshot.time_stamp)
+
+    def test_new_snapshot_is_only_returned_once_per_consumer(self):
+        data = DriveData()
+        data.publish_snapshot(OccupancyGrid(), 100)
+        snapshot = data.new_snapshot(0)
+        self.assertEqual(100, snapshot.time_stamp)
+        self.assertIsNone(data.new_snapshot(snapshot.seq))
+        data.publish_snapshot(OccupancyGrid(), 101)
+        self.assertEqual(101, data.new_snapshot(snapshot.seq).time_stamp)
+
+    def test_published_point_map_is_frozen(self):
+        data = DriveData()
+        point_map = OccupancyGrid()
+        data.col_avoid_pointmap = point_map
+        self.assertIs(point_map, data.latest_snapshot.point_map)
+        with self.assertRaises(ValueError):
+            point_map.stamp([(0, 1)])
+
+    def test_recent_snapshots_hold_latest_slots(self):
+        data = DriveData()
+        for i in range(SNAPSHOT_SLOTS + 2):
+            data.publish_snapshot(OccupancyGrid(), i)
+        recent = data.recent_snapshots()
+        self.assertEqual(SNAPSHOT_SLOTS, len(recent))
+        self.assertEqual(
+            list(range(3, SNAPSHOT_SLOTS + 3)),
+            [snapshot.seq for snapshot in recent])
+        self.assertGreaterEqual(recent[-1].age, 0)
+
+
+class TestWaitingForPublishedData(TestCase):
+    def test_wait_for_snapshot_times_out_without_publish(self):
+        data = DriveData()
+        self.assertIsNone(data.wait_for_snapshot(0, timeout=0.01))
+
+    def test_wait_for_snapshot_returns_when_published(self):
+        data = DriveData()
+        timer = th.Timer(
+            0.01, data.publish_snapshot, args=(OccupancyGrid(), 7))
+        timer.start()
+        snapshot = data.wait_for_snapshot(0, timeout=5)
+        timer.join()
+        self.assertEqual(7, snapshot.time_stamp)
+
+    def test_targets_carry_time_of_snapshot_they_came_from(self):
+        data = DriveData()
+        snapshot = data.publish_snapshot(OccupancyGrid())
+        timer = th.Timer(
+            0.01, data.publish_targets, args=(1., -3., snapshot))
+        timer.start()
+        targets = data.wait_for_targets(0, timeout=5)
+        timer.join()
+        self.assertEqual((1, 1., -3.), targets[:3])
+        self.assertEqual(snapshot.received_time, targets.snapshot_time)
+        self.assertGreaterEqual(targets.latency, 0)
+        self.assertIsNone(data.new_targets(targets.seq))
+        self.assertIsNone(data.publish_targets(0, 0).latency)
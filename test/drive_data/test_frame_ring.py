@@ -0,0 +1,75 @@
+"""
+Tests that frames written to a FrameRing are read correctly, both
+within a process and from another process.
+"""
+
+import multiprocessing as mp
+
+from unittest import TestCase
+
+import numpy as np
+
+from kart.drive_data.frame_ring import FrameRing
+
+FIELDS = {
+    'depth': ((6, 8), np.uint16),
+    'obstacles': ((4, 3), np.float64)
+}
+
+
+def write_frames(ring_name: str, lock, n_frames: int) -> None:
+    ring = FrameRing(FIELDS, name=ring_name, lock=lock)
+    for i in range(1, n_frames + 1):
+        ring.write(
+            i / 10, depth=np.full((6, 8), i), obstacles=np.full((4, 3), i))
+    ring.close()
+
+
+class TestFrameRing(TestCase):
+    def setUp(self):
+        self.ring = FrameRing(FIELDS)
+
+    def tearDown(self):
+        self.ring.close()
+
+    def test_no_frame_before_first_write(self):
+        self.assertIsNone(self.ring.latest())
+
+    def test_latest_frame_holds_written_arrays(self):
+        depth = np.arange(48, dtype=np.uint16).reshape(6, 8)
+        obstacles = np.random.RandomState(0).rand(4, 3)
+        self.ring.write(12.5, depth=depth, obstacles=obstacles)
+        frame = self.ring.latest()
+        self.assertEqual(1, frame.frame_n)
+        self.assertEqual(12.5, frame.time_stamp)
+        np.testing.assert_array_equal(depth, frame['depth'])
+        np.testing.assert_array_equal(obstacles, frame['obstacles'])
+        self.assertTrue(frame.valid)
+        self.assertIsNone(self.ring.latest(frame.frame_n))
+
+    def test_frame_is_invalidated_when_its_slot_is_overwritten(self):
+        arrays = {'depth': np.ones((6, 8)), 'obstacles': np.ones((4, 3))}
+        self.ring.write(0, **arrays)
+        frame = self.ring.latest()
+        for i in range(self.ring.n_slots - 1):
+            self.ring.write(i, **arrays)
+            self.assertTrue(frame.valid)
+        self.ring.write(9, **arrays)
+        self.assertFalse(frame.valid)
+        del frame
+
+    def test_frames_written_by_another_process_are_read(self):
+        process = mp.Process(
+            target=write_frames, args=(self.ring.name, self.ring.lock, 10))
+        process.start()
+        process.join(10)
+        self.assertEqual(0, process.exitcode)
+        frame = self.ring.latest()
+        self.assertEqual(10, frame.frame_n)
+        self.assertEqual(1., frame.time_stamp)
+        self.assertTrue(np.all(frame['depth'] == 10))
+        del frame
+
+    def test_attaching_without_lock_is_refused(self):
+        with self.assertRaises(ValueError):
+            FrameRing(FIELDS, name=self.ring.name)
@@ -0,0 +1,54 @@
+"""
+Tests that OccupancyGrid marks the cells near stamped obstacles.
+"""
+
+from unittest import TestCase
+
+import numpy as np
+
+from kart.drive_data.occupancy import OccupancyGrid
+
+
+class TestOccupancyGrid(TestCase):
+    dilation = 1.2
+
+    def setUp(self):
+        random = np.random.RandomState(0)
+        self.obstacles = random.uniform((-4, 0), (4, 8), (40, 2))
+        self.positions = random.uniform((-5, 0), (5, 9), (2000, 2))
+        self.grid = OccupancyGrid(dilation=self.dilation)
+        self.grid.stamp(self.obstacles)
+        # distance from each position to its nearest obstacle
+        self.distances = np.min(np.linalg.norm(
+            self.positions[:, np.newaxis] - self.obstacles, axis=2), axis=1)
+
+    def test_positions_within_dilation_of_obstacle_are_occupied(self):
+        occupied = self.grid.occupied(self.positions)
+        self.assertTrue(occupied[self.distances <= self.dilation].all())
+
+    def test_positions_far_from_obstacles_are_unoccupied(self):
+        occupied = self.grid.occupied(self.positions)
+        # obstacles reach at most a cell diagonal past the dilation
+        margin = self.grid.cell_size * np.sqrt(2)
+        self.assertFalse(
+            occupied[self.distances > self.dilation + margin].any())
+
+    def test_is_occupied_agrees_with_occupied(self):
+        occupied = self.grid.occupied(self.positions[:200])
+        self.assertEqual(
+            list(occupied),
+            [self.grid.is_occupied(pos) for pos in self.positions[:200]])
+
+    def test_positions_outside_grid_are_unoccupied(self):
+        self.grid.cells.fill(True)
+        self.assertFalse(self.grid.is_occupied((0, -0.5)))
+        self.assertFalse(self.grid.occupied([(0, 100), (-100, 1)]).any())
+
+    def test_clear_marks_all_cells_unoccupied(self):
+        self.grid.clear()
+        self.assertFalse(self.grid.occupied(self.positions).any())
+
+    def test_stamping_three_dimensional_points_ignores_height(self):
+        grid = OccupancyGrid(dilation=self.dilation)
+        grid.stamp(np.c_[self.obstacles, np.ones(len(self.obstacles))])
+        self.assertTrue(np.array_equal(self.grid.cells, grid.cells))
@@ -0,0 +1,134 @@
+"""
+Tests that logic classes choose paths that avoid obstacles.
+"""
+
+from unittest import TestCase
+
+import numpy as np
+
+from kart.drive_data.data import DriveData
+from kart.drive_data.occupancy import OccupancyGrid
+from kart.const.limits import SPEED, LATERAL_ACCELERATION
+from kart.drive_logic.const import PREDICTION_DIST, SWEPT_HALF_WIDTH, \
+    SAFE_DISTANCE, ARC_HYSTERESIS
+from kart.drive_logic.logic import SimpleColAvoidLogic
+from kart.drive_logic.turn_table import arcs, positions_after_distances
+
+
+class TestSimpleColAvoidLogic(TestCase):
+    def make_logic(self, obstacles) -> SimpleColAvoidLogic:
+        point_map = OccupancyGrid()
+        point_map.stamp(obstacles)
+        data = DriveData()
+        data.col_avoid_pointmap = point_map
+        return SimpleColAvoidLogic(data)
+
+    def test_end_distances_match_end_of_each_arc(self):
+        random = np.random.RandomState(0)
+        for _ in range(20):
+            logic = self.make_logic(random.uniform((-4, 1), (4, 6), (6, 2)))
+            ends = [logic.get_end_of_arc(arc) for arc in arcs]
+            # Vector holds single precision values
+            self.assertTrue(np.allclose(
+                [end.y if end is not None else 0 for end in ends],
+                logic.get_end_distances()))
+
+    def test_free_distances_end_where_swept_band_meets_obstacle(self):
+        random = np.random.RandomState(1)
+        distances = np.linspace(0, PREDICTION_DIST, 401)
+        for _ in range(10):
+            obstacles = random.uniform((-5, 1), (5, 7), (4, 2))
+            free_distances = self.make_logic(obstacles).get_free_distances()
+            for arc, free_distance in zip(arcs, free_distances):
+                centers = positions_after_distances(arc.radius, distances)
+                clear = np.min(np.linalg.norm(
+                    centers[:, np.newaxis] - obstacles, axis=2),
+                    axis=1) > SWEPT_HALF_WIDTH
+                expected = distances[clear.argmin()] if not clear.all() \
+                    else PREDICTION_DIST
+                self.assertLessEqual(free_distance, expected)
+                if free_distance < PREDICTION_DIST:
+                    # band is blocked no more than about a cell early
+                    center = positions_after_distances(
+                        arc.radius, free_distance)
+                    self.assertLess(
+                        np.min(np.linalg.norm(center - obstacles, axis=1)),
+                        SWEPT_HALF_WIDTH + 0.25)
+
+    def test_kart_stops_when_all_arcs_are_blocked(self):
+        logic = self.make_logic([(x, 0.5) for x in np.linspace(-4, 4, 30)])
+        logic.tic()
+        self.assertEqual(0, logic.target_speed)
+
+    def test_kart_moves_when_path_is_clear(self):
+        logic = self.make_logic([(-6, 8)])
+        logic.tic()
+        self.assertGreater(logic.target_speed, 0)
+
+    def test_tic_is_skipped_until_new_snapshot_arrives(self):
+        logic = self.make_logic([(0, 1)])
+        logic.tic()
+        first = logic.snapshot
+        self.assertIsNotNone(first)
+        logic.tic()
+        self.assertIs(first, logic.snapshot)
+        logic._data.col_avoid_pointmap = OccupancyGrid()
+        logic.tic()
+        self.assertEqual(first.seq + 1, logic.snapshot.seq)
+        self.assertGreater(logic.target_speed, 0)
+        self.assertGreaterEqual(logic.latency, 0)
+
+    def test_speed_is_zero_within_safe_distance(self):
+        logic = self.make_logic([])
+        self.assertEqual(0, logic._find_speed_from_distance(-0.5))
+        self.assertEqual(0, logic._find_speed_from_distance(0))
+
+    def test_kart_turns_away_from_obstacle_ahead(self):
+        # obstacle ahead and to the left; radii of right turns are positive
+        logic = self.make_logic([(-1.5, 2.5)])
+        logic.tic()
+        self.assertGreater(logic.target_turn_radius, 0)
+        self.assertEqual(PREDICTION_DIST, logic.get_free_distances()[
+            logic.last_radius_index])
+        self.assertGreater(logic.target_speed, 0)
+
+    def test_current_arc_is_kept_unless_another_is_clearly_better(self):
+        logic = self.make_logic([])
+        current = logic.last_radius_index
+        scores = np.zeros(len(arcs))
+        scores[current + 1] = ARC_HYSTERESIS / 2
+        self.assertEqual(current, logic._choose_arc(scores))
+        scores[current + 1] = ARC_HYSTERESIS * 2
+        self.assertEqual(current + 1, logic._choose_arc(scores))
+        # current arc is left once it is blocked
+        scores[:] = -np.inf
+        scores[current + 1] = -1
+        self.assertEqual(current + 1, logic._choose_arc(scores))
+        self.assertIsNone(logic._choose_arc(np.full(len(arcs), -np.inf)))
+
+    def test_current_arc_is_left_once_kart_must_stop_on_it(self):
+        logic = self.make_logic([])
+        current = logic.last_radius_index
+        # within safe distance on current arc, but not on the next; the
+        # difference in free distance alone is within hysteresis.
+        free_distances = np.full(len(arcs), SAFE_DISTANCE - 0.07)
+        free_distances[current + 1] = SAFE_DISTANCE + 0.08
+        scores = logic.score_arcs(free_distances)
+        self.assertEqual(-np.inf, scores[current])
+        self.assertEqual(current + 1, logic._choose_arc(scores))
+
+    def test_speed_profile_is_limited_by_speed_and_lateral_acceleration(self):
+        logic = self.make_logic([])
+        radii = np.array([arc.radius for arc in arcs])
+        speeds = logic.speed_profile(np.full(len(arcs), 100.))
+        self.assertTrue(np.all(speeds <= SPEED))
+        turning = radii != 0
+        self.assertTrue(np.all(speeds[turning] ** 2 <= LATERAL_ACCELERATION *
+                               np.abs(radii[turning]) + 1e-9))
+        self.assertEqual(SPEED, speeds[~turning][0])
+        # speed falls towards the end of free space
+        profile = logic.speed_profile(
+            np.full(len(arcs), 3.), np.array([0., 1., 2.]))
+        self.assertEqual((len(arcs), 3), profile.shape)
+        self.assertTrue(np.all(np.diff(profile, axis=1) <= 0))
+        self.assertTrue(np.all(profile[:, -1] == 0))
@@ -2,6 +2,10 @@
 Tests that functions + classes in turn_table module operate correctly.
 """
 
+import os
+import tempfile
+import numpy as np
+
 from unittest import TestCase
 
 import kart.drive_logic.turn_table as tt
@@ -54,3 +58,97 @@ class TestCreatedArcs(TestCase):
             tt.arcs[-i].radius > tt.arcs[-i + 1].radius for
             i in range(1, self.median_index)
         ))
+
+
+class TestBuildTurnTable(TestCase):
+    """
+    Class testing tables built with passed resolution, and their cache.
+    """
+    def test_table_shapes_follow_resolution(self):
+        table = tt.build_turn_table(
+            n_radii=41, prediction_dist=6, positions_per_meter=10,
+            cache_dir=None)
+        self.assertEqual(41, len(table))
+        self.assertEqual((41, 60, 2), table.positions.shape)
+        self.assertEqual(41, len(table.swept_offsets))
+        self.assertEqual(0, table.radii[20])
+
+    def test_positions_match_per_point_calculation(self):
+        table = tt.build_turn_table(cache_dir=None)
+        for arc in table.arcs:
+            for i, position in enumerate(arc.positions):
+                distance = (i + 1) * tt.logic_const.PREDICTION_POS_SEP
+                np.testing.assert_allclose(
+                    arc.find_pos_after_distance(distance), position)
+
+    def test_cached_table_matches_built_table(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            built = tt.build_turn_table(n_radii=11, cache_dir=cache_dir)
+            self.assertEqual(1, len(os.listdir(cache_dir)))
+            loaded = tt.build_turn_table(n_radii=11, cache_dir=cache_dir)
+            for name in ('radii', 'positions', 'swept_cells',
+                         'swept_distances', 'swept_offsets'):
+                np.testing.assert_array_equal(
+                    getattr(built, name), getattr(loaded, name))
+            # a different resolution must not reuse the cached table
+            other = tt.build_turn_table(n_radii=13, cache_dir=cache_dir)
+            self.assertEqual(13, len(other))
+            self.assertEqual(2, len(os.listdir(cache_dir)))
+
+    def test_truncated_cached_table_is_rebuilt(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            built = tt.build_turn_table(n_radii=11, cache_dir=cache_dir)
+            path = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+            for size in (100, 0):
+                with open(path, 'r+b') as f:
+                    f.truncate(size)
+                rebuilt = tt.build_turn_table(n_radii=11, cache_dir=cache_dir)
+                np.testing.assert_array_equal(
+                    built.swept_cells, rebuilt.swept_cells)
+            # the rebuilt table is cached again
+            with np.load(path) as cached:
+                np.testing.assert_array_equal(built.radii, cached['radii'])
+
+    def test_swept_cells_do_not_depend_on_batching(self):
+        grid = tt.OccupancyGrid()
+        radii = tt.find_radii(9)
+        batched = tt.find_all_swept_cells(radii, grid)
+        per_arc = [tt.find_swept_cells(radius, grid) for radius in radii]
+        np.testing.assert_array_equal(
+            np.concatenate([cells for cells, _ in per_arc]), batched[0])
+        np.testing.assert_array_equal(
+            np.concatenate([dist for _, dist in per_arc]), batched[1])
+        np.testing.assert_array_equal(
+            np.cumsum([0] + [len(cells) for cells, _ in per_arc[:-1]]),
+            batched[2])
+
+    def test_swept_cells_are_first_reached_at_their_distances(self):
+        grid = tt.OccupancyGrid()
+        step = grid.cell_size / 2
+        reach = tt.logic_const.SWEPT_HALF_WIDTH + step / 2 + \
+            grid.cell_size * np.sqrt(0.5)
+        distances = np.arange(0, tt.logic_const.PREDICTION_DIST + step / 2,
+                              step)
+        rows, columns = np.indices(grid.shape).reshape(2, -1)
+        cell_centers = np.stack((
+            (columns + 0.5) * grid.cell_size - grid.half_width,
+            (rows + 0.5) * grid.cell_size
+        ), axis=-1)
+        for radius in tt.find_radii(5):
+            # test every cell of grid against every sampled position
+            centers = tt.positions_after_distances(radius, distances)
+            dif = cell_centers[:, np.newaxis] - centers
+            reached = (dif * dif).sum(axis=-1) <= reach ** 2
+            expected = np.flatnonzero(reached.any(axis=1))
+            first = distances[reached[expected].argmax(axis=1)]
+            cells, cell_distances = tt.find_swept_cells(radius, grid)
+            order = np.argsort(cells)
+            np.testing.assert_array_equal(expected, cells[order])
+            np.testing.assert_array_equal(first, cell_distances[order])
+
+    def test_failed_cache_write_leaves_no_temporary_file(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            path = os.path.join(cache_dir, 'turn_table.npz')
+            os.mkdir(path)  # table can not replace a directory
+            tt._save_table(path, {'radii': np.zeros(3)})
+            self.assertEqual(['turn_table.npz'], os.listdir(cache_dir))
@@ -0,0 +1,97 @@
+"""
+Tests that a sensor worker process publishes frames from a kinect
+through shared memory, and that they reach DriveData as snapshots.
+"""
+import multiprocessing as mp
+import time
+
+import numpy as np
+
+from unittest import TestCase
+
+from kart.drive_data.data import DriveData
+from kart.drive_data.frame_ring import FrameRing
+from kart.input.process_sensor import ProcessKinectInput, FRAME_FIELDS, \
+    sensor_worker
+from kart.input.sensor import KinectInput
+from kart.kinect.pm.kinect import KinGeo
+from kart.kinect.pm.sources import SyntheticSource
+from kart.kinect.pm.synthetic import Renderer, Wall, clutter_scene
+
+FRAME = Renderer().render(clutter_scene(10, seed=0).add(Wall(-2, 4, 2, 4)))
+
+
+def make_synthetic_kinect() -> KinGeo:
+    # called within the worker
+    return KinGeo(SyntheticSource(lambda frame_n: FRAME, frq=100))
+
+
+class TestProcessKinectInput(TestCase):
+    def test_worker_frames_are_published_as_snapshots(self):
+        data = DriveData()
+        kinect_input = ProcessKinectInput(
+            data, make_kinect=make_synthetic_kinect)
+        try:
+            deadline = time.monotonic() + 10
+            while data.latest_snapshot is None and \
+                    time.monotonic() < deadline:
+                kinect_input.update()
+                time.sleep(0.01)
+            self.assertTrue(kinect_input.worker_alive)
+        finally:
+            kinect_input.close()
+        snapshot = data.latest_snapshot
+        self.assertIsNotNone(snapshot)
+        self.assertFalse(kinect_input.worker_alive)
+        # obstacles are found as they would be within the process
+        kinect = make_synthetic_kinect()
+        try:
+            expected = KinectInput.make_point_map(
+                kinect.depth_map.nearest_non_traversable_points)
+        finally:
+            kinect.close()
+        self.assertTrue(expected.cells.any())
+        np.testing.assert_array_equal(
+            expected.cells, snapshot.point_map.cells)
+
+    def test_frames_hold_obstacles_of_each_point_cloud_column(self):
+        self.assertEqual({'obstacles'}, set(FRAME_FIELDS))
+        kinect = make_synthetic_kinect()
+        try:
+            obstacles = kinect.depth_map.nearest_non_traversable_points
+        finally:
+            kinect.close()
+        self.assertEqual(FRAME_FIELDS['obstacles'][0], obstacles.shape)
+
+
+class StoppingKinect:
+    """
+    Kinect which stops the worker once its first frame is taken, and
+    records being closed.
+    """
+    def __init__(self, stop: 'mp.Event'):
+        self.kinect = make_synthetic_kinect()
+        self.stop = stop
+        self.closed = False
+
+    @property
+    def depth_map(self):
+        self.stop.set()
+        return self.kinect.depth_map
+
+    def close(self) -> None:
+        self.closed = True
+        self.kinect.close()
+
+
+class TestSensorWorker(TestCase):
+    def test_worker_closes_kinect_and_ring_when_stopped(self):
+        ring = FrameRing(FRAME_FIELDS)
+        stop = mp.Event()
+        kinect = StoppingKinect(stop)
+        try:
+            sensor_worker(ring.name, ring.lock, stop, kinect)
+            self.assertTrue(kinect.closed)
+            self.assertEqual(1, ring.frame_count)
+        finally:
+            ring.close()
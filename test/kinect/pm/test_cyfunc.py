@@ -1,10 +1,15 @@
+import math
+
 from unittest import TestCase
 
+import numpy as np
 import pyximport
 
 pyximport.install()
 
-from kart.kinect.pm.cyfunc import slope_in_bounds
+from kart.kinect.pm.cyfunc import slope_in_bounds, pos_from_depth_map_point, \
+    PointCloud, configure_sensor, non_traversable_mask, \
+    point_arr_from_depth_arr, slopes_in_bounds
 
 
 class TestFuncs(TestCase):
@@ -23,4 +28,118 @@ class TestFuncs(TestCase):
 
     def test_func_slope_less_than_returns_true_when_slope_is_flat(self):
         # horizontal_distance == 1, vertical distance == 0
-        self.assertTrue(slope_in_bounds([0, 1, 0], [0, 0, 0]))
\ No newline at end of file
+        self.assertTrue(slope_in_bounds([0, 1, 0], [0, 0, 0]))
+
+class TestPointCloud(TestCase):
+    def setUp(self):
+        random = np.random.RandomState(0)
+        self.depth_arr = random.randint(400, 1050, (480, 640)).astype(np.uint16)
+        self.depth_arr[::16, ::24] = 2047  # sprinkle pixels w/o reading
+
+    def test_point_arr_matches_point_by_point_conversion(self):
+        point_arr = PointCloud((self.depth_arr, 0)).point_arr
+        for y, x in ((0, 0), (7, 13), (30, 40), (59, 79), (22, 65)):
+            map_depth = self.depth_arr[y * 8, x * 8]
+            if map_depth == 2047:
+                continue
+            self.assertTrue(np.allclose(
+                pos_from_depth_map_point(x * 8, y * 8, map_depth),
+                point_arr[y, x]
+            ))
+
+    def test_point_arr_is_zeroed_where_depth_has_no_reading(self):
+        point_arr = PointCloud((self.depth_arr, 0)).point_arr
+        no_reading = self.depth_arr[::8, ::8] == 2047
+        self.assertTrue(no_reading.any())
+        self.assertFalse(point_arr[no_reading].any())
+        self.assertTrue(point_arr[~no_reading].any(axis=1).all())
+
+    def test_getitem_matches_filled_point_arr(self):
+        point_cloud = PointCloud((self.depth_arr, 0))
+        lazy_points = [point_cloud[x, y].copy() for x, y in ((0, 0), (3, 2))]
+        point_arr = point_cloud.point_arr
+        self.assertTrue(np.allclose(lazy_points[0], point_arr[0, 0]))
+        self.assertTrue(np.allclose(lazy_points[1], point_arr[2, 3]))
+
+    def test_point_arr_follows_changed_sensor_elevation(self):
+        configure_sensor(angular_elevation=math.radians(10))
+        try:
+            point_arr = PointCloud((self.depth_arr, 0)).point_arr
+            self.assertTrue(np.allclose(
+                pos_from_depth_map_point(80, 160, self.depth_arr[160, 80]),
+                point_arr[20, 10]
+            ))
+        finally:
+            configure_sensor(angular_elevation=0.)
+
+
+class TestNearestNonTraversablePoints(TestCase):
+    @staticmethod
+    def reference_nearest_points(point_arr):
+        # point by point scan, as PointCloud originally performed it
+        def traversable(x, y):
+            p1 = point_arr[y, x]
+            if not p1.any():
+                return True
+            p2 = point_arr[y, x - 1 if x != 0 else 1]
+            if p2[1] > 0 and not slope_in_bounds(p1, p2):
+                return False
+            p2 = point_arr[y - 1 if y != 0 else 1, x]
+            return not p2[1] > 1 or slope_in_bounds(p1, p2)
+
+        height, width = point_arr.shape[:2]
+        points = np.zeros((width, 3), np.float64)
+        for x in range(width):
+            for y in range(height - 1, -1, -1):
+                if not traversable(x, y):
+                    points[x] = point_arr[y, x]
+                    break
+        return points
+
+    def assert_matches_reference(self, depth_arr):
+        point_cloud = PointCloud((depth_arr, 0))
+        expected = self.reference_nearest_points(point_cloud.point_arr)
+        self.assertTrue(np.array_equal(
+            expected, point_cloud.nearest_non_traversable_points))
+
+    def test_nearest_points_match_point_by_point_scan_for_noise(self):
+        random = np.random.RandomState(1)
+        depth_arr = random.randint(400, 1050, (480, 640)).astype(np.uint16)
+        depth_arr[random.rand(480, 640) < 0.2] = 2047
+        self.assert_matches_reference(depth_arr)
+
+    def test_nearest_points_match_point_by_point_scan_for_smooth_map(self):
+        # depth increasing smoothly up the frame, with a block in front
+        depth_arr = np.repeat(
+            np.linspace(1000, 600, 480).astype(np.uint16)[:, np.newaxis],
+            640, axis=1)
+        depth_arr[200:300, 250:400] = 700
+        depth_arr[:40] = 2047
+        self.assert_matches_reference(depth_arr)
+
+    def test_mask_matches_array_slope_comparison(self):
+        random = np.random.RandomState(2)
+        depth_arr = random.randint(400, 1050, (480, 640)).astype(np.uint16)
+        depth_arr[random.rand(480, 640) < 0.2] = 2047
+        point_arr = point_arr_from_depth_arr(depth_arr)
+        height, width = point_arr.shape[:2]
+        horizontal = point_arr[:, np.r_[1, 0:width - 1]]
+        vertical = point_arr[np.r_[1, 0:height - 1]]
+        expected = (horizontal[:, :, 1] > 0) & \
+            ~slopes_in_bounds(point_arr, horizontal)
+        expected |= (vertical[:, :, 1] > 1) & \
+            ~slopes_in_bounds(point_arr, vertical)
+        expected &= point_arr.any(axis=2)
+        self.assertTrue(expected.any())
+        self.assertTrue(np.array_equal(
+            expected, non_traversable_mask(point_arr)))
+
+    def test_depth_map_smaller_than_sensor_is_rejected(self):
+        with self.assertRaises(ValueError):
+            point_arr_from_depth_arr(np.zeros((240, 320), np.uint16))
+
+    def test_point_array_without_neighbours_is_rejected(self):
+        for shape in ((1, 80, 3), (60, 1, 3), (60, 80, 2)):
+            with self.assertRaises(ValueError):
+                non_traversable_mask(np.zeros(shape))
+        self.assertFalse(non_traversable_mask(np.zeros((2, 2, 3))).any())
@@ -1,12 +1,16 @@
 """
 Tests functionality of classes and functions in kinect module
 """
+import threading as th
+import time
+
 import numpy as np
 
 from tempfile import mkstemp
 from unittest import TestCase
 
 from kart.kinect.pm.kinect import KinGeo, DepthMap
+from kart.kinect.pm.sources import SyntheticSource
 
 
 class TestDepthMap(TestCase):
@@ -17,3 +21,44 @@ class TestDepthMap(TestCase):
         depth_map.dump(file_path)
         reloaded_dm = DepthMap.load(file_path)
         self.assertTrue(np.array_equal(depth_map.arr, reloaded_dm.arr))
+
+
+class TestDepthMapCache(TestCase):
+    def make_kinect(self) -> KinGeo:
+        # produces frames far faster than they are retrieved
+        kinect = KinGeo(SyntheticSource(
+            lambda frame_n: np.full((480, 640), 600 + frame_n, np.uint16),
+            frq=1000
+        ))
+        self.addCleanup(kinect.close)
+        return kinect
+
+    def test_same_depth_map_is_returned_until_new_frame(self):
+        kinect = self.make_kinect()
+        kinect.access_hz = 0.01  # frame is not updated during test
+        depth_map = kinect.depth_map
+        self.assertIs(depth_map, kinect.depth_map)
+        self.assertIs(depth_map.point_cloud, kinect.point_cloud)
+        self.assertIs(depth_map.point_arr, kinect.points_arr)
+        time.sleep(0.01)  # allow a new frame to arrive
+        kinect.last_access = 0
+        self.assertIsNot(depth_map, kinect.depth_map)
+
+    def test_products_are_found_once_by_concurrent_readers(self):
+        depth_map = self.make_kinect().depth_map
+        calls = []
+
+        def product():
+            calls.append(1)
+            time.sleep(0.01)
+            return object()
+        results = []
+        threads = [
+            th.Thread(target=lambda: results.append(
+                depth_map.memoize('product', product)))
+            for _ in range(8)
+        ]
+        [thread.start() for thread in threads]
+        [thread.join() for thread in threads]
+        self.assertEqual(1, len(calls))
+        self.assertTrue(all(result is results[0] for result in results))
@@ -0,0 +1,109 @@
+"""
+Tests that depth frames are recorded to logs, and replayed from them.
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from unittest import TestCase
+
+from kart.kinect.pm.kinect import KinGeo, ReplayKinGeo
+from kart.kinect.pm.recording import DepthLogWriter, DepthLog, \
+    ReplaySource, INDEX_SUFFIX
+from kart.kinect.pm.sources import SyntheticSource, DEPTH_SHAPE
+
+
+def frame(i: int) -> np.ndarray:
+    return np.full(DEPTH_SHAPE, 500 + i, np.uint16)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.
+        self.waits = []  # time on clock at end of each wait
+
+    def __call__(self):
+        return self.now
+
+    def wait(self, delay: float) -> bool:
+        self.now += delay
+        self.waits.append(self.now)
+        return False  # never stopped
+
+
+class TestDepthLog(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'run.kdlog')
+
+    def write_log(self, n_frames: int) -> None:
+        with DepthLogWriter(self.path) as writer:
+            for i in range(n_frames):
+                self.assertTrue(writer.write(frame(i), 100 + i))
+        self.assertEqual(n_frames, writer.written)
+
+    def test_written_frames_are_read_back(self):
+        self.write_log(5)
+        log = DepthLog(self.path)
+        self.assertEqual(5, len(log))
+        np.testing.assert_array_equal(100 + np.arange(5), log.time_stamps)
+        depth, time_stamp = log[3]
+        self.assertEqual(103, time_stamp)
+        np.testing.assert_array_equal(frame(3), depth)
+        self.assertIsInstance(depth.base, np.memmap)  # not copied
+
+    def test_log_is_read_to_last_complete_record(self):
+        self.write_log(3)
+        with open(self.path, 'ab') as f:
+            f.write(b'\x00' * 1000)  # partially written record
+        with open(self.path + INDEX_SUFFIX, 'ab') as f:
+            f.write(b'\x00' * 16)  # entry of incomplete record
+        self.assertEqual(3, len(DepthLog(self.path)))
+
+    def test_log_without_frames_is_rejected(self):
+        self.write_log(0)
+        with self.assertRaises(ValueError):
+            DepthLog(self.path)
+
+    def test_file_that_is_not_log_is_rejected(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a log')
+        with self.assertRaises(ValueError):
+            DepthLog(self.path)
+
+    def test_frames_received_by_kinect_are_recorded(self):
+        kinect = KinGeo(SyntheticSource(frame, frq=200))
+        kinect.record(self.path)
+        time.sleep(0.1)
+        kinect.close()
+        log = DepthLog(self.path)
+        self.assertGreater(len(log), 5)
+        # every frame is recorded, including those never read
+        self.assertTrue(np.all(np.diff(log.time_stamps) == 1))
+
+    def test_replay_at_maximum_speed_returns_every_frame(self):
+        self.write_log(4)
+        kinect = ReplayKinGeo(self.path, speed=None)
+        time_stamps = [kinect.depth_map.time_stamp for _ in range(4)]
+        self.assertEqual([100, 101, 102, 103], time_stamps)
+        self.assertFalse(kinect.finished)
+        self.assertEqual(103, kinect.depth_map.time_stamp)  # last is kept
+        self.assertTrue(kinect.finished)
+
+    def test_real_time_replay_keeps_recorded_timing(self):
+        kinect = KinGeo(SyntheticSource(frame, frq=50))
+        kinect.record(self.path)
+        time.sleep(0.2)
+        kinect.close()
+        log = DepthLog(self.path)
+        clock = FakeClock()
+        replay = ReplaySource(log, speed=2., clock=clock, wait=clock.wait)
+        replay.acquire()  # on this thread, timed by fake clock
+        self.assertTrue(replay.finished.is_set())
+        # each frame is put once half its recorded time has passed
+        np.testing.assert_allclose(
+            (log.received_times - log.received_times[0]) / 2, clock.waits)
+        self.assertEqual(len(log), replay.stats['received'])
@@ -0,0 +1,116 @@
+"""
+Tests that depth frame sources and their ring buffer hand out the
+newest frames, and count dropped frames correctly.
+"""
+import time
+
+import numpy as np
+
+from unittest import TestCase
+
+from kart.kinect.pm.kinect import KinGeo
+from kart.kinect.pm.sources import DepthFrameRing, SyntheticSource, \
+    DEPTH_SHAPE
+
+
+def ramp_frame(frame_n: int) -> np.ndarray:
+    return np.full(DEPTH_SHAPE, 500 + frame_n, np.uint16)
+
+
+class RewritingBuffers:
+    """
+    Stands in for the buffers of a DepthFrameRing, putting enough
+    frames to cycle around the ring as the first frame is read out.
+    """
+    def __init__(self, ring: DepthFrameRing):
+        self.ring = ring
+        self.buffers = ring._buffers
+        self.rewritten = False
+
+    def __len__(self):
+        return len(self.buffers)
+
+    def __setitem__(self, i, depth):
+        self.buffers[i] = depth
+
+    def __getitem__(self, i):
+        if not self.rewritten:
+            self.rewritten = True
+            for frame_n in range(1, len(self.buffers) + 1):
+                self.ring.put(np.full((2, 2), frame_n), frame_n)
+        return self.buffers[i]
+
+
+class TestDepthFrameRing(TestCase):
+    def test_no_frame_before_first_put(self):
+        self.assertIsNone(DepthFrameRing().newest())
+
+    def test_newest_frame_is_returned_once(self):
+        ring = DepthFrameRing(shape=(2, 2))
+        depth = np.array([[1, 2], [3, 4]], np.uint16)
+        ring.put(depth, 7)
+        frame_depth, time_stamp = ring.newest()
+        self.assertEqual(7, time_stamp)
+        np.testing.assert_array_equal(depth, frame_depth)
+        self.assertIsNone(ring.newest())
+
+    def test_returned_frame_is_not_overwritten_by_later_frames(self):
+        ring = DepthFrameRing(n_frames=2, shape=(2, 2))
+        ring.put(np.zeros((2, 2)), 0)
+        frame_depth, _ = ring.newest()
+        for i in range(1, 5):
+            ring.put(np.full((2, 2), i), i)
+        self.assertEqual(0, frame_depth.sum())
+
+    def test_unread_frames_are_counted_as_dropped(self):
+        ring = DepthFrameRing(shape=(2, 2))
+        for i in range(5):
+            ring.put(np.full((2, 2), i), i)
+        self.assertEqual(4, ring.newest()[1])
+        self.assertEqual(
+            {'received': 5, 'read': 1, 'dropped': 4}, ring.stats)
+
+
+    def test_frame_rewritten_while_copied_is_dropped(self):
+        ring = DepthFrameRing(n_frames=2, shape=(2, 2))
+        ring.put(np.zeros((2, 2)), 0)
+        ring._buffers = RewritingBuffers(ring)
+        depth, time_stamp = ring.newest()
+        # frame 0 was overwritten as it was read; the newer frame is read
+        self.assertEqual(2, time_stamp)
+        np.testing.assert_array_equal(np.full((2, 2), 2), depth)
+        self.assertEqual(
+            {'received': 3, 'read': 1, 'dropped': 2}, ring.stats)
+
+
+class TestSyntheticSource(TestCase):
+    def test_frames_are_produced_in_background(self):
+        source = SyntheticSource(ramp_frame, frq=200)
+        source.start()
+        try:
+            first = source.latest(timeout=1)
+            time.sleep(0.05)
+            second = source.latest(timeout=1)
+        finally:
+            source.stop()
+        self.assertFalse(source.running)
+        self.assertGreater(second[1], first[1])
+        self.assertEqual(500 + second[1], second[0][0, 0])
+
+
+class TestKinGeoWithSyntheticSource(TestCase):
+    def test_depth_map_holds_newest_frame_without_waiting(self):
+        kinect = KinGeo(SyntheticSource(ramp_frame, frq=100))
+        try:
+            first = kinect.depth_map
+            time.sleep(0.1)
+            kinect.last_access = 0  # allow frame to be updated
+            start = time.monotonic()
+            second = kinect.depth_map
+            self.assertLess(time.monotonic() - start, 0.01)
+        finally:
+            kinect.close()
+        self.assertGreater(second.time_stamp, first.time_stamp)
+        self.assertGreater(kinect.frame_stats['dropped'], 0)
+        self.assertEqual(
+            (60, 80, 3), second.point_cloud.point_arr.shape)
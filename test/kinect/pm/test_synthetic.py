@@ -0,0 +1,103 @@
+"""
+Tests that synthetic depth scenes are rendered so that the point
+clouds made from them place surfaces where they were described.
+"""
+import math
+
+import numpy as np
+
+from unittest import TestCase
+
+from kart.kinect.pm.cyfunc import configure_sensor
+from kart.kinect.pm.kinect import PointCloud
+from kart.kinect.pm.synthetic import Renderer, Scene, Box, Cone, Ramp, \
+    Wall, clutter_scene, depth_to_raw, NO_READING_DEPTH, SAMPLE_DISTANCE
+
+
+class TestSynthetic(TestCase):
+    def setUp(self):
+        self.renderer = Renderer()
+
+    def points(self, scene: Scene) -> np.ndarray:
+        return PointCloud(self.renderer.frame(scene)).point_arr
+
+    def test_depth_beyond_range_has_no_reading(self):
+        raw = depth_to_raw(np.array([1., 100., np.inf]))
+        self.assertLess(raw[0], NO_READING_DEPTH)
+        self.assertEqual([NO_READING_DEPTH] * 2, list(raw[1:]))
+
+    def test_ground_is_placed_at_sensor_height(self):
+        points = self.points(Scene(sensor_height=0.6)).reshape(-1, 3)
+        ground = points[np.isfinite(points[:, 2]) & (points[:, 1] > 0)]
+        self.assertTrue(len(ground))
+        np.testing.assert_allclose(ground[:, 2], -0.6, atol=0.02)
+
+    def test_render_follows_configured_sensor(self):
+        # renderer is made before sensor is configured
+        configure_sensor(angular_elevation=math.radians(-10))
+        try:
+            scene = Scene([Wall(-3, 4, 3, 4, thickness=0.2)],
+                          sensor_height=0.6)
+            points = self.points(scene).reshape(-1, 3)
+        finally:
+            configure_sensor(angular_elevation=0.)
+        points = points[points.any(axis=1)]
+        ground = points[points[:, 2] < -0.55]
+        wall = points[points[:, 2] > -0.5]
+        self.assertTrue(len(ground))
+        self.assertTrue(len(wall))
+        np.testing.assert_allclose(ground[:, 2], -0.6, atol=0.02)
+        np.testing.assert_allclose(wall[:, 1], 3.9, atol=0.03)
+
+    def test_box_face_is_placed_at_its_distance(self):
+        scene = Scene([Box(0, 3, 1, 0.5, 1.5)])
+        points = self.points(scene)
+        center = points[points.shape[0] // 2, points.shape[1] // 2]
+        self.assertAlmostEqual(2.75, center[1], delta=0.02)
+        self.assertAlmostEqual(0, center[0], delta=0.02)
+
+    def test_frame_is_in_form_returned_by_freenect(self):
+        depth, time_stamp = self.renderer.frame(Scene(), 12)
+        self.assertEqual((480, 640), depth.shape)
+        self.assertEqual(np.uint16, depth.dtype)
+        self.assertEqual(12, time_stamp)
+
+    def test_sampled_render_matches_full_render(self):
+        scene = clutter_scene(20, seed=3).add(Wall(-2, 5, 2, 6))
+        full = Renderer(sampled_only=False).render(scene)
+        sampled = self.renderer.render(scene)
+        step = SAMPLE_DISTANCE
+        np.testing.assert_array_equal(
+            full[::step, ::step], sampled[::step, ::step])
+        self.assertTrue((sampled[1::step] == NO_READING_DEPTH).all())
+
+    def test_culled_render_matches_unculled_depth(self):
+        scene = clutter_scene(50, seed=1)
+        scene.add(Cone(0.1, 0.3, 0.2, 0.8))  # reaches sensor; not culled
+        rays = self.renderer._rays
+        expected = depth_to_raw(
+            scene.depth(rays.reshape(-1, 3))).reshape(rays.shape[:2])
+        step = SAMPLE_DISTANCE
+        np.testing.assert_array_equal(
+            expected, self.renderer.render(scene)[::step, ::step])
+
+    def test_gentle_ramp_is_traversable(self):
+        scene = Scene([Ramp(-1, 1.5, 2, 3, math.radians(8))])
+        # columns without a non-traversable point are left zeroed
+        self.assertFalse(PointCloud(
+            self.renderer.frame(scene)).nearest_non_traversable_points.any())
+
+    def test_steep_ramp_is_not_traversable(self):
+        scene = Scene([Ramp(-1, 1.5, 2, 3, math.radians(35))])
+        nearest = PointCloud(
+            self.renderer.frame(scene)).nearest_non_traversable_points
+        found = nearest[nearest.any(axis=1)]
+        self.assertTrue(len(found))
+        np.testing.assert_allclose(found[:, 1], 1.5, atol=0.05)
+
+    def test_clutter_scene_holds_passed_number_of_obstacles(self):
+        scene = clutter_scene(30, seed=2)
+        self.assertEqual(31, len(scene.primitives))  # with ground
+        self.assertEqual(
+            [type(p) for p in scene.primitives],
+            [type(p) for p in clutter_scene(30, seed=2).primitives])
@@ -0,0 +1,25 @@
+"""
+Tests that the pipeline benchmark times each stage, and finds
+regressions against earlier results.
+"""
+from unittest import TestCase
+
+from kart import bench
+
+
+class TestBench(TestCase):
+    def test_every_stage_is_timed_for_each_frame(self):
+        times = bench.run_benchmark(bench.synthetic_frames(8), n_warmup=3)
+        self.assertEqual(set(bench.STAGES) | {'total'}, set(times))
+        self.assertTrue(all(len(t) == 5 for t in times.values()))
+        summary = bench.summarize(times)
+        self.assertLessEqual(summary['total']['p50'], summary['total']['max'])
+        self.assertGreater(summary['logic_tic']['fps'], 0)
+
+    def test_slower_stage_is_reported_as_regression(self):
+        baseline = {'stages': {'logic_tic': {'p50': 1e-3},
+                               'point_map': {'p50': 1e-3}}}
+        results = {'stages': {'logic_tic': {'p50': 1.5e-3},
+                              'point_map': {'p50': 1.05e-3}}}
+        self.assertEqual(
+            ['logic_tic'], bench.compare(results, baseline, threshold=0.1))
@@ -0,0 +1,121 @@
+"""
+Tests that stage timings, counters and frame traces are recorded,
+and that they are served as JSON on localhost.
+"""
+import json
+
+from unittest import TestCase
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+from kart import instrumentation as ins
+from kart import simulation as sim
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+
+class TestInstrumentation(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.instruments = ins.Instrumentation(self.clock, trace_slots=4)
+
+    def test_stage_timer_records_time_of_each_run(self):
+        for duration in (0.001, 0.002, 0.004):
+            with self.instruments.stage('logic_tic'):
+                self.clock.now += duration
+        histogram = self.instruments.stages['logic_tic']
+        self.assertEqual(3, histogram.n)
+        self.assertAlmostEqual(0.004, histogram.max)
+        self.assertAlmostEqual(0.007, histogram.total)
+
+    def test_counters(self):
+        self.instruments.count('frames')
+        self.instruments.count('frames', 2)
+        self.assertEqual({'frames': 3}, self.instruments.counters)
+
+    def test_frame_trace_records_latency_from_publish_to_pwm(self):
+        self.instruments.begin_frame(1, frame=1234, published=10.)
+        self.instruments.mark(1, ins.LOGIC_START, 10.002)
+        self.instruments.mark(1, ins.TARGETS, 10.005)
+        self.instruments.mark(1, ins.APPLIED, 10.006)
+        self.instruments.mark(1, ins.APPLIED, 10.020)  # not first; ignored
+        trace, = self.instruments.traces()
+        self.assertEqual(1234, trace.frame)
+        self.assertAlmostEqual(0.006, trace.latency())
+        self.assertAlmostEqual(
+            0.003, trace.latency(ins.LOGIC_START, ins.TARGETS))
+        self.assertEqual(1, self.instruments.stages[ins.FRAME_LATENCY].n)
+
+    def test_oldest_traces_are_overwritten(self):
+        for seq in range(1, 11):
+            self.instruments.begin_frame(seq, published=float(seq))
+        self.assertEqual(
+            [7, 8, 9, 10], [trace.seq for trace in self.instruments.traces()])
+        # events of an overwritten frame are ignored
+        self.instruments.mark(2, ins.APPLIED, 20.)
+        self.assertNotIn(ins.FRAME_LATENCY, self.instruments.stages)
+
+    def test_summary_holds_percentiles_counters_and_traces(self):
+        with self.instruments.stage('actuator_tic'):
+            self.clock.now += 0.001
+        self.instruments.count('frames')
+        self.instruments.begin_frame(1, published=1.)
+        summary = self.instruments.summary()
+        self.assertEqual(
+            {'n', 'mean', 'max', 'p50', 'p90', 'p99'},
+            set(summary['stages']['actuator_tic']))
+        self.assertEqual({'frames': 1}, summary['counters'])
+        self.assertEqual(1, summary['traces'][0]['seq'])
+
+
+class TestTelemetryServer(TestCase):
+    def setUp(self):
+        self.server = ins.TelemetryServer(
+            lambda: {'counters': {'frames': 3}}, port=0).start()
+        self.url = 'http://{}:{}/'.format(*self.server.address)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_summary_is_served_as_json(self):
+        with urlopen(self.url, timeout=5) as response:
+            self.assertEqual({'counters': {'frames': 3}},
+                             json.loads(response.read().decode('utf-8')))
+
+    def test_unknown_path_is_not_found(self):
+        with self.assertRaises(HTTPError) as context:
+            urlopen(self.url + 'nothing', timeout=5)
+        self.assertEqual(404, context.exception.code)
+
+
+class TestGoKartInstrumentation(TestCase):
+    def test_frames_are_traced_through_simulated_pipeline(self):
+        simulation = sim.Simulation(sim.Track(n_obstacles=0, seed=0))
+        for _ in range(sim.PHYSICS_FRQ // 2):
+            simulation.step()
+        kart = simulation.kart
+        telemetry = kart.telemetry()
+        for stage in ('kinect_update', 'logic_tic', 'actuator_tic',
+                      ins.FRAME_LATENCY):
+            self.assertGreater(telemetry['stages'][stage]['n'], 0, stage)
+        self.assertGreater(telemetry['counters']['frames'], 0)
+        applied = [trace for trace in kart.instruments.traces()
+                   if trace.latency() is not None]
+        self.assertTrue(applied)
+        json.dumps(telemetry, default=ins._json_default)
+
+    def test_only_logic_tics_that_consume_a_snapshot_are_timed(self):
+        simulation = sim.Simulation(sim.Track(n_obstacles=0, seed=0))
+        for _ in range(sim.PHYSICS_FRQ // 2):
+            simulation.step()
+        kart = simulation.kart
+        self.assertEqual(simulation.data.latest_targets.seq,
+                         kart.instruments.stages['logic_tic'].n)
+        self.assertGreater(
+            kart.instruments.counters['repeated_logic_tics'], 0)
@@ -0,0 +1,97 @@
+"""
+Tests that the sampling profiler attributes samples to threads and
+functions, bounds its memory and overhead, and writes collapsed stacks.
+"""
+import os
+import tempfile
+import threading as th
+import time
+
+from unittest import TestCase
+
+from kart import profiler as prof
+
+
+def spin_in_hot_function(stop: th.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def recurse(depth: int, stop: th.Event) -> None:
+    if depth:
+        recurse(depth - 1, stop)
+    else:
+        stop.wait()
+
+
+class TestSamplingProfiler(TestCase):
+    def setUp(self):
+        self.stop = th.Event()
+        self.threads = []
+
+    def tearDown(self):
+        self.stop.set()
+        for thread in self.threads:
+            thread.join()
+
+    def start_thread(self, target, *args, name='Logic Thread'):
+        thread = th.Thread(target=target, args=args + (self.stop,),
+                           name=name)
+        thread.start()
+        self.threads.append(thread)
+        return thread
+
+    def test_samples_are_attributed_to_thread_and_function(self):
+        thread = self.start_thread(spin_in_hot_function)
+        profiler = prof.SamplingProfiler([thread])
+        for _ in range(5):
+            profiler.sample()
+        self.assertEqual({'Logic Thread': 5}, profiler.thread_samples())
+        line = profiler.collapsed()[0]
+        stack, count = line.rsplit(' ', 1)
+        self.assertTrue(stack.startswith('Logic Thread;'))
+        self.assertIn('test.test_profiler:spin_in_hot_function', stack)
+        self.assertEqual(5, sum(int(line.rsplit(' ', 1)[1])
+                                for line in profiler.collapsed()))
+
+    def test_unstarted_threads_are_not_sampled(self):
+        profiler = prof.SamplingProfiler([th.Thread(name='Sensor Thread')])
+        profiler.sample()
+        self.assertEqual({}, profiler.thread_samples())
+
+    def test_deep_stacks_are_truncated(self):
+        thread = self.start_thread(recurse, 100)
+        time.sleep(0.05)
+        profiler = prof.SamplingProfiler([thread], max_depth=10)
+        profiler.sample()
+        (_, codes), = profiler.stacks
+        self.assertEqual(11, len(codes))
+        self.assertEqual(prof.TRUNCATED, codes[0])
+
+    def test_stacks_beyond_limit_are_counted_as_other(self):
+        thread = self.start_thread(recurse, 0)
+        time.sleep(0.05)
+        profiler = prof.SamplingProfiler([thread], max_stacks=0)
+        profiler.sample()
+        self.assertEqual({('Logic Thread', (prof.OTHER,)): 1},
+                         profiler.stacks)
+
+    def test_background_sampling_stays_within_overhead(self):
+        thread = self.start_thread(spin_in_hot_function)
+        profiler = prof.SamplingProfiler(
+            [thread], interval=0.0001, max_overhead=0.05).start()
+        time.sleep(0.3)
+        profiler.stop()
+        self.assertGreater(profiler.n_samples, 0)
+        # allow for the final sample and for timer resolution
+        self.assertLess(profiler.overhead, 0.1)
+
+    def test_collapsed_stacks_are_written(self):
+        thread = self.start_thread(spin_in_hot_function)
+        profiler = prof.SamplingProfiler([thread])
+        profiler.sample()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'profile.txt')
+            profiler.write_collapsed(path)
+            with open(path) as f:
+                self.assertEqual(profiler.collapsed(), f.read().splitlines())
@@ -0,0 +1,113 @@
+"""
+Tests that the simulated kart moves as a bicycle model, is controlled
+through its virtual chips as the real kart is, and that GoKart control
+code drives it in closed loop.
+"""
+import math
+
+from unittest import TestCase
+
+from kart import simulation as sim
+from kart.actuator.actuator import VirtualActuator
+from kart.const.phys_const import WHEEL_BASE, MAX_SPEED, MAX_WHEEL_TURN_ANGLE
+from kart.input.locator import VirtualLocatorInput
+
+
+class TestKartModel(TestCase):
+    def setUp(self):
+        self.model = sim.KartModel()
+
+    def drive(self, duration: float, dt: float=0.01) -> None:
+        for _ in range(int(round(duration / dt))):
+            self.model.step(dt)
+
+    def test_kart_accelerates_to_throttle_speed_along_heading(self):
+        self.model.pwm.set_duty_cycle(sim.SPEED_CHANNEL, 2 / MAX_SPEED)
+        self.drive(3)
+        self.assertAlmostEqual(2, self.model.speed)
+        self.assertAlmostEqual(0, self.model.pose.x)
+        self.assertGreater(self.model.pose.y, 2)
+
+    def test_wheels_turn_right_until_their_limit(self):
+        self.model.pwm.set_duty_cycle(sim.STEER_DIRECTION_CHANNEL, 1)
+        self.model.pwm.set_duty_cycle(sim.STEER_RATE_CHANNEL, 1)
+        self.drive(0.1)
+        self.assertGreater(self.model.wheel_angle, 0)
+        self.drive(5)
+        self.assertAlmostEqual(MAX_WHEEL_TURN_ANGLE, self.model.wheel_angle)
+
+    def test_kart_turns_at_radius_of_wheel_angle(self):
+        self.model.wheel_angle = math.radians(20)
+        self.model.speed = 1
+        self.model.pwm.set_duty_cycle(sim.SPEED_CHANNEL, 1 / MAX_SPEED)
+        radius = WHEEL_BASE / math.tan(self.model.wheel_angle)
+        self.drive(math.pi * radius)  # half a circle, to the right
+        self.assertAlmostEqual(2 * radius, self.model.pose.x, delta=0.01)
+        self.assertAlmostEqual(0, self.model.pose.y, delta=0.01)
+        self.assertAlmostEqual(math.pi, self.model.pose.heading, delta=0.01)
+
+    def test_actuator_reads_wheel_angle_of_model(self):
+        actuator = VirtualActuator(None, self.model)
+        for angle in (-0.3, 0, 0.2):
+            self.model.wheel_angle = angle
+            self.assertAlmostEqual(angle, actuator.wheel_angle, places=3)
+
+    def test_actuator_steers_model_to_target_radius(self):
+        actuator = VirtualActuator(None, self.model)
+        actuator.turn_radius = -4
+        for _ in range(200):
+            actuator.tic()
+            self.model.step(0.01)
+        self.assertAlmostEqual(
+            math.atan(WHEEL_BASE / -4), self.model.wheel_angle, delta=0.06)
+
+    def test_locator_gives_pose_of_model(self):
+        self.model.reset(sim.Pose(1, 2, 0.5))
+        self.assertEqual((1, 2, 0.5), VirtualLocatorInput(self.model).location)
+
+
+class TestTrack(TestCase):
+    def test_kart_collides_with_wall(self):
+        track = sim.Track(n_obstacles=0)
+        model = sim.KartModel(track.start_pose)
+        self.assertFalse(track.collides(model))
+        model.reset(sim.Pose(track.outer_radius - 0.2, 0, 0))
+        self.assertTrue(track.collides(model))
+
+    def test_obstacles_ahead_are_in_scene(self):
+        track = sim.Track(n_obstacles=0)
+        track.add(sim.TrackCone(5, 3, 0.3, 0.5))
+        scene = track.scene(sim.Pose(5, 0, 0))
+        cones = [p for p in scene.primitives if isinstance(p, sim.Cone)]
+        self.assertEqual(1, len(cones))
+        self.assertAlmostEqual(0, cones[0].x)
+        self.assertAlmostEqual(3, cones[0].y)
+
+
+class TestSimulation(TestCase):
+    def test_kart_completes_lap_of_track_without_obstacles(self):
+        simulation = sim.Simulation(sim.Track(n_obstacles=0))
+        outcome = simulation.run_lap(timeout=40)
+        self.assertEqual(sim.COMPLETED, outcome)
+        stats = simulation.stats
+        self.assertEqual(1, stats.laps)
+        self.assertGreater(stats.distance, 1)
+        self.assertGreater(stats.compute_latency.n, 0)
+
+    def test_logic_tic_without_new_snapshot_publishes_nothing(self):
+        # simulation runs GoKart at fixed rates, as event_driven=False
+        simulation = sim.Simulation(sim.Track(n_obstacles=0))
+        kart = simulation.kart
+        while simulation.data.latest_targets is None:
+            simulation.step()
+        targets = simulation.data.latest_targets
+        self.assertEqual(kart.logic.snapshot.seq, targets.snapshot_seq)
+        kart.logic_tic()
+        kart.logic_tic()
+        self.assertIs(targets, simulation.data.latest_targets)
+        # targets are published once from a new snapshot
+        simulation.source.capture()
+        kart.kinect_tic()
+        kart.logic_tic()
+        kart.logic_tic()
+        self.assertEqual(targets.seq + 1, simulation.data.latest_targets.seq)
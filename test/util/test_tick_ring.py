@@ -0,0 +1,65 @@
+"""
+Tests that encoder velocity and acceleration are estimated correctly
+from a ring of time stamped ticks.
+"""
+
+from unittest import TestCase
+
+from kart.util.tick_ring import TickRing
+
+
+def steady_ring(rate, duration, start=0., direction=1, capacity=1024):
+    ring = TickRing(capacity)
+    n = int(rate * duration)
+    for i in range(n):
+        ring.add(start + i / rate, direction * (i + 1))
+    return ring
+
+
+class TestTickRing(TestCase):
+    def test_held_ticks_are_ordered_after_wrapping(self):
+        ring = TickRing(8)
+        for i in range(20):
+            ring.add(float(i), i)
+        self.assertEqual(8, len(ring))
+        self.assertEqual(list(range(12, 20)), ring.values.tolist())
+        self.assertEqual(list(range(12, 20)), ring.times.tolist())
+
+    def test_velocity_of_steady_rotation(self):
+        ring = steady_ring(2000, 1.)
+        now = ring.times[-1] + 0.0001
+        self.assertAlmostEqual(2000, ring.velocity(now, 0.1), delta=1)
+
+    def test_velocity_of_reverse_rotation_is_negative(self):
+        ring = steady_ring(500, 1., direction=-1)
+        now = ring.times[-1] + 0.001
+        self.assertAlmostEqual(-500, ring.velocity(now, 0.1), delta=1)
+
+    def test_velocity_falls_away_once_stopped(self):
+        ring = steady_ring(1000, 1.)
+        last = ring.times[-1]
+        self.assertAlmostEqual(20, ring.velocity(last + 0.05, 0.1))
+        self.assertEqual(0, ring.velocity(last + 0.2, 0.1))
+
+    def test_velocity_with_too_few_ticks_is_zero(self):
+        ring = TickRing()
+        self.assertEqual(0, ring.velocity(1., 0.1))
+        ring.add(0.95, 1)
+        self.assertEqual(0, ring.velocity(1., 0.1))
+
+    def test_acceleration(self):
+        # value = 1/2 a t^2, with a == 4000 ticks / s^2
+        ring = TickRing()
+        accel = 4000.
+        value = 1
+        while value < 1000:
+            ring.add((2 * value / accel) ** 0.5, value)
+            value += 1
+        now = ring.times[-1]
+        self.assertAlmostEqual(accel, ring.acceleration(now, 0.1),
+                               delta=accel * 0.05)
+
+    def test_acceleration_of_steady_rotation_is_zero(self):
+        ring = steady_ring(2000, 1.)
+        now = ring.times[-1]
+        self.assertAlmostEqual(0, ring.acceleration(now, 0.1), delta=20)
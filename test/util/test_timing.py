@@ -0,0 +1,99 @@
+"""
+Tests that loops are paced on schedule, and that their statistics
+are recorded correctly.
+"""
+
+from unittest import TestCase
+
+from kart.util.timing import Histogram, LoopTimer, SKIP, CATCH_UP
+
+
+class FakeClock:
+    """
+    Clock which only advances when slept on, or when work is done.
+    """
+    def __init__(self):
+        self.now = 100.
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, t):
+        self.sleeps.append(t)
+        self.now += t
+
+
+def run(timer: LoopTimer, clock: FakeClock, work_times) -> list:
+    starts = []
+    for work_time in work_times:
+        timer.start_iteration()
+        starts.append(clock.now)
+        clock.now += work_time
+        timer.end_iteration()
+    return starts
+
+
+class TestHistogram(TestCase):
+    def test_percentiles_bound_added_values(self):
+        histogram = Histogram()
+        for i in range(1, 101):
+            histogram.add(i * 1e-3)
+        self.assertEqual(100, histogram.n)
+        self.assertAlmostEqual(0.0505, histogram.mean)
+        self.assertGreaterEqual(histogram.percentile(50), 0.05)
+        self.assertLess(histogram.percentile(50), 0.05 * 1.6)
+        self.assertEqual(0.1, histogram.percentile(100))
+
+    def test_values_outside_range_are_counted(self):
+        histogram = Histogram(min_value=1e-3, max_value=1)
+        histogram.add(1e-6)
+        histogram.add(5)
+        self.assertEqual(1, histogram.counts[0])
+        self.assertEqual(1, histogram.counts[-1])
+        self.assertEqual(5, histogram.percentile(100))
+
+
+class TestLoopTimer(TestCase):
+    def test_deadlines_do_not_drift(self):
+        clock = FakeClock()
+        timer = LoopTimer('test', 10, clock=clock, sleep=clock.sleep)
+        starts = run(timer, clock, [0.03, 0.07, 0.01] * 10)
+        for i, start in enumerate(starts):
+            self.assertAlmostEqual(100 + i * 0.1, start)
+        self.assertEqual(0, timer.stats.overruns)
+        self.assertAlmostEqual(10, timer.stats.achieved_frq)
+        self.assertAlmostEqual(0, timer.stats.max_period_jitter)
+
+    def test_skip_policy_drops_missed_deadlines(self):
+        clock = FakeClock()
+        timer = LoopTimer('test', 10, SKIP, clock=clock, sleep=clock.sleep)
+        starts = run(timer, clock, [0.01, 0.25, 0.01, 0.01])
+        self.assertAlmostEqual(100.1, starts[1])
+        # iteration overran until 100.35; deadlines at 100.2 and
+        # 100.3 are dropped, and the schedule keeps its phase.
+        self.assertAlmostEqual(100.4, starts[2])
+        self.assertEqual(1, timer.stats.overruns)
+        self.assertEqual(2, timer.stats.skipped)
+        self.assertAlmostEqual(0.2, timer.stats.max_period_jitter)
+
+    def test_catch_up_policy_runs_missed_iterations(self):
+        clock = FakeClock()
+        timer = LoopTimer(
+            'test', 10, CATCH_UP, clock=clock, sleep=clock.sleep)
+        starts = run(timer, clock, [0.25, 0.01, 0.01, 0.01])
+        # deadlines at 100.1 and 100.2 are run late, without sleeping
+        self.assertAlmostEqual(100.25, starts[1])
+        self.assertAlmostEqual(100.26, starts[2])
+        self.assertAlmostEqual(100.3, starts[3])
+        self.assertEqual(0, timer.stats.skipped)
+        self.assertAlmostEqual(0.15, timer.stats.lateness.max)
+
+    def test_unpaced_loop_never_sleeps(self):
+        clock = FakeClock()
+        timer = LoopTimer('test', clock=clock, sleep=clock.sleep)
+        run(timer, clock, [0.01] * 5)
+        self.assertEqual([], clock.sleeps)
+        self.assertEqual(5, timer.stats.iterations)
+        self.assertEqual(5, timer.stats.summary()['exec_time']['n'])
+        self.assertAlmostEqual(100, timer.stats.achieved_frq)